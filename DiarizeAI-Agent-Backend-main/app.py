@@ -1,15 +1,36 @@
 # src/app.py
 
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import uuid
 import json
 import random 
-from flask import Flask, request, jsonify
+import threading
+from flask import Flask, Response, abort, request, jsonify, g, make_response, send_file
 from werkzeug.utils import secure_filename
 from config import Config
-from models import db, Job, User
-from pipeline import run_whisper_and_agent, run_agent_on_text
-from sqlalchemy import func
+from models import db, Job, User, upgrade_schema
+from job_runner import ensure_normalized_audio, execute_run, execute_reanalysis
+from scheduler import JobScheduler, compute_priority, estimate_processing
+from leasing import enqueue_job, mark_queued_if_idle, request_cancel
+from prefork import process_memory
+from auth import (
+    AuthBusyError, TokenKeyError, admin_required, is_admin_request, issue_token, resolve_user, run_hashing,
+    tokens_enabled,
+)
+from retention import start_retention_thread
+from exporters import EXPORT_FORMATS, export_cache_path, purge_exports, render_export, stream_and_cache
+from profiling import render_profile
+from payloads import forget_job, job_payload, jobs_list_payload, json_bytes_response, payload_cache_stats
+from diarize_agent.agent import llm_stats
+from diarize_agent.cancellation import JobCancelled
+from diarize_agent.profiles import profile_models, profile_names
+from diarize_agent.tools.audio import AudioProbeError, iter_opus_transcode, probe_audio
+from diarize_agent.tools.cpu_budget import asr_slots
+from diarize_agent.tools.tools import is_whisper_model_loaded, warm_up_models, whisper_model_status
+from sqlalchemy import func, text
 
 def allowed_file(filename: str, allowed: set[str]) -> bool:
     if "." not in filename:
@@ -20,17 +41,239 @@ def allowed_file(filename: str, allowed: set[str]) -> bool:
     else:
         return False
 
+# Playback content types of the accepted upload formats and of the Opus renditions.
+# Kabul edilen yükleme formatlarının ve Opus kopyalarının oynatma içerik türleri.
+AUDIO_MIMETYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".webm": "audio/webm",
+}
+
+
+def remove_job_files(job: Job) -> None:
+    for path in (job.audio_path, job.pcm_path, job.profile_path):
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
+
 def create_app():
     app = Flask(__name__) 
     app.config.from_object(Config) 
     
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True) 
     os.makedirs(app.config["INSTANCE_FOLDER"], exist_ok=True)
+    os.makedirs(app.config["EXPORT_CACHE_FOLDER"], exist_ok=True)
+    os.makedirs(app.config["AUDIO_RENDITION_FOLDER"], exist_ok=True)
 
     db.init_app(app) 
     
     with app.app_context():
         db.create_all() 
+        upgrade_schema()
+
+    # Warm the ML stack off the request path so the API can serve immediately.
+    # ML yığınını istek yolunun dışında ısıt, böylece API hemen hizmet verebilir.
+    if app.config.get("WARMUP_MODELS"):
+        threading.Thread(
+            target=warm_up_models, args=(profile_models(),), name="model-warmup", daemon=True
+        ).start()
+
+    scheduler = JobScheduler(
+        app,
+        workers=app.config["SCHEDULER_WORKERS"],
+        per_user_limit=app.config["SCHEDULER_PER_USER_LIMIT"],
+    )
+    app.extensions["job_scheduler"] = scheduler
+
+    if app.config.get("RETENTION_INTERVAL_HOURS", 0) > 0:
+        start_retention_thread(app)
+
+    if not tokens_enabled():
+        print("⚠️ SECRET_KEY is not set: access tokens are disabled (login returns 503).")
+
+    if app.config.get("LLM_HEDGING") and not app.config.get("LLM_STREAMING"):
+        print("⚠️ LLM_HEDGING needs LLM_STREAMING=true; the model chain runs without hedging.")
+
+    def _auth_busy(e: AuthBusyError):
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+    def _wants_wait(data) -> bool:
+        # Clients block until the job finishes by default; wait=false returns 202 right away.
+        # İstemciler varsayılan olarak iş bitene kadar bekler; wait=false hemen 202 döner.
+        return str(data.get("wait", "true")).lower() != "false"
+
+    def _profile_flag(data):
+        # profile=true/false forces profiling on/off for this run; absent -> PROFILE_SAMPLE_RATE.
+        # profile=true/false bu çalıştırma için profillemeyi açar/kapatır; yoksa -> PROFILE_SAMPLE_RATE.
+        value = data.get("profile")
+        if value is None or value == "":
+            return None
+        return str(value).lower() in ("true", "1", "yes")
+
+    def _apply_processing_profile(job, data):
+        # processingProfile: fast | balanced | accurate (or one from PROCESSING_PROFILES).
+        # Returns an error response for an unknown name, None otherwise.
+        # processingProfile: fast | balanced | accurate (veya PROCESSING_PROFILES'tan biri).
+        # Bilinmeyen adda hata yanıtı, aksi halde None döner.
+        value = data.get("processingProfile") or data.get("processing_profile")
+        if not value:
+            return None
+        name = str(value).strip().lower()
+        if name not in profile_names():
+            return jsonify({"error": f"Unknown processing profile '{value}'.", "available": profile_names()}), 400
+        job.processing_profile = name
+        return None
+
+    def _respond_when_done(job, future, wait: bool):
+        if not wait:
+            return jsonify(job.to_dict()), 202
+        try:
+            return jsonify(future.result())
+        except JobCancelled:
+            db.session.refresh(job)
+            return jsonify(job.to_dict()), 409
+        except Exception:
+            db.session.refresh(job)
+            return jsonify(job.to_dict()), 500
+
+    def _queue_mode() -> bool:
+        return app.config["JOB_EXECUTION"] == "queue"
+
+    def _wait_for_worker(job, wait: bool):
+        """
+        Queue mode: poll the row until a worker finishes it (or the wait times out -> 202).
+        Kuyruk modu: bir worker bitirene kadar satırı yokla (veya süre dolarsa -> 202).
+        """
+        deadline = time.monotonic() + app.config["QUEUE_WAIT_TIMEOUT_SEC"]
+        while wait and time.monotonic() < deadline:
+            db.session.refresh(job)
+            if job.status == "done":
+                return jsonify(job.to_dict())
+            if job.status == "error":
+                return jsonify(job.to_dict()), 500
+            if job.status == "cancelled":
+                return jsonify(job.to_dict()), 409
+            db.session.commit()  # end the read transaction so the next poll sees new rows
+            time.sleep(1.0)
+        return jsonify(job.to_dict()), 202
+
+    def _claim(job) -> bool:
+        # Atomic idle -> queued on the row; only the winner of concurrent requests starts work.
+        # A job this process does not know about may be a leftover of a crashed process.
+        # Satırda atomik boşta -> queued; eşzamanlı isteklerden sadece kazanan iş başlatır.
+        # Bu sürecin bilmediği iş çöken bir süreçten kalmış olabilir.
+        stale_after = None
+        if not _queue_mode() and not scheduler.is_active(job.id):
+            stale_after = app.config["JOB_STALE_AFTER_SEC"]
+        return mark_queued_if_idle(job.id, stale_after)
+
+    def _commit_reserved(job_id: int) -> None:
+        # Reserved before the commit so duplicates arriving right after it can attach.
+        # Commit'ten önce rezerve edilir; hemen ardından gelen tekrarlar bağlanabilir.
+        try:
+            db.session.commit()
+        except Exception as e:
+            scheduler.release(job_id, e)
+            raise
+        scheduler.start(job_id)
+
+    def _duplicate(job, kind: str, data, attachable: bool = True):
+        """
+        Response for a request that lost the compare-and-set: attach to the in-flight
+        execution (same result, or 202 with wait=false), otherwise 409 with the current state.
+
+        Karşılaştır-ve-ata'yı kaybeden isteğin yanıtı: süren yürütmeye bağlan (aynı sonuç
+        veya wait=false ile 202), aksi halde mevcut durumla 409.
+        """
+        # Drop this request's setting changes and release the row before waiting on it.
+        # Beklemeden önce bu isteğin ayar değişikliklerini bırak ve satırı serbest bırak.
+        db.session.rollback()
+        future = scheduler.attach(job.id, kind) if attachable else None
+        follow_worker = future is None and attachable and _queue_mode() and job.task == kind
+        print(f"🔁 Duplicate {kind} request for job {job.id}: "
+              f"{'attached' if future is not None or follow_worker else 'rejected'}")
+        if future is not None:
+            resp = make_response(_respond_when_done(job, future, wait=_wants_wait(data)))
+        elif follow_worker:
+            resp = make_response(_wait_for_worker(job, wait=_wants_wait(data)))
+        else:
+            resp = make_response(jsonify({"error": "Job is already queued or running.", "job": job.to_dict()}), 409)
+        resp.headers["X-Deduplicated"] = "true"
+        return resp
+
+    def _owner_id():
+        """
+        The user whose jobs this request may see: the token's user, or the legacy
+        user_id parameter. None for a legacy request without any user id
+        (AUTH_REQUIRED=false), which sees only jobs that have no owner either.
+
+        Bu isteğin görebileceği işlerin sahibi: token'ın kullanıcısı veya eski user_id
+        parametresi. Hiç user_id içermeyen eski istekler (AUTH_REQUIRED=false) için None;
+        bunlar sadece sahibi olmayan işleri görür.
+        """
+        if g.user_id is None or g.user_id == "":
+            return None
+        try:
+            return int(g.user_id)
+        except (TypeError, ValueError):
+            abort(make_response(jsonify({"error": "Invalid user_id."}), 400))
+
+    def _owned_job_or_404(job_id: int) -> Job:
+        # Another user's job answers like a missing one, so ids cannot be probed.
+        # Başka kullanıcının işi olmayan iş gibi yanıtlanır; id'ler yoklanamaz.
+        job = Job.query.get_or_404(job_id)
+        if job.user_id != _owner_id():
+            abort(404)
+        return job
+
+    # ---------------------------------------------------------
+    # HEALTH ROUTES
+    # ---------------------------------------------------------
+
+    @app.get("/healthz")
+    def healthz():
+        """
+        Liveness: the process is up and serving. Never touches the DB or models.
+        Canlılık: süreç ayakta ve yanıt veriyor. DB'ye veya modellere dokunmaz.
+        """
+        return jsonify({
+            "status": "ok",
+            "startup_seconds": app.config.get("STARTUP_SECONDS"),
+            "uptime_seconds": round(time.perf_counter() - _IMPORT_STARTED, 3),
+        })
+
+    @app.get("/readyz")
+    def readyz():
+        """
+        Readiness: DB reachable and, if required, Whisper model warm.
+        Hazırlık: DB erişilebilir ve gerekiyorsa Whisper modeli ısınmış.
+        """
+        checks = {"database": True, "models_warm": all(is_whisper_model_loaded(m) for m in profile_models())}
+        try:
+            db.session.execute(text("SELECT 1"))
+        except Exception as e:
+            print(f"❌ READINESS DB ERROR: {str(e)}")
+            checks["database"] = False
+
+        ready = checks["database"] and (
+            checks["models_warm"] or not app.config.get("READY_REQUIRES_MODELS")
+        )
+        return jsonify({
+            "ready": ready,
+            "checks": checks,
+            "models": whisper_model_status(),
+            "asr": asr_slots().status(),
+            "memory": process_memory(),
+            "payload_cache": payload_cache_stats(),
+            "scheduler": scheduler.stats(),
+            "llm": llm_stats(),
+            "startup_seconds": app.config.get("STARTUP_SECONDS"),
+        }), (200 if ready else 503)
     
     # ---------------------------------------------------------
     # AUTH ROUTES
@@ -63,7 +306,10 @@ def create_app():
             final_username = f"{base_username}#{uuid.uuid4().hex[:4]}"
 
         new_user = User(email=email, username=final_username)
-        new_user.set_password(password)
+        try:
+            run_hashing(new_user.set_password, password)
+        except AuthBusyError as e:
+            return _auth_busy(e)
         
         try:
             db.session.add(new_user)
@@ -88,10 +334,20 @@ def create_app():
 
         user = User.query.filter_by(email=email).first()
 
-        if user and user.check_password(password):
+        try:
+            valid = bool(user) and run_hashing(user.check_password, password)
+        except AuthBusyError as e:
+            return _auth_busy(e)
+
+        if valid:
+            try:
+                access_token = issue_token(user.id)
+            except TokenKeyError as e:
+                return jsonify({"error": str(e)}), 503
             return jsonify({
-                "access_token": f"token_{user.id}_{uuid.uuid4().hex[:10]}",
+                "access_token": access_token,
                 "token_type": "bearer",
+                "expires_in": app.config["AUTH_TOKEN_TTL_SEC"],
                 "user": {
                     "id": user.id,
                     "username": user.username, 
@@ -106,6 +362,7 @@ def create_app():
     # ---------------------------------------------------------
     
     @app.post("/api/profile/check-username")
+    @resolve_user()
     def check_username_availability():
         """
         Checks if a full username (Name#Tag) is already taken.
@@ -113,7 +370,7 @@ def create_app():
         """
         data = request.get_json()
         full_username = data.get("username")
-        current_user_id = data.get("user_id")
+        current_user_id = g.user_id
 
         if not full_username:
             return jsonify({"available": False, "message": "Username required"}), 400
@@ -135,9 +392,10 @@ def create_app():
         return jsonify({"available": False, "message": "Username already taken"})
 
     @app.get("/api/profile/stats")
+    @resolve_user()
     def get_profile_stats():
         try:
-            user_id = request.args.get('user_id')
+            user_id = g.user_id
             
             if not user_id:
                 total_jobs = 0
@@ -167,9 +425,10 @@ def create_app():
             return jsonify({"error": str(e)}), 500
 
     @app.put("/api/profile/update")
+    @resolve_user()
     def update_profile():
         data = request.get_json()
-        user_id = data.get("user_id") 
+        user_id = g.user_id
         
         if not user_id:
              return jsonify({"error": "User ID required"}), 400
@@ -194,7 +453,11 @@ def create_app():
             user.email = data["email"]
 
         if "password" in data and data["password"]:
-            user.set_password(data["password"])
+            try:
+                run_hashing(user.set_password, data["password"])
+            except AuthBusyError as e:
+                db.session.rollback()
+                return _auth_busy(e)
 
         try:
             db.session.commit()
@@ -211,6 +474,7 @@ def create_app():
     # ---------------------------------------------------------
     
     @app.post("/api/jobs")
+    @resolve_user()
     def upload_audio():
         if "file" not in request.files:
             return jsonify({"error": "No file part in the request"}), 400
@@ -218,8 +482,9 @@ def create_app():
         if not f.filename:
             return jsonify({"error": "Filename is blank"}), 400
         
-        # Get user_id from form data
-        user_id = request.form.get('user_id')
+        # From the access token, or the legacy user_id form field
+        # Erişim token'ından veya eski user_id form alanından
+        user_id = g.user_id
 
         if not allowed_file(f.filename, app.config["ALLOWED_EXTENSIONS"]):
             return jsonify({"error": "Not allowed file type"}), 400
@@ -236,16 +501,64 @@ def create_app():
         new_name = f"{uuid.uuid4().hex}.{ext}"
         save_path = os.path.join(app.config["UPLOAD_FOLDER"], new_name)
         f.save(save_path)
+
+        # Header probe: reject undecodable files now instead of deep inside Whisper.
+        # Başlık taraması: çözülemeyen dosyaları Whisper'ın derinliklerinde değil, şimdi reddet.
+        try:
+            probe = probe_audio(save_path)
+        except AudioProbeError as e:
+            os.remove(save_path)
+            return jsonify({"error": f"Undecodable audio file: {str(e)}"}), 400
+        except Exception as e:
+            print(f"⚠️ AUDIO PROBE UNAVAILABLE: {str(e)}")
+            probe = {}
+
+        duration = probe.get("duration")
+        max_seconds = app.config["MAX_AUDIO_SECONDS"]
+        if duration and max_seconds and duration > max_seconds:
+            os.remove(save_path)
+            return jsonify({"error": f"Recording is longer than the {max_seconds / 60:.0f} minute limit."}), 413
+
+        quota_minutes = app.config["USER_AUDIO_MINUTES_QUOTA"]
+        if duration and quota_minutes and user_id:
+            used = db.session.query(func.coalesce(func.sum(Job.audio_duration), 0.0)).filter(
+                Job.user_id == user_id
+            ).scalar()
+            if used + duration > quota_minutes * 60:
+                os.remove(save_path)
+                return jsonify({
+                    "error": "Audio minutes quota exceeded.",
+                    "used_minutes": round(used / 60, 1),
+                    "quota_minutes": quota_minutes,
+                }), 429
         
-        job = Job(audio_path=save_path, status="uploaded", user_id=user_id)
+        job = Job(
+            audio_path=save_path, status="uploaded", user_id=user_id,
+            audio_duration=duration,
+            audio_codec=probe.get("codec"),
+            audio_channels=probe.get("channels"),
+            audio_sample_rate=probe.get("sample_rate"),
+        )
+
+        if app.config.get("NORMALIZE_ON_UPLOAD"):
+            try:
+                ensure_normalized_audio(job)
+            except Exception as e:
+                # Not fatal here: the first run retries normalization.
+                # Burada ölümcül değil: ilk çalıştırma normalizasyonu tekrar dener.
+                print(f"⚠️ AUDIO NORMALIZATION FAILED: {str(e)}")
         
         db.session.add(job)
         db.session.commit()
-        return jsonify(job.to_dict()), 201
+
+        payload = job.to_dict()
+        payload.update(estimate_processing(job.audio_duration))
+        return jsonify(payload), 201
 
     @app.post("/api/jobs/<int:job_id>/run")
+    @resolve_user()
     def run_job(job_id: int):
-        job = Job.query.get_or_404(job_id) 
+        job = _owned_job_or_404(job_id) 
         
         data = request.get_json(silent=True) or request.form.to_dict() or request.args.to_dict() or {}
         print(f"🌍 INCOMING FRONTEND DATA (RAW): {data}")
@@ -266,56 +579,47 @@ def create_app():
         val_flags = data.get("input_flags")
         if val_flags: 
             job.flags = val_flags
-        
-        try:
-            job.status = "processing"
-            job.error_message = None
-            db.session.commit()
-            
-            out = run_whisper_and_agent(
-                audio_path=job.audio_path,
-                summary_lang=job.summary_lang,
-                transcript_lang=job.transcript_lang,
-                keywords=job.input_keywords,
-                focus_exclusive=job.focus_exclusive,
-                flags=job.flags 
-            )
-            
-            job.conversation_type = out.get("conversation_type", "unknown")
-            job.summary = out.get("summary", "unknown")
-            job.keypoints_json = json.dumps(out.get("keypoints", []), ensure_ascii=False)
-            
-            segments_data = out.get("segments", []) or out.get("transcript_segments", [])
-            
-            try:
-                job.segments = segments_data
-            except:
-                pass 
-            
-            md = out.get("metadata") or {}
-            job.language = md.get("language")
-            job.clean_transcript = md.get("clean_transcript")
-            
-            job.status = "done"
-            job.run_count += 1
-            db.session.commit()
-
-            response_payload = job.to_dict()
-            response_payload['segments'] = segments_data 
-            
-            return jsonify(response_payload)
 
-        except Exception as e:
-            print(f"❌ ERROR DURING PROCESSING: {str(e)}")
-            job.status = "error"
-            job.error_message = str(e)
-            job.run_count += 1
+        # Extra output languages: list or comma-separated string, [] clears them.
+        # Ek çıktı dilleri: liste veya virgülle ayrılmış metin, [] temizler.
+        val_targets = data.get("targetLangs", data.get("target_langs"))
+        if val_targets is not None:
+            if isinstance(val_targets, str):
+                val_targets = val_targets.split(",")
+            langs = []
+            for lang in val_targets if isinstance(val_targets, list) else []:
+                lang = str(lang).strip().lower()
+                if lang and lang != "original" and lang not in langs:
+                    langs.append(lang)
+            if len(langs) > app.config["MAX_TARGET_LANGS"]:
+                return jsonify({"error": f"At most {app.config['MAX_TARGET_LANGS']} target languages are allowed."}), 400
+            job.target_langs = langs
+
+        error = _apply_processing_profile(job, data)
+        if error:
+            return error
+
+        if job.audio_tier == "dropped":
+            return jsonify({"error": "Audio was removed by the retention policy; use reanalyze instead."}), 410
+
+        job.priority = compute_priority(job, "run", data.get("priority"), trusted=is_admin_request())
+        job.profile_requested = _profile_flag(data)
+        if not _claim(job):
+            return _duplicate(job, "run", data)
+
+        if _queue_mode():
+            enqueue_job(job, "run")
             db.session.commit()
-            return jsonify(job.to_dict()), 500
+            return _wait_for_worker(job, wait=_wants_wait(data))
+
+        future = scheduler.reserve(job_id, job.user_id, job.priority, lambda ev: execute_run(job_id, ev), kind="run")
+        _commit_reserved(job_id)
+        return _respond_when_done(job, future, wait=_wants_wait(data))
 
     @app.post("/api/jobs/<int:job_id>/reanalyze")
+    @resolve_user()
     def reanalyze_job(job_id: int):
-        job = Job.query.get_or_404(job_id)
+        job = _owned_job_or_404(job_id)
         
         data = request.get_json(silent=True) or {}
         updated_segments = data.get("segments")
@@ -323,61 +627,180 @@ def create_app():
         if not updated_segments:
             return jsonify({"error": "No segments provided for re-analysis."}), 400
 
-        try:
-            print(f"♻️ RE-ANALYZING Job {job_id} with {len(updated_segments)} segments...")
-            job.status = "processing"
-            db.session.commit()
+        error = _apply_processing_profile(job, data)
+        if error:
+            return error
 
-            out = run_agent_on_text(
-                segments=updated_segments,
-                summary_lang=job.summary_lang,
-                transcript_lang=job.transcript_lang,
-                keywords=job.input_keywords,
-                focus_exclusive=job.focus_exclusive,
-                flags=job.flags
-            )
-
-            job.summary = out.get("summary", job.summary)
-            job.keypoints_json = json.dumps(out.get("keypoints", []), ensure_ascii=False)
-            
-            gemini_segments = out.get("segments")
-            if gemini_segments and len(gemini_segments) > 0:
-                job.segments = gemini_segments
-            else:
-                job.segments = updated_segments
+        job.priority = compute_priority(job, "reanalyze", data.get("priority"), trusted=is_admin_request())
+        job.profile_requested = _profile_flag(data)
+        # Edited segments may differ between requests, so a duplicate never attaches.
+        # Düzenlenen segmentler istekler arasında farklı olabilir; tekrar eden istek bağlanmaz.
+        if not _claim(job):
+            return _duplicate(job, "reanalyze", data, attachable=False)
 
-            job.status = "done"
+        if _queue_mode():
+            enqueue_job(job, "reanalyze", updated_segments)
             db.session.commit()
-
-            response_payload = job.to_dict()
-            response_payload['segments'] = job.segments
-            
-            return jsonify(response_payload)
-
+            return _wait_for_worker(job, wait=_wants_wait(data))
+
+        future = scheduler.reserve(
+            job_id, job.user_id, job.priority,
+            lambda ev: execute_reanalysis(job_id, updated_segments, ev), kind="reanalyze"
+        )
+        _commit_reserved(job_id)
+        if not _wants_wait(data):
+            return jsonify(job.to_dict()), 202
+        try:
+            return jsonify(future.result())
+        except JobCancelled:
+            db.session.refresh(job)
+            return jsonify(job.to_dict()), 409
         except Exception as e:
-            print(f"❌ ERROR DURING RE-ANALYSIS: {str(e)}")
-            job.status = "error"
-            job.error_message = str(e)
-            db.session.commit()
             return jsonify({"error": str(e)}), 500
         
     @app.post("/api/jobs/<int:job_id>/rerun")
+    @resolve_user()
     def rerun_job(job_id: int):
         return run_job(job_id)
 
+    @app.post("/api/jobs/<int:job_id>/cancel")
+    @resolve_user()
+    def cancel_job(job_id: int):
+        """
+        Removes a queued job, or interrupts a running one between Whisper windows / LLM calls.
+        Kuyruktaki işi kaldırır veya çalışanı Whisper pencereleri / LLM çağrıları arasında durdurur.
+        """
+        job = _owned_job_or_404(job_id)
+        if _queue_mode():
+            state = request_cancel(job_id)
+            db.session.refresh(job)
+            if state == "queued":
+                return jsonify(job.to_dict())
+        else:
+            state = scheduler.cancel(job_id)
+        if state is None:
+            return jsonify({"error": "Job is not queued or running.", "job": job.to_dict()}), 409
+
+        if state == "queued":
+            job.status = "cancelled"
+            job.error_message = "Cancelled by user."
+            db.session.commit()
+            return jsonify(job.to_dict())
+
+        # Running: the worker stops at the next checkpoint and marks the job cancelled.
+        # Çalışıyor: worker bir sonraki kontrol noktasında durur ve işi iptal edildi olarak işaretler.
+        return jsonify(job.to_dict()), 202
+
     @app.get("/api/jobs/<int:job_id>")
+    @resolve_user()
     def get_job(job_id: int):
-        job = Job.query.get_or_404(job_id)
-        return jsonify(job.to_dict())
+        lang = request.args.get("lang")
+        body = job_payload(job_id, lang, user_id=_owner_id())
+        if body is None:
+            job = _owned_job_or_404(job_id)
+            return jsonify({"error": f"No '{lang}' output for this job.", "available_langs": job.available_langs()}), 404
+        return json_bytes_response(body)
     
+    @app.get("/api/jobs/<int:job_id>/export")
+    @resolve_user()
+    def export_job(job_id: int):
+        """
+        Streams the transcript as srt | vtt | txt | docx (chunked transfer encoding).
+        Rendered files are cached per job version (updated_at).
+
+        Transkripti srt | vtt | txt | docx olarak akıtır (chunked transfer encoding).
+        Üretilen dosyalar iş sürümüne (updated_at) göre önbelleğe alınır.
+        """
+        job = _owned_job_or_404(job_id)
+        fmt = (request.args.get("format") or "txt").lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+        mimetype, ext = EXPORT_FORMATS[fmt]
+        download_name = f"job_{job_id}.{ext}"
+        cache_dir = app.config["EXPORT_CACHE_FOLDER"]
+        version = job.updated_at.strftime("%Y%m%d%H%M%S%f") if job.updated_at else "0"
+        cache_path = export_cache_path(cache_dir, job_id, version, ext)
+
+        if os.path.exists(cache_path):
+            return send_file(cache_path, mimetype=mimetype, as_attachment=True,
+                             download_name=download_name, conditional=True)
+
+        purge_exports(cache_dir, job_id, keep_version=version)
+        doc = {
+            "summary": job.summary,
+            "keypoints": json.loads(job.keypoints_json) if job.keypoints_json else [],
+            "segments": job.segments or [],
+        }
+        body = stream_and_cache(render_export(fmt, doc), cache_path)
+        return Response(body, mimetype=mimetype, headers={
+            "Content-Disposition": f'attachment; filename="{download_name}"',
+            "X-Export-Cache": "miss",
+        })
+
+    @app.get("/api/jobs/<int:job_id>/audio")
+    @resolve_user()
+    def job_audio(job_id: int):
+        """
+        Serves the job's audio for the player: Range/206 for instant seeking, ETag and
+        Last-Modified for revalidation. ?quality=low serves a low-bitrate Opus rendition;
+        the first request streams it while it is encoded, later ones get the cached file
+        with Range support.
+
+        İşin sesini oynatıcı için sunar: anında atlama için Range/206, yeniden doğrulama
+        için ETag ve Last-Modified. ?quality=low düşük bitrate Opus kopyasını sunar; ilk
+        istek kodlanırken akıtır, sonrakiler önbellekteki dosyayı Range desteğiyle alır.
+        """
+        job = _owned_job_or_404(job_id)
+        if job.audio_tier == "dropped":
+            return jsonify({"error": "Audio was removed by the retention policy."}), 410
+        if not job.audio_path or not os.path.exists(job.audio_path):
+            return jsonify({"error": "Audio file not found."}), 404
+
+        quality = (request.args.get("quality") or "original").lower()
+        if quality not in ("original", "low"):
+            return jsonify({"error": "quality must be 'original' or 'low'."}), 400
+
+        path = job.audio_path
+        # Retention already keeps old jobs as low-bitrate Opus.
+        # Saklama eski işleri zaten düşük bitrate Opus olarak tutar.
+        if quality == "low" and job.audio_tier != "opus":
+            stat = os.stat(path)
+            version = f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+            rendition_dir = app.config["AUDIO_RENDITION_FOLDER"]
+            rendition_path = export_cache_path(rendition_dir, job_id, version, "opus")
+            if not os.path.exists(rendition_path):
+                purge_exports(rendition_dir, job_id, keep_version=version)
+                body = stream_and_cache(
+                    iter_opus_transcode(path, app.config["AUDIO_STREAM_BITRATE"]), rendition_path
+                )
+                return Response(body, mimetype="audio/ogg", headers={
+                    "Accept-Ranges": "none",
+                    "Cache-Control": "no-store",
+                    "X-Rendition-Cache": "miss",
+                })
+            path = rendition_path
+
+        mimetype = AUDIO_MIMETYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+        # send_file answers Range (206/416), If-None-Match / If-Modified-Since (304) and
+        # hands the file to the WSGI server's file_wrapper (sendfile) or to X-Sendfile.
+        # send_file Range (206/416), If-None-Match / If-Modified-Since (304) isteklerini
+        # yanıtlar ve dosyayı WSGI sunucusunun file_wrapper'ına (sendfile) ya da X-Sendfile'a verir.
+        resp = send_file(path, mimetype=mimetype, conditional=True, etag=True,
+                         max_age=app.config["AUDIO_CACHE_MAX_AGE"])
+        resp.cache_control.public = False
+        resp.cache_control.private = True
+        return resp
+
     @app.get("/api/jobs")
+    @resolve_user()
     def list_jobs():
-        jobs = Job.query.order_by(Job.id.desc()).all()
-        return jsonify([j.to_dict() for j in jobs])
+        return json_bytes_response(jobs_list_payload(user_id=_owner_id()))
     
     @app.put("/api/jobs/<int:job_id>")
+    @resolve_user()
     def update_job(job_id: int):
-        job = Job.query.get_or_404(job_id)
+        job = _owned_job_or_404(job_id)
         data = request.get_json(silent=True) or {}  
         if data.get("conversation_type"): job.conversation_type = data.get("conversation_type")
         if data.get("summary"): job.summary = data.get("summary")
@@ -388,32 +811,70 @@ def create_app():
         return jsonify(job.to_dict())
 
     @app.delete("/api/jobs/<int:job_id>")
+    @resolve_user()
     def delete_job(job_id: int):
-        job = Job.query.get_or_404(job_id)
-        try:
-            if os.path.exists(job.audio_path):
-                os.remove(job.audio_path)
-        except Exception:
-            pass
+        job = _owned_job_or_404(job_id)
+        remove_job_files(job)
+        purge_exports(app.config["EXPORT_CACHE_FOLDER"], job_id)
+        purge_exports(app.config["AUDIO_RENDITION_FOLDER"], job_id)
+        forget_job(job_id)
         db.session.delete(job)
         db.session.commit()
         return jsonify({"deleted": job_id})
     
     @app.delete("/api/jobs")
+    @resolve_user()
     def delete_all():
         delete_files = request.args.get("delete_files", "true").lower() == "true"
-        jobs = Job.query.all()
+        owner = _owner_id()
+        owned = Job.user_id.is_(None) if owner is None else Job.user_id == owner
+        jobs = Job.query.filter(owned).all()
         for job in jobs:
             if delete_files:
-                try:
-                    if os.path.exists(job.audio_path):
-                        os.remove(job.audio_path)
-                except Exception:
-                    pass
+                remove_job_files(job)
+            purge_exports(app.config["EXPORT_CACHE_FOLDER"], job.id)
+            purge_exports(app.config["AUDIO_RENDITION_FOLDER"], job.id)
+            forget_job(job.id)
             db.session.delete(job)
         db.session.commit()
         return jsonify({"deleted_all": True, "count": len(jobs)})
 
+    # ---------------------------------------------------------
+    # ADMIN ROUTES
+    # ---------------------------------------------------------
+
+    @app.get("/api/admin/jobs/<int:job_id>/profile")
+    @admin_required
+    def job_profile(job_id: int):
+        """
+        cProfile report of the job's last profiled run: ?format=txt (default, top functions
+        by ?sort=cumulative|tottime|ncalls, ?limit=60) or ?format=prof (pstats/snakeviz file).
+
+        İşin son profillenen çalıştırmasının cProfile raporu: ?format=txt (varsayılan,
+        ?sort=cumulative|tottime|ncalls'a göre ilk ?limit=60 fonksiyon) veya ?format=prof
+        (pstats/snakeviz dosyası).
+        """
+        job = Job.query.get_or_404(job_id)
+        if not job.profile_path or not os.path.exists(job.profile_path):
+            return jsonify({"error": "No profile recorded for this job; run it with profile=true."}), 404
+
+        fmt = (request.args.get("format") or "txt").lower()
+        if fmt == "prof":
+            return send_file(job.profile_path, mimetype="application/octet-stream", as_attachment=True,
+                             download_name=os.path.basename(job.profile_path))
+        if fmt != "txt":
+            return jsonify({"error": "format must be 'txt' or 'prof'."}), 400
+
+        sort = request.args.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "ncalls"):
+            return jsonify({"error": "sort must be 'cumulative', 'tottime' or 'ncalls'."}), 400
+        limit = request.args.get("limit", 60, type=int)
+        return Response(render_profile(job.profile_path, sort, max(1, limit)), mimetype="text/plain")
+
+    # Time from importing this module until the app is ready to serve.
+    # Bu modülün içe aktarılmasından uygulamanın hizmete hazır olmasına kadar geçen süre.
+    app.config["STARTUP_SECONDS"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+    print(f"⏱️ App start-up: {app.config['STARTUP_SECONDS']}s")
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,180 @@
+# src/auth.py
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from flask import g, jsonify, request
+
+from config import Config
+
+
+class AuthBusyError(RuntimeError):
+    """Raised when the password-hashing pool is saturated."""
+
+
+class TokenKeyError(RuntimeError):
+    """Raised when SECRET_KEY is empty or the placeholder, so tokens cannot be signed safely."""
+
+
+# -----------------------------
+# 1) Signed access tokens
+# -----------------------------
+# Format: <base64url(json payload)>.<base64url(HMAC-SHA256 signature)>
+# Verification needs only SECRET_KEY, no database round-trip.
+# Biçim: <base64url(json yük)>.<base64url(HMAC-SHA256 imza)>
+# Doğrulama sadece SECRET_KEY ister, veritabanına gidilmez.
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+# Keys anyone can guess: a token signed with one of these could be forged.
+# Herkesin tahmin edebileceği anahtarlar: bunlarla imzalanan token taklit edilebilir.
+_INSECURE_KEYS = ("", "CHANGE_ME_IN_PRODUCTION")
+
+
+def tokens_enabled() -> bool:
+    return (Config.SECRET_KEY or "").strip() not in _INSECURE_KEYS
+
+
+def _sign(body: str) -> str:
+    if not tokens_enabled():
+        raise TokenKeyError("SECRET_KEY is not set; access tokens are disabled.")
+    key = Config.SECRET_KEY.encode("utf-8")
+    return _b64encode(hmac.new(key, body.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(user_id: int, ttl_sec: Optional[int] = None) -> str:
+    now = int(time.time())
+    payload = {"uid": int(user_id), "iat": now, "exp": now + (ttl_sec or Config.AUTH_TOKEN_TTL_SEC)}
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{body}.{_sign(body)}"
+
+
+def verify_token(token: str) -> Optional[int]:
+    """
+    Returns the user id for a valid, unexpired token, otherwise None.
+    Raises TokenKeyError when SECRET_KEY is not set.
+    Geçerli ve süresi dolmamış token için kullanıcı id'sini, aksi halde None döner.
+    SECRET_KEY ayarlı değilse TokenKeyError fırlatır.
+    """
+    try:
+        body, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(body)):
+            return None
+        payload = json.loads(_b64decode(body))
+        if int(payload["exp"]) < time.time():
+            return None
+        return int(payload["uid"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _legacy_user_id() -> Any:
+    data = request.get_json(silent=True) if request.is_json else None
+    return (
+        request.args.get("user_id")
+        or request.form.get("user_id")
+        or (data.get("user_id") if isinstance(data, dict) else None)
+    )
+
+
+def resolve_user(required: bool = False) -> Callable:
+    """
+    Route decorator that sets g.user_id from `Authorization: Bearer <token>`.
+    Without a token it falls back to the legacy `user_id` parameter, unless
+    `required` or Config.AUTH_REQUIRED is set.
+
+    `Authorization: Bearer <token>` başlığından g.user_id'yi ayarlayan dekoratör.
+    Token yoksa, `required` veya Config.AUTH_REQUIRED ayarlı değilse eski
+    `user_id` parametresine geri döner.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get("Authorization", "")
+            if header.lower().startswith("bearer "):
+                try:
+                    user_id = verify_token(header[7:].strip())
+                except TokenKeyError as e:
+                    return jsonify({"error": str(e)}), 503
+                if user_id is None:
+                    return jsonify({"error": "Invalid or expired token."}), 401
+                g.user_id = user_id
+                g.authenticated = True
+            elif required or Config.AUTH_REQUIRED:
+                return jsonify({"error": "Authorization token required."}), 401
+            else:
+                g.user_id = _legacy_user_id()
+                g.authenticated = False
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_admin_request() -> bool:
+    """
+    True when the request carries a valid `X-Admin-Token` (and ADMIN_TOKEN is set).
+    İstek geçerli bir `X-Admin-Token` taşıyorsa (ve ADMIN_TOKEN ayarlıysa) True.
+    """
+    if not Config.ADMIN_TOKEN:
+        return False
+    token = request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(token.encode("utf-8"), Config.ADMIN_TOKEN.encode("utf-8"))
+
+
+def admin_required(view):
+    """
+    Route decorator for /api/admin/*: requires `X-Admin-Token: <ADMIN_TOKEN>`.
+    Without a configured ADMIN_TOKEN the admin routes do not exist (404).
+
+    /api/admin/* için dekoratör: `X-Admin-Token: <ADMIN_TOKEN>` ister.
+    ADMIN_TOKEN ayarlı değilse admin route'ları yok sayılır (404).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not Config.ADMIN_TOKEN:
+            return jsonify({"error": "Not found."}), 404
+        if not is_admin_request():
+            return jsonify({"error": "Admin token required."}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# -----------------------------
+# 2) Off-thread password hashing
+# -----------------------------
+# PBKDF2/scrypt are CPU-heavy. They run on a small bounded pool so a login burst
+# cannot occupy every request thread; when the pool and its queue are full the
+# caller gets AuthBusyError (-> 503) instead of piling up.
+# PBKDF2/scrypt CPU-yoğundur. Küçük, sınırlı bir havuzda çalışırlar; böylece bir giriş
+# patlaması tüm istek thread'lerini meşgul edemez. Havuz ve kuyruğu doluysa çağıran
+# AuthBusyError (-> 503) alır.
+_HASH_EXECUTOR = ThreadPoolExecutor(max_workers=Config.AUTH_HASH_WORKERS, thread_name_prefix="pw-hash")
+_HASH_SLOTS = threading.BoundedSemaphore(Config.AUTH_HASH_WORKERS + Config.AUTH_HASH_QUEUE)
+
+
+def run_hashing(fn: Callable, *args) -> Any:
+    if not _HASH_SLOTS.acquire(blocking=False):
+        raise AuthBusyError("Too many concurrent authentication requests.")
+    try:
+        future = _HASH_EXECUTOR.submit(fn, *args)
+    except Exception:
+        _HASH_SLOTS.release()
+        raise
+    future.add_done_callback(lambda _f: _HASH_SLOTS.release())
+    try:
+        return future.result(timeout=Config.AUTH_HASH_TIMEOUT_SEC)
+    except FutureTimeout:
+        raise AuthBusyError("Password hashing timed out.")
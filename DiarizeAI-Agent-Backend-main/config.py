@@ -17,9 +17,28 @@ INSTANCE_DIR = BASE_DIR / "instance"
 load_dotenv(BASE_DIR / ".env")
 
 # -------------------------------------------------
-# 3) Config Class
+# 3) Model chain parsing (also used for per-request chains in diarize_agent.agent)
+# 3) Model zinciri ayrıştırma (diarize_agent.agent'taki istek bazlı zincirler için de)
+# -------------------------------------------------
+def parse_model_chain(text: str) -> list:
+    """
+    "a,b@https://proxy/v1beta" -> ["a", "b@https://proxy/v1beta"]; the LiteLLM-style
+    "gemini/" prefix is dropped and empty entries are skipped.
+
+    "a,b@https://proxy/v1beta" -> ["a", "b@https://proxy/v1beta"]; LiteLLM tarzı
+    "gemini/" öneki atılır ve boş elemanlar atlanır.
+    """
+    return [
+        m.strip()[len("gemini/"):] if m.strip().startswith("gemini/") else m.strip()
+        for m in (text or "").split(",")
+        if m.strip()
+    ]
+
+
+# -------------------------------------------------
+# 4) Config Class
 # Flask, database, uploads, and LLM settings are collected here.
-# 3) Config Sınıfı
+# 4) Config Sınıfı
 # Flask, veritabanı, yüklemeler ve LLM ayarları burada toplanır.
 # -------------------------------------------------
 class Config:
@@ -39,9 +58,43 @@ class Config:
         "CHANGE_ME_IN_PRODUCTION"
     )
     # SECRET_KEY is loaded from .env.
-    # Mandatory for Flask session security.
+    # Mandatory for Flask session security. While it is empty or the default above,
+    # access tokens are neither issued nor accepted (login and Bearer requests get 503).
     # .env içindeki SECRET_KEY buraya yüklenir.
-    # Flask session güvenliği için zorunludur.
+    # Flask session güvenliği için zorunludur. Boş ya da yukarıdaki varsayılan olduğu sürece
+    # erişim token'ı ne verilir ne kabul edilir (giriş ve Bearer istekleri 503 alır).
+
+    # ---------------------------------------------
+    # 🔑 Auth Tokens & Password Hashing
+    # ---------------------------------------------
+    # Access tokens are HMAC-signed with SECRET_KEY and expire after this many seconds.
+    # Erişim token'ları SECRET_KEY ile HMAC imzalanır ve bu kadar saniye sonra geçersiz olur.
+    AUTH_TOKEN_TTL_SEC = int(os.getenv("AUTH_TOKEN_TTL_SEC", str(7 * 24 * 3600)))
+
+    # If true, routes reject requests without a Bearer token instead of
+    # falling back to the legacy user_id parameter. Job routes only serve the
+    # caller's own jobs, but while this is false the caller is whoever the user_id
+    # parameter names (a request without one sees only jobs without an owner), so job
+    # data is only protected with AUTH_REQUIRED=true.
+    # true ise route'lar eski user_id parametresine dönmek yerine token'sız istekleri reddeder.
+    # İş route'ları sadece çağıranın kendi işlerini sunar; ancak bu false iken çağıran,
+    # user_id parametresinin söylediği kişidir (parametresiz istek sadece sahipsiz işleri
+    # görür); yani iş verileri sadece AUTH_REQUIRED=true ile korunur.
+    AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+
+    # Token for /api/admin/* (X-Admin-Token header); empty disables the admin endpoints.
+    # /api/admin/* için token (X-Admin-Token başlığı); boşsa admin uç noktaları kapalıdır.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+    # Werkzeug hash method, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1".
+    # Werkzeug hash yöntemi, örn. "pbkdf2:sha256:600000" veya "scrypt:32768:8:1".
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+
+    # Bounded pool for hashing: worker threads, extra queued requests, wait timeout.
+    # Hash için sınırlı havuz: worker thread'leri, ek bekleyen istekler, bekleme süresi.
+    AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+    AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", "16"))
+    AUTH_HASH_TIMEOUT_SEC = float(os.getenv("AUTH_HASH_TIMEOUT_SEC", "10"))
 
     # ---------------------------------------------
     # 🛠 Debug Mode
@@ -65,6 +118,42 @@ class Config:
         str((BASE_DIR / "instance").resolve())
     )
 
+    # Rendered transcript exports (srt/vtt/txt/docx), cached per job version.
+    # Üretilen transkript dışa aktarımları (srt/vtt/txt/docx), iş sürümüne göre önbellekte.
+    EXPORT_CACHE_FOLDER = os.getenv(
+        "EXPORT_CACHE_FOLDER",
+        str(Path(INSTANCE_FOLDER) / "exports")
+    )
+
+    # Low-bitrate Opus renditions served by /api/jobs/<id>/audio?quality=low.
+    # /api/jobs/<id>/audio?quality=low ile sunulan düşük bitrate Opus kopyaları.
+    AUDIO_RENDITION_FOLDER = os.getenv(
+        "AUDIO_RENDITION_FOLDER",
+        str(Path(INSTANCE_FOLDER) / "renditions")
+    )
+    AUDIO_STREAM_BITRATE = os.getenv("AUDIO_STREAM_BITRATE", "32k")
+    # Browser/player cache lifetime of served audio (seconds); ETag revalidation after that.
+    # Sunulan sesin tarayıcı/oynatıcı önbellek süresi (sn); sonrasında ETag ile doğrulanır.
+    AUDIO_CACHE_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", "3600"))
+    # cProfile reports of profiled runs (.prof), downloadable by admins.
+    # Profillenen çalıştırmaların cProfile raporları (.prof), adminler indirebilir.
+    PROFILE_FOLDER = os.getenv(
+        "PROFILE_FOLDER",
+        str(Path(INSTANCE_FOLDER) / "profiles")
+    )
+    # Share of runs profiled without being asked (0..1); `profile=true` on run forces it.
+    # İstenmeden profillenen çalıştırma oranı (0..1); run'da `profile=true` her zaman açar.
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    # In-process cache of encoded job JSON for GET /api/jobs[/<id>] (MB, 0 = off).
+    # GET /api/jobs[/<id>] için kodlanmış iş JSON'unun süreç içi önbelleği (MB, 0 = kapalı).
+    JOB_PAYLOAD_CACHE_MB = float(os.getenv("JOB_PAYLOAD_CACHE_MB", "64"))
+
+    # Behind Apache/lighttpd (or nginx with an X-Sendfile module): let the front server
+    # send files itself. Otherwise the WSGI server's file_wrapper (sendfile) is used.
+    # Apache/lighttpd (veya X-Sendfile modüllü nginx) arkasında: dosyaları ön sunucu
+    # kendisi göndersin. Aksi halde WSGI sunucusunun file_wrapper'ı (sendfile) kullanılır.
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "false").lower() == "true"
+
     # ---------------------------------------------
     # 📏 File Upload Limits & Extensions
     # ---------------------------------------------
@@ -77,6 +166,34 @@ class Config:
     # Sadece izin verilen ses uzantıları
     ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'ogg', 'webm'}
 
+    # Admission limits from the upload header probe (0 = unlimited):
+    # longest accepted recording (seconds) and audio minutes per user.
+    # Yükleme başlık taramasına göre kabul sınırları (0 = sınırsız):
+    # kabul edilen en uzun kayıt (saniye) ve kullanıcı başına ses dakikası.
+    MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", "0"))
+    USER_AUDIO_MINUTES_QUOTA = float(os.getenv("USER_AUDIO_MINUTES_QUOTA", "0"))
+
+    # Decode each upload once into a 16 kHz mono PCM cache next to it.
+    # If false (or ffmpeg fails), the cache is built on the first run instead.
+    # Her yüklemeyi bir kez yanındaki 16 kHz mono PCM önbelleğine çöz.
+    # false ise (veya ffmpeg başarısız olursa) önbellek ilk çalıştırmada oluşturulur.
+    NORMALIZE_ON_UPLOAD = os.getenv("NORMALIZE_ON_UPLOAD", "true").lower() == "true"
+
+    # ---------------------------------------------
+    # 🧹 Audio Retention
+    # ---------------------------------------------
+    # Finished jobs older than N days get their audio transcoded to Opus;
+    # older than M days the audio is deleted (transcript kept). 0 disables a tier.
+    # N günden eski bitmiş işlerin sesi Opus'a dönüştürülür; M günden eskilerin
+    # sesi silinir (transkript kalır). 0 o kademeyi kapatır.
+    RETENTION_TRANSCODE_AFTER_DAYS = float(os.getenv("RETENTION_TRANSCODE_AFTER_DAYS", "30"))
+    RETENTION_DROP_AUDIO_AFTER_DAYS = float(os.getenv("RETENTION_DROP_AUDIO_AFTER_DAYS", "0"))
+    RETENTION_OPUS_BITRATE = os.getenv("RETENTION_OPUS_BITRATE", "24k")
+
+    # Run retention inside the API process every N hours (0 = only via `python retention.py`).
+    # Saklamayı API sürecinde her N saatte bir çalıştır (0 = sadece `python retention.py` ile).
+    RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "0"))
+
     # ---------------------------------------------
     # 🗄 Database URL
     # ---------------------------------------------
@@ -87,12 +204,41 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite: wait for locks instead of failing when API and workers write at once.
+    # SQLite: API ve worker'lar aynı anda yazarken hata vermek yerine kilidi bekle.
+    SQLALCHEMY_ENGINE_OPTIONS = (
+        {"connect_args": {"timeout": 30}} if DATABASE_URL.startswith("sqlite") else {}
+    )
+
     # ---------------------------------------------
     # 🤖 LLM Model Settings (LiteLLM)
     # ---------------------------------------------
-    # Default to Gemini 2.0 Flash; override with LLM_MODEL in .env
-    # Varsayılan Gemini 2.0 Flash; .env içinde LLM_MODEL ile değiştirilebilir
-    LLM_MODEL = os.getenv("LLM_MODEL", "gemini/gemini-2.0-flash")
+    # Default to Gemini 2.5 Flash; override with LLM_MODEL in .env
+    # Varsayılan Gemini 2.5 Flash; .env içinde LLM_MODEL ile değiştirilebilir
+    LLM_MODEL = os.getenv("LLM_MODEL", "gemini/gemini-2.5-flash")
+
+    # Ordered fallback chain (comma separated, primary first). An entry is a model name,
+    # optionally with its own endpoint: "gemini-2.5-flash@https://proxy/v1beta".
+    # The LiteLLM-style "gemini/" prefix is accepted and dropped.
+    # Sıralı yedek zinciri (virgülle ayrılmış, birincil önce). Bir eleman model adıdır,
+    # isteğe bağlı kendi uç noktasıyla: "gemini-2.5-flash@https://proxy/v1beta".
+    # LiteLLM tarzı "gemini/" öneki kabul edilir ve atılır.
+    LLM_MODEL_CHAIN = parse_model_chain(os.getenv("LLM_MODEL_CHAIN") or LLM_MODEL)
+
+    # Hedging: if the current model has not answered after its p95 latency (scaled to the
+    # prompt size, at least LLM_HEDGE_MIN_SEC), the next model in the chain is asked too and
+    # the first valid answer wins. Until LLM_HEDGE_MIN_SAMPLES answers were measured for a
+    # model, LLM_HEDGE_DEFAULT_SEC is used. false = plain fallback (next model only on error).
+    # Hedging: mevcut model p95 gecikmesinde (prompt boyutuna göre ölçeklenmiş, en az
+    # LLM_HEDGE_MIN_SEC) cevap vermediyse zincirdeki sonraki modele de sorulur ve ilk geçerli
+    # cevap kazanır. Bir model için LLM_HEDGE_MIN_SAMPLES cevap ölçülene kadar
+    # LLM_HEDGE_DEFAULT_SEC kullanılır. false = düz yedekleme (sonraki model sadece hatada).
+    # Requires LLM_STREAMING=true: only a streamed attempt can be stopped when it loses.
+    # LLM_STREAMING=true gerektirir: sadece akışlı bir deneme kaybettiğinde durdurulabilir.
+    LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+    LLM_HEDGE_MIN_SEC = float(os.getenv("LLM_HEDGE_MIN_SEC", "10"))
+    LLM_HEDGE_DEFAULT_SEC = float(os.getenv("LLM_HEDGE_DEFAULT_SEC", "60"))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
 
     # Provider API keys (LiteLLM reads provider-specific env vars too)
     # Sağlayıcı API anahtarları (LiteLLM sağlayıcıya özel env değişkenlerini de okur)
@@ -102,8 +248,165 @@ class Config:
     # LiteLLM'e açıkça api_key geçirdiğimizde kullanılacak anahtar.
     LLM_API_KEY = GOOGLE_API_KEY 
 
+    # Per-request prompt budget (locally estimated tokens). Longer transcripts are
+    # analyzed in windows that fit and merged by a reduce call.
+    # İstek başına prompt bütçesi (yerel olarak tahmin edilen token). Daha uzun
+    # transkriptler sığan pencerelerde analiz edilip bir birleştirme çağrısıyla birleştirilir.
+    LLM_MAX_PROMPT_TOKENS = int(os.getenv("LLM_MAX_PROMPT_TOKENS", "200000"))
+
+    # Truncated JSON answers are salvaged and only the missing segments are requested,
+    # at most this many times per call (0 = fall back to a full retry).
+    # Kesik JSON cevapları kurtarılır ve sadece eksik segmentler istenir; çağrı başına
+    # en fazla bu kadar kez (0 = tam tekrar denemeye dön).
+    LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "3"))
+
+    # Focus-exclusive mode with keywords: transcripts of at least this many segments send
+    # only the BM25-matching rows (top K, each with N rows of context) to the summary call;
+    # a small call names the speakers for all rows. 0 = always send every segment.
+    # Anahtar kelimeli odak modu: en az bu kadar segmentli transkriptlerde özet çağrısına
+    # sadece BM25 ile eşleşen satırlar (ilk K, her biri N satır bağlamla) gönderilir;
+    # küçük bir çağrı tüm satırların konuşmacılarını adlandırır. 0 = her zaman tüm segmentler.
+    FOCUS_RETRIEVAL_MIN_SEGMENTS = int(os.getenv("FOCUS_RETRIEVAL_MIN_SEGMENTS", "120"))
+    FOCUS_RETRIEVAL_TOP_K = int(os.getenv("FOCUS_RETRIEVAL_TOP_K", "40"))
+    FOCUS_RETRIEVAL_NEIGHBORS = int(os.getenv("FOCUS_RETRIEVAL_NEIGHBORS", "2"))
+
+    # Gemini REST base URL (override to point at a proxy or a local mock server).
+    # Gemini REST temel adresi (bir proxy'e veya yerel sahte sunucuya yönlendirmek için).
+    GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+
+    # Streaming: use streamGenerateContent, persist summary/segments while they arrive,
+    # and keep the partial answer if no chunk arrives for LLM_STREAM_STALL_SEC.
+    # Akış: streamGenerateContent kullan, özet/segmentleri geldikçe kaydet ve
+    # LLM_STREAM_STALL_SEC boyunca parça gelmezse kısmi cevabı koru.
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() == "true"
+    LLM_STREAM_STALL_SEC = float(os.getenv("LLM_STREAM_STALL_SEC", "30"))
+    LLM_PARTIAL_FLUSH_SEC = float(os.getenv("LLM_PARTIAL_FLUSH_SEC", "2"))
+
+    # Pipelined mode: once this many minutes of transcript are ready, an LLM call
+    # analyzes them while Whisper continues; a final reduce call merges the windows.
+    # Granularity is bounded by WHISPER_WINDOW_SEC. 0 = sequential (ASR, then one LLM call).
+    # Ardışık mod: bu kadar dakikalık transkript hazır olunca Whisper devam ederken bir LLM
+    # çağrısı onu analiz eder; son bir birleştirme çağrısı pencereleri birleştirir.
+    # Ayrıntı WHISPER_WINDOW_SEC ile sınırlıdır. 0 = sıralı (önce ASR, sonra tek LLM çağrısı).
+    PIPELINE_LLM_WINDOW_MINUTES = float(os.getenv("PIPELINE_LLM_WINDOW_MINUTES", "0"))
+    PIPELINE_LLM_WORKERS = int(os.getenv("PIPELINE_LLM_WORKERS", "2"))
+
+    # Extra output languages per job (each adds one concurrent LLM call, no extra Whisper run).
+    # İş başına ek çıktı dili (her biri eşzamanlı bir LLM çağrısı ekler, ek Whisper yok).
+    MAX_TARGET_LANGS = int(os.getenv("MAX_TARGET_LANGS", "4"))
+
     # ---------------------------------------------
     # 🔊 Whisper Settings (Optional/Future)
     # ---------------------------------------------
     WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
-    HF_TOKEN = os.getenv("HF_TOKEN", "")
\ No newline at end of file
+    HF_TOKEN = os.getenv("HF_TOKEN", "")
+
+    # Audio is transcribed in windows of this many seconds; cancellation is
+    # checked between windows. Minimum is Whisper's own 30 s chunk.
+    # Ses bu kadar saniyelik pencerelerle transkribe edilir; iptal pencereler
+    # arasında kontrol edilir. En az Whisper'ın kendi 30 sn'lik parçasıdır.
+    WHISPER_WINDOW_SEC = float(os.getenv("WHISPER_WINDOW_SEC", "300"))
+
+    # Consecutive windows overlap by this many seconds (at most a quarter of a window), so
+    # words at a window edge are not cut; duplicate segments from the overlap are dropped.
+    # Ardışık pencereler bu kadar saniye örtüşür (en fazla pencerenin dörtte biri); böylece
+    # pencere kenarındaki kelimeler kesilmez, örtüşmeden gelen tekrar segmentler atılır.
+    WHISPER_WINDOW_OVERLAP_SEC = float(os.getenv("WHISPER_WINDOW_OVERLAP_SEC", "5"))
+
+    # Processing profile of a run that does not choose one (fast | balanced | accurate),
+    # and optional JSON overrides, e.g. {"accurate": {"whisper_model": "large-v3"}}.
+    # See diarize_agent/profiles.py for the fields.
+    # Profil seçmeyen çalıştırmanın işleme profili (fast | balanced | accurate) ve isteğe
+    # bağlı JSON değişiklikleri, örn. {"accurate": {"whisper_model": "large-v3"}}.
+    # Alanlar için bkz. diarize_agent/profiles.py.
+    DEFAULT_PROCESSING_PROFILE = os.getenv("DEFAULT_PROCESSING_PROFILE", "balanced").lower()
+    PROCESSING_PROFILES = os.getenv("PROCESSING_PROFILES", "")
+
+    # Peak memory (MB) one transcription may spend on a window: decoded samples plus
+    # Whisper's log-mel/STFT buffers. Longer windows are shortened to fit, so peak RSS
+    # stays flat regardless of recording length (0 = no cap).
+    # Bir transkripsiyonun bir pencere için harcayabileceği tepe bellek (MB): çözülmüş
+    # örnekler artı Whisper'ın log-mel/STFT tamponları. Daha uzun pencereler sığacak
+    # şekilde kısaltılır; tepe RSS kayıt süresinden bağımsız sabit kalır (0 = sınır yok).
+    ASR_DECODE_MAX_MB = float(os.getenv("ASR_DECODE_MAX_MB", "256"))
+
+    # Local speaker diarization (MFCC embeddings + clustering, NumPy on CPU) runs next to
+    # Whisper on the same decoded audio and labels segments SPEAKER_XX before the LLM.
+    # Clusters are merged while BIC says they are one voice; a higher
+    # DIARIZATION_BIC_PENALTY merges more (fewer speakers). Off unless enabled.
+    # Yerel konuşmacı ayrımı (MFCC vektörleri + kümeleme, CPU'da NumPy) aynı çözülmüş ses
+    # üzerinde Whisper'ın yanında çalışır ve segmentleri LLM'den önce SPEAKER_XX olarak
+    # etiketler. Kümeler BIC tek ses dedikçe birleştirilir; daha yüksek
+    # DIARIZATION_BIC_PENALTY daha çok birleştirir (daha az konuşmacı). Açılmadıkça kapalı.
+    DIARIZATION_ENABLED = os.getenv("DIARIZATION_ENABLED", "false").lower() == "true"
+    DIARIZATION_MAX_SPEAKERS = int(os.getenv("DIARIZATION_MAX_SPEAKERS", "6"))
+    DIARIZATION_BIC_PENALTY = float(os.getenv("DIARIZATION_BIC_PENALTY", "7"))
+
+    # CPU budget for concurrent transcriptions in one process: at most ASR_CONCURRENCY
+    # run at once with ASR_THREADS_PER_JOB torch threads each (0 = derived from the cores
+    # and the model size; `python -m diarize_agent.tools.cpu_budget --benchmark` measures
+    # the best split). ASR_PIN_CORES pins each transcription to its own core set (Linux).
+    # Tek süreçte eşzamanlı transkripsiyonlar için CPU bütçesi: en fazla ASR_CONCURRENCY
+    # tanesi, her biri ASR_THREADS_PER_JOB torch thread'iyle çalışır (0 = çekirdek sayısı ve
+    # model boyutundan türetilir; en iyi bölünmeyi
+    # `python -m diarize_agent.tools.cpu_budget --benchmark` ölçer). ASR_PIN_CORES her
+    # transkripsiyonu kendi çekirdek kümesine sabitler (Linux).
+    ASR_CONCURRENCY = int(os.getenv("ASR_CONCURRENCY", "0"))
+    ASR_THREADS_PER_JOB = int(os.getenv("ASR_THREADS_PER_JOB", "0"))
+    ASR_INTEROP_THREADS = int(os.getenv("ASR_INTEROP_THREADS", "1"))
+    ASR_PIN_CORES = os.getenv("ASR_PIN_CORES", "false").lower() == "true"
+
+    # ---------------------------------------------
+    # 🗂 Job Scheduling
+    # ---------------------------------------------
+    # Jobs processed at once by this process, and at most per user. Users take turns;
+    # priority only orders a user's own jobs (a request's "priority" needs X-Admin-Token).
+    # Bu sürecin aynı anda işlediği iş sayısı ve kullanıcı başına üst sınır. Kullanıcılar
+    # sırayla hizmet alır; öncelik sadece kullanıcının kendi işlerini sıralar (isteğin
+    # "priority" alanı X-Admin-Token ister).
+    SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+    SCHEDULER_PER_USER_LIMIT = int(os.getenv("SCHEDULER_PER_USER_LIMIT", "1"))
+
+    # inline: the API process runs jobs itself (JobScheduler threads).
+    # queue:  the API only enqueues; `python worker.py` processes claim jobs via DB leases.
+    # inline: API süreci işleri kendisi çalıştırır (JobScheduler thread'leri).
+    # queue:  API sadece kuyruğa alır; `python worker.py` süreçleri işleri DB kirasıyla alır.
+    JOB_EXECUTION = os.getenv("JOB_EXECUTION", "inline").lower()
+
+    # Lease length, heartbeat period and retry limit for queue workers (seconds).
+    # Kuyruk worker'ları için kira süresi, heartbeat aralığı ve deneme sınırı (saniye).
+    LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "60"))
+    LEASE_HEARTBEAT_SEC = int(os.getenv("LEASE_HEARTBEAT_SEC", "15"))
+    LEASE_MAX_ATTEMPTS = int(os.getenv("LEASE_MAX_ATTEMPTS", "3"))
+    WORKER_POLL_SEC = float(os.getenv("WORKER_POLL_SEC", "2"))
+
+    # In queue mode, how long a blocking /run request waits for a worker (seconds).
+    # Kuyruk modunda bloklayan /run isteğinin worker'ı bekleme süresi (saniye).
+    QUEUE_WAIT_TIMEOUT_SEC = float(os.getenv("QUEUE_WAIT_TIMEOUT_SEC", "900"))
+
+    # Inline mode: a lease-less job left in queued/processing longer than this (seconds)
+    # by a crashed process may be started again; younger ones count as in flight (0 = never).
+    # Inline mod: çöken bir sürecin bundan uzun süre (sn) queued/processing bıraktığı kirasız
+    # iş yeniden başlatılabilir; daha yenileri çalışıyor sayılır (0 = asla).
+    JOB_STALE_AFTER_SEC = float(os.getenv("JOB_STALE_AFTER_SEC", "21600"))
+
+    # Recordings up to this length (seconds) get a priority boost.
+    # Bu uzunluğa (saniye) kadar olan kayıtlar öncelik artışı alır.
+    SHORT_CLIP_SECONDS = float(os.getenv("SHORT_CLIP_SECONDS", "120"))
+
+    # ---------------------------------------------
+    # 🚀 Start-up & Readiness
+    # ---------------------------------------------
+    # Whisper/torch are loaded lazily on the first job. Set WARMUP_MODELS=true on
+    # processing replicas to load the DEFAULT_PROCESSING_PROFILE model in the background
+    # right after start-up; other profiles' models still load on their first job.
+    # Whisper/torch ilk işte tembel olarak yüklenir. İşleyen replikalarda
+    # WARMUP_MODELS=true ile DEFAULT_PROCESSING_PROFILE modeli başlangıçtan hemen sonra
+    # arka planda yüklenir; diğer profillerin modelleri yine ilk işlerinde yüklenir.
+    WARMUP_MODELS = os.getenv("WARMUP_MODELS", "false").lower() == "true"
+
+    # If true, /readyz returns 503 until the Whisper model is warm.
+    # true ise /readyz, Whisper modeli ısınana kadar 503 döner.
+    READY_REQUIRES_MODELS = os.getenv(
+        "READY_REQUIRES_MODELS", str(WARMUP_MODELS)
+    ).lower() == "true"
\ No newline at end of file
@@ -2,21 +2,30 @@
 
 import os
 import json
+import queue
 import re
+import threading
 import time  # Bekleme modülü
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, ValidationError
 
+from config import Config, parse_model_chain
+from diarize_agent.cancellation import JobCancelled, raise_if_cancelled, sleep_unless_cancelled
+from diarize_agent.json_repair import JsonStreamObserver, repair_json
+from diarize_agent.retrieval import select_focus_rows
+
 
 # -----------------------------
 # 1) Schema Definition
 # -----------------------------
 class SegmentItem(BaseModel):
-    start: float = Field(..., description="Start time in seconds")
-    end: float = Field(..., description="End time in seconds")
+    idx: Optional[int] = Field(None, description="Index of the input row this segment belongs to")
+    start: Optional[float] = Field(None, description="Start time in seconds")
+    end: Optional[float] = Field(None, description="End time in seconds")
     speaker: str = Field(..., description="Real Name (e.g. Efe) if detected, otherwise Speaker Label")
     text: str = Field(..., description="Corrected/Translated text content")
 
@@ -37,88 +46,242 @@ class StructuredSummary(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Extra info, includes language, clean_transcript")
 
 
+class ReducedSummary(BaseModel):
+    """Final merge of per-window partial analyses (pipelined mode)."""
+    conversation_type: str = Field(..., description="meeting | university_lecture | phone_call | interview | other")
+    summary: str = Field(..., description="Overall summary of the whole recording")
+    keypoints: List[str] = Field(default_factory=list, description="3–10 key bullet points")
+    speaker_aliases: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Speaker name used in a window -> canonical name for the whole recording"
+    )
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Extra info, includes language")
+
+
+class SpeakerAliases(BaseModel):
+    """Speaker code -> real name, from the cheap naming pass of focused mode."""
+    speaker_aliases: Dict[str, str] = Field(default_factory=dict, description="Speaker code -> real name")
+
+
 # -----------------------------
 # 2) Helpers
 # -----------------------------
-def _strip_code_fences(text: str) -> str:
-    text = text.strip()
-    m = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, flags=re.DOTALL | re.IGNORECASE)
-    if m:
-        return m.group(1).strip()
-    return text
+# Process-wide parse/retry counters, exposed on /readyz.
+# Süreç genelinde ayrıştırma/tekrar sayaçları, /readyz üzerinden görünür.
+_LLM_STATS = {"responses": 0, "clean": 0, "repaired": 0, "continuations": 0, "full_retries": 0, "failed": 0}
+_LLM_STATS_LOCK = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _LLM_STATS_LOCK:
+        _LLM_STATS[key] = _LLM_STATS.get(key, 0) + 1
+
+
+# Per-model outcome counters and recent latencies (seconds per 1k prompt tokens, so
+# short and long prompts are comparable). The hedge threshold is derived from them.
+# Model başına sonuç sayaçları ve son gecikmeler (1k prompt token başına saniye; kısa ve
+# uzun prompt'lar karşılaştırılabilsin diye). Hedge eşiği bunlardan türetilir.
+_MODEL_STATS: Dict[str, Dict[str, Any]] = {}
+_LATENCY_WINDOW = 200
+
+
+def _model_stats(model: str) -> Dict[str, Any]:
+    # Caller holds _LLM_STATS_LOCK.
+    # Çağıran _LLM_STATS_LOCK'u tutar.
+    return _MODEL_STATS.setdefault(model, {
+        "ok": 0, "errors": 0, "wins": 0, "hedged": 0, "cancelled": 0,
+        "latencies": deque(maxlen=_LATENCY_WINDOW),
+    })
+
+
+def _size_factor(prompt_tokens: Optional[int]) -> float:
+    return max(prompt_tokens or 0, 1000) / 1000.0
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _record_model(model: str, outcome: str, seconds: Optional[float] = None, prompt_tokens: Optional[int] = None) -> None:
+    with _LLM_STATS_LOCK:
+        stats = _model_stats(model)
+        stats[outcome] += 1
+        if seconds is not None:
+            stats["latencies"].append(seconds / _size_factor(prompt_tokens))
 
 
-def _extract_first_json_object(text: str) -> str:
-    text = text.strip()
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        return text[start : end + 1].strip()
-    return text
+def hedge_delay(model: str, prompt_tokens: Optional[int] = None) -> float:
+    """
+    Seconds to wait for `model` before hedging: its p95 latency scaled to the prompt
+    size, at least LLM_HEDGE_MIN_SEC; LLM_HEDGE_DEFAULT_SEC until enough samples exist.
 
+    Hedge etmeden önce `model` için beklenecek süre: prompt boyutuna ölçeklenmiş p95
+    gecikmesi, en az LLM_HEDGE_MIN_SEC; yeterli örnek olana kadar LLM_HEDGE_DEFAULT_SEC.
+    """
+    with _LLM_STATS_LOCK:
+        samples = list(_model_stats(model)["latencies"])
+    if len(samples) < max(1, Config.LLM_HEDGE_MIN_SAMPLES):
+        return Config.LLM_HEDGE_DEFAULT_SEC
+    return max(Config.LLM_HEDGE_MIN_SEC, _percentile(samples, 0.95) * _size_factor(prompt_tokens))
 
-def _safe_json_loads(raw_text: str) -> Dict[str, Any]:
-    cleaned = _strip_code_fences(raw_text)
-    cleaned = _extract_first_json_object(cleaned)
-    return json.loads(cleaned)
+
+def llm_stats() -> Dict[str, Any]:
+    with _LLM_STATS_LOCK:
+        stats: Dict[str, Any] = dict(_LLM_STATS)
+        models = {}
+        for model, entry in _MODEL_STATS.items():
+            latencies = list(entry["latencies"])
+            p50, p95 = _percentile(latencies, 0.5), _percentile(latencies, 0.95)
+            models[model] = {
+                **{k: v for k, v in entry.items() if k != "latencies"},
+                "samples": len(latencies),
+                "p50_sec_per_1k_tokens": round(p50, 3) if p50 is not None else None,
+                "p95_sec_per_1k_tokens": round(p95, 3) if p95 is not None else None,
+            }
+    stats["models"] = models
+    return stats
+
+
+class PromptTooLargeError(RuntimeError):
+    """Raised before sending when a prompt exceeds the per-request token budget."""
+
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate (no tokenizer download, no API call).
+    Latin words count ~4 chars per token, other scripts ~2, punctuation 1.
+
+    Ucuz yerel token tahmini (tokenizer indirme yok, API çağrısı yok).
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        if not piece[0].isalnum() and piece[0] != "_":
+            tokens += 1
+        elif piece.isascii():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += (len(piece) + 1) // 2
+    return tokens
+
+
+def _format_timestamp(seconds: Any) -> str:
+    try:
+        seconds = max(float(seconds), 0.0)
+    except (TypeError, ValueError):
+        return "--:--.-"
+    minutes, secs = divmod(seconds, 60)
+    if minutes >= 60:
+        hours, minutes = divmod(int(minutes), 60)
+        return f"{hours}:{minutes:02d}:{secs:04.1f}"
+    return f"{int(minutes):02d}:{secs:04.1f}"
+
+
+# Labels set by the local diarization stage (diarize_agent/tools/diarization.py).
+# Yerel konuşmacı ayrımı aşamasının koyduğu etiketler (diarize_agent/tools/diarization.py).
+_DIARIZED_SPEAKER = re.compile(r"^SPEAKER_\d+$")
+
+
+def _encode_segments_compact(segments: List[Dict[str, Any]]) -> Tuple[str, Dict[str, str]]:
+    """
+    Encodes segments as line-oriented rows: `[idx] mm:ss.s SPK0: text`.
+    Speaker labels are replaced by short codes; the legend maps codes back.
+    Segmentleri satır tabanlı `[idx] mm:ss.s SPK0: text` biçiminde kodlar.
+    Konuşmacı etiketleri kısa kodlarla değiştirilir; lejant kodları geri eşler.
+    """
+    legend: Dict[str, str] = {}
+    codes: Dict[str, str] = {}
+    rows = []
+    for idx, seg in enumerate(segments):
+        label = seg.get("speaker")
+        text = " ".join(str(seg.get("text") or "").split())
+        if label:
+            code = codes.get(label)
+            if code is None:
+                code = f"SPK{len(codes)}"
+                codes[label] = code
+                legend[code] = label
+            rows.append(f"[{idx}] {_format_timestamp(seg.get('start'))} {code}: {text}")
+        else:
+            rows.append(f"[{idx}] {_format_timestamp(seg.get('start'))}: {text}")
+    return "\n".join(rows), legend
+
+
+def _restore_segments(
+    output_segments: List[Dict[str, Any]],
+    source_segments: List[Dict[str, Any]],
+    legend: Dict[str, str],
+) -> List[Dict[str, Any]]:
+    """
+    Maps model output back onto the input rows: timings come from the source
+    segment at `idx`, speaker codes the model left untouched become the original labels.
+    Model çıktısını girdi satırlarına geri eşler: zamanlar `idx` konumundaki kaynak
+    segmentten gelir, modelin değiştirmediği konuşmacı kodları orijinal etikete döner.
+    """
+    restored = []
+    for seg in output_segments:
+        idx = seg.get("idx")
+        source = source_segments[idx] if isinstance(idx, int) and 0 <= idx < len(source_segments) else {}
+        start = source.get("start", seg.get("start"))
+        end = source.get("end", seg.get("end"))
+        speaker = seg.get("speaker") or source.get("speaker") or ""
+        restored.append({
+            "start": float(start) if start is not None else 0.0,
+            "end": float(end) if end is not None else 0.0,
+            "speaker": legend.get(speaker, speaker),
+            "text": seg.get("text", ""),
+        })
+    return restored
 
 
 # -----------------------------
 # 3) AGGRESSIVE PROMPT ENGINEERING (CONTEXT-AWARE NAMING)
 # -----------------------------
-def _build_prompt(
-    segments: List[Dict[str, Any]],
-    summary_lang: str = "original",
-    transcript_lang: str = "original",
-    keywords: str = None,
-    focus_exclusive: bool = False
-) -> str:
-    
-    segments_json = json.dumps(segments, ensure_ascii=False)
-
-    # Dil Haritası
-    lang_map = {
-        "en": "ENGLISH",
-        "tr": "TURKISH",
-        "fr": "FRENCH",
-        "de": "GERMAN",
-        "es": "SPANISH",
-        "it": "ITALIAN",
-        "ru": "RUSSIAN",
-        "ja": "JAPANESE",
-        "ko": "KOREAN",
-        "zh": "CHINESE",
-        "pt": "PORTUGUESE"
-    }
+# Dil Haritası
+LANG_MAP = {
+    "en": "ENGLISH",
+    "tr": "TURKISH",
+    "fr": "FRENCH",
+    "de": "GERMAN",
+    "es": "SPANISH",
+    "it": "ITALIAN",
+    "ru": "RUSSIAN",
+    "ja": "JAPANESE",
+    "ko": "KOREAN",
+    "zh": "CHINESE",
+    "pt": "PORTUGUESE"
+}
 
-    target_sum_lang_name = lang_map.get(summary_lang.lower(), summary_lang.upper()) if summary_lang else "ORIGINAL LANGUAGE"
-    target_trans_lang_name = lang_map.get(transcript_lang.lower(), transcript_lang.upper()) if transcript_lang else "ORIGINAL LANGUAGE"
 
-    
+def _language_name(code: Optional[str]) -> str:
+    return LANG_MAP.get(code.lower(), code.upper()) if code else "ORIGINAL LANGUAGE"
 
-    
-    # --- DYNAMIC RULES --- / # --- DİNAMİK KURALLAR ---
-    
-    # # 1. Summary Language / 1. Özet Dili
-    
+
+def _summary_instruction(summary_lang: Optional[str]) -> str:
     if summary_lang and summary_lang.lower() != "original":
-        summary_instruction = (
+        target_sum_lang_name = _language_name(summary_lang)
+        return (
             f"*** CRITICAL LANGUAGE RULE ***\n"
             f"You MUST write the 'summary' and 'keypoints' ONLY in {target_sum_lang_name}.\n"
             f"Translate the summary to {target_sum_lang_name} even if the audio is different."
         )
-    else:
-        summary_instruction = "Write the summary and keypoints in the SAME language as the audio."
+    return "Write the summary and keypoints in the SAME language as the audio."
 
-    # 2. Transkript Dili
+
+def _transcript_instruction(transcript_lang: Optional[str]) -> str:
     if transcript_lang and transcript_lang.lower() != "original":
-        transcript_instruction = (
-            f"Translate the 'text' field of segments AND the 'clean_transcript' fully into {target_trans_lang_name}."
+        return (
+            f"Translate the 'text' field of segments AND the 'clean_transcript' fully into {_language_name(transcript_lang)}."
         )
-    else:
-        transcript_instruction = "Keep the 'text' fields in original language, fixing grammar/spelling."
+    return "Keep the 'text' fields in original language, fixing grammar/spelling."
 
-    # 3. Odak
+
+def _focus_instruction(keywords: Optional[str], focus_exclusive: bool) -> str:
     focus_instruction = ""
     if keywords:
         focus_instruction = f"\nFOCUS KEYWORDS: {keywords}\n"
@@ -126,14 +289,51 @@ def _build_prompt(
             focus_instruction += "IGNORE topics unrelated to keywords in the SUMMARY. But KEEP ALL SEGMENTS in transcript.\n"
         else:
             focus_instruction += "Highlight these keywords in the summary.\n"
+    return focus_instruction
+
+
+def _build_prompt(
+    segments: List[Dict[str, Any]],
+    summary_lang: str = "original",
+    transcript_lang: str = "original",
+    keywords: str = None,
+    focus_exclusive: bool = False,
+    context: Optional[str] = None
+) -> str:
+    
+    segments_rows, speaker_legend = _encode_segments_compact(segments)
+    if speaker_legend:
+        legend_text = ", ".join(f"{code}={label}" for code, label in speaker_legend.items())
+        if all(_DIARIZED_SPEAKER.match(label) for label in speaker_legend.values()):
+            # The turns come from the audio; the model only has to find names.
+            # Konuşma sıraları sesten gelir; modelin sadece isimleri bulması gerekir.
+            legend_text += " (acoustic speaker turns: keep each row's speaker, only rename codes to real names)"
+    else:
+        legend_text = "none (no speaker labels yet, infer speakers from context)"
+
+    # --- DYNAMIC RULES --- / # --- DİNAMİK KURALLAR ---
+    
+    # # 1. Summary Language / 1. Özet Dili
+    summary_instruction = _summary_instruction(summary_lang)
+
+    # 2. Transkript Dili
+    transcript_instruction = _transcript_instruction(transcript_lang)
+
+    # 3. Odak
+    focus_instruction = _focus_instruction(keywords, focus_exclusive)
+
+    # 4. Pipelined mode: position of this window and speakers named in earlier windows.
+    # 4. Ardışık mod: bu pencerenin konumu ve önceki pencerelerde adlandırılan konuşmacılar.
+    context_block = f"\nCONTEXT: {context}\n" if context else ""
 
     
     # --- PROMPT (The Brain) ---
     task = f"""
 You are an expert AI Audio Analyst.
-
-INPUT DATA (Segments with timestamps and generic Speaker Labels):
-{segments_json}
+{context_block}
+INPUT DATA (one row per segment: [idx] start_time SPEAKER_CODE: text):
+SPEAKER LEGEND: {legend_text}
+{segments_rows}
 
 --- YOUR CORE TASKS ---
 1. {summary_instruction}
@@ -141,14 +341,14 @@ INPUT DATA (Segments with timestamps and generic Speaker Labels):
 3. {focus_instruction}
 
 4. **AGGRESSIVE SPEAKER RENAMING (MANDATORY)**:
-   - **GOAL**: Replace generic labels (e.g., "SPEAKER_01") with REAL NAMES (e.g., "Ali", "Ayşe") derived from context.
-   - **RULE 1**: If a speaker says "My name is Ali" or "I am Ali", you MUST change "SPEAKER_XX" to "Ali" for **ALL** segments belonging to that speaker ID.
+   - **GOAL**: Replace generic speaker codes (e.g., "SPK1") with REAL NAMES (e.g., "Ali", "Ayşe") derived from context.
+   - **RULE 1**: If a speaker says "My name is Ali" or "I am Ali", you MUST change "SPKn" to "Ali" for **ALL** segments belonging to that speaker code. Keep the code (e.g. "SPK0") if no name is found.
    - **RULE 2**: Be aggressive. If the context implies a name (e.g., someone says "Hey Ali" and the other person responds), rename the responder.
    - **RULE 3**: If you rename a speaker, use the Real Name in the `segments` list and `clean_transcript`.
 
    **EXAMPLE OF DESIRED BEHAVIOR**:
-Input Segment: {{ "speaker": "SPEAKER_00", "text": "Hello, my name is Efe." }}
-Output Segment: {{ "speaker": "Efe", "text": "Hello, my name is Efe." }}
+Input Row: [0] 00:00.0 SPK0: Hello, my name is Efe.
+Output Segment: {{ "idx": 0, "speaker": "Efe", "text": "Hello, my name is Efe." }}
 
 5. **CLEAN TRANSCRIPT FORMAT**:
    - In 'metadata.clean_transcript', merge consecutive segments from the same speaker.
@@ -160,7 +360,7 @@ Output Segment: {{ "speaker": "Efe", "text": "Hello, my name is Efe." }}
   "summary": "Summary string...",
   "keypoints": ["Point 1", "Point 2"],
   "segments": [
-    {{ "start": 0.0, "end": 2.5, "speaker": "DETECTED_NAME_OR_LABEL", "text": "Text..." }}
+    {{ "idx": 0, "speaker": "DETECTED_NAME_OR_CODE", "text": "Text..." }}
   ],
   "metadata": {{
     "language": "Detected language code",
@@ -168,47 +368,287 @@ Output Segment: {{ "speaker": "Efe", "text": "Hello, my name is Efe." }}
   }}
 }}
 
+Return exactly one 'segments' item per input row, with the same 'idx', in the same order.
 Take a deep breath. Use context to rename speakers aggressively in the 'segments' array.
 """.strip()
 
     return task
 
 
+def _build_reduce_prompt(
+    partials: List[Dict[str, Any]],
+    summary_lang: str = "original",
+    keywords: str = None,
+    focus_exclusive: bool = False
+) -> str:
+    """
+    Merges per-window analyses of one recording into a single summary.
+    Bir kaydın pencere bazlı analizlerini tek bir özette birleştirir.
+    """
+    blocks = []
+    for i, part in enumerate(partials, start=1):
+        segments = part.get("segments") or []
+        span = ""
+        if segments:
+            span = f" ({_format_timestamp(segments[0].get('start'))} - {_format_timestamp(segments[-1].get('end'))})"
+        speakers = sorted({seg.get("speaker") for seg in segments if seg.get("speaker")})
+        points = "\n".join(f"  - {p}" for p in part.get("keypoints") or [])
+        blocks.append(
+            f"WINDOW {i}{span}\n"
+            f"Speakers: {', '.join(speakers) or 'unknown'}\n"
+            f"Summary: {part.get('summary', '')}\n"
+            f"Key points:\n{points}"
+        )
+
+    task = f"""
+You are an expert AI Audio Analyst.
+
+One recording was analyzed in consecutive windows. Merge the partial analyses below
+into a single analysis of the WHOLE recording.
+
+{chr(10).join(blocks)}
+
+--- YOUR CORE TASKS ---
+1. {_summary_instruction(summary_lang)}
+2. {_focus_instruction(keywords, focus_exclusive)}
+3. Write one coherent summary and 3–10 key points for the whole recording, not per window.
+4. The same person may appear under different names in different windows (e.g. "SPK0" in one,
+   "Ali" in another). Map every such name to one canonical name in 'speaker_aliases'.
+   Only list names that change.
+
+--- REQUIRED JSON OUTPUT FORMAT ---
+{{
+  "conversation_type": "meeting | lecture | interview | other",
+  "summary": "Summary string...",
+  "keypoints": ["Point 1", "Point 2"],
+  "speaker_aliases": {{ "SPK0": "Ali" }},
+  "metadata": {{ "language": "Detected language code" }}
+}}
+""".strip()
+
+    return task
+
+
+# Rows per speaker sent to the naming pass (plus the row before each, where the
+# speaker is often addressed by name).
+# Adlandırma çağrısına konuşmacı başına gönderilen satır (artı her birinden önceki
+# satır; konuşmacıya çoğu zaman orada adıyla hitap edilir).
+SPEAKER_SAMPLE_ROWS = 6
+
+
+def _build_speaker_prompt(segments: List[Dict[str, Any]]) -> Tuple[str, Dict[str, str]]:
+    """
+    Cheap naming pass of focused mode: a few rows per speaker in, only a
+    code -> name map out. Returns (prompt, speaker legend).
+
+    Odak modunun ucuz adlandırma çağrısı: konuşmacı başına birkaç satır girer,
+    sadece kod -> isim eşlemesi çıkar. (prompt, konuşmacı lejantı) döner.
+    """
+    seen: Dict[str, int] = {}
+    picked = set()
+    for i, seg in enumerate(segments):
+        label = seg.get("speaker")
+        if label and seen.get(label, 0) < SPEAKER_SAMPLE_ROWS:
+            seen[label] = seen.get(label, 0) + 1
+            picked.update((max(0, i - 1), i))
+    segments_rows, speaker_legend = _encode_segments_compact([segments[i] for i in sorted(picked)])
+    legend_text = ", ".join(f"{code}={label}" for code, label in speaker_legend.items())
+
+    task = f"""
+You are an expert AI Audio Analyst.
+
+INPUT DATA (sample rows of a longer recording: [idx] start_time SPEAKER_CODE: text):
+SPEAKER LEGEND: {legend_text}
+{segments_rows}
+
+--- YOUR TASK ---
+Find the REAL NAME of each speaker code from context: self-introductions ("I am Ali"),
+being addressed by name ("Hey Ali" followed by that speaker's answer).
+Only list codes whose name is clear. Do not rewrite any text.
+
+--- REQUIRED JSON OUTPUT FORMAT ---
+{{ "speaker_aliases": {{ "SPK0": "Ali" }} }}
+""".strip()
+
+    return task, speaker_legend
+
+
+def _build_continuation_prompt(
+    segments: List[Dict[str, Any]],
+    start_idx: int,
+    known_speakers: List[str],
+    transcript_lang: str = "original"
+) -> str:
+    """
+    Asks only for the segments the truncated answer did not reach.
+    Sadece kesik cevabın ulaşamadığı segmentleri ister.
+    """
+    segments_rows, speaker_legend = _encode_segments_compact(segments)
+    remaining_rows = "\n".join(segments_rows.split("\n")[start_idx:])
+    legend_text = ", ".join(f"{code}={label}" for code, label in speaker_legend.items()) or "none"
+
+    task = f"""
+You are an expert AI Audio Analyst continuing an answer that was cut off.
+Rows before idx {start_idx} are already done. Speakers named so far: {', '.join(known_speakers) or 'none'}.
+Keep using those names for the same speakers.
+
+INPUT DATA (one row per segment: [idx] start_time SPEAKER_CODE: text):
+SPEAKER LEGEND: {legend_text}
+{remaining_rows}
+
+--- YOUR TASK ---
+{_transcript_instruction(transcript_lang)}
+
+--- REQUIRED JSON OUTPUT FORMAT ---
+{{
+  "segments": [
+    {{ "idx": {start_idx}, "speaker": "DETECTED_NAME_OR_CODE", "text": "Text..." }}
+  ]
+}}
+
+Return exactly one 'segments' item per input row, with the same 'idx', in the same order.
+""".strip()
+
+    return task
+
+
+def _clean_transcript_from(segments: List[Dict[str, Any]]) -> str:
+    # Local stand-in when 'metadata.clean_transcript' was lost to truncation.
+    # 'metadata.clean_transcript' kesilmede kaybolduğunda yerel yedek.
+    lines: List[List[str]] = []
+    for seg in segments:
+        speaker = seg.get("speaker") or ""
+        text = " ".join(str(seg.get("text") or "").split())
+        if lines and lines[-1][0] == speaker:
+            lines[-1][1] += f" {text}"
+        else:
+            lines.append([speaker, text])
+    return "\n".join(f"{speaker}: {text}" if speaker else text for speaker, text in lines)
+
+
 # -----------------------------
 # 4) Gemini Call
 # -----------------------------
-def analyze_audio_segments_with_gemini(
-    segments: List[Dict[str, Any]],
-    summary_lang: str = "original",
-    transcript_lang: str = "original",
-    keywords: str = None,
-    focus_exclusive: bool = False,
-    model_name: str = "gemini-2.5-flash", # <--- REVERSED: Working model (2.0) # <--- GERİ ALINDI: Çalışan model (2.0)
+def _sse_lines(resp: requests.Response):
+    # Unlike resp.iter_lines(), yields a line as soon as its newline arrives, so the
+    # last event before a stall is not held back.
+    # resp.iter_lines()'ın aksine satırı yeni satır karakteri gelir gelmez verir; böylece
+    # bir takılmadan önceki son olay bekletilmez.
+    buffer = b""
+    for chunk in resp.iter_content(chunk_size=None):
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+def _read_stream(
+    resp: requests.Response,
+    on_event: Optional[Callable[[tuple], None]],
+    cancel_event: Optional[threading.Event],
+    deadline: float,
+) -> Tuple[str, Optional[str], bool]:
+    """
+    Reads a streamGenerateContent (SSE) response. Completed fields / segments are
+    passed to on_event as they arrive. A stall, a dropped connection or the deadline
+    ends the read early but keeps the text received so far.
+
+    Returns: (text, finish_reason, interrupted)
+
+    streamGenerateContent (SSE) cevabını okur. Tamamlanan alanlar / segmentler
+    geldikçe on_event'e verilir. Takılma, kopan bağlantı veya süre sınırı okumayı
+    erken bitirir ama o ana kadar gelen metni korur.
+    """
+    observer = JsonStreamObserver("segments")
+    pieces: List[str] = []
+    finish_reason = None
+    try:
+        for line in _sse_lines(resp):
+            if cancel_event is not None and cancel_event.is_set():
+                raise_if_cancelled(cancel_event)
+            if not line or not line.startswith("data:"):
+                continue
+            try:
+                chunk = json.loads(line[5:].strip())
+            except ValueError:
+                # One garbled event must not throw away everything received so far.
+                # Bozuk tek bir olay o ana kadar gelen her şeyi çöpe atmamalı.
+                print(f"⚠️ Skipping malformed LLM stream chunk: {line[:80]!r}")
+                continue
+            if not isinstance(chunk, dict):
+                continue
+            candidate = (chunk.get("candidates") or [{}])[0]
+            finish_reason = candidate.get("finishReason") or finish_reason
+            for part in candidate.get("content", {}).get("parts", []):
+                piece = part.get("text")
+                if not piece:
+                    continue
+                pieces.append(piece)
+                if on_event is not None:
+                    for event in observer.feed(piece):
+                        try:
+                            on_event(event)
+                        except Exception as e:
+                            print(f"⚠️ Partial result handler failed: {str(e)}")
+            if time.monotonic() > deadline:
+                print("⚠️ LLM stream hit its deadline, keeping the partial answer.")
+                return "".join(pieces), finish_reason, True
+    except requests.exceptions.RequestException as e:
+        if not pieces:
+            raise
+        print(f"⚠️ LLM stream interrupted after {sum(map(len, pieces))} chars ({str(e)}), keeping the partial answer.")
+        return "".join(pieces), finish_reason, True
+    finally:
+        # Every exit (deadline, stall, cancel, bad chunk) hands the connection back.
+        # Her çıkış (süre sınırı, takılma, iptal, bozuk parça) bağlantıyı geri verir.
+        resp.close()
+    return "".join(pieces), finish_reason, False
+
+
+def _call_gemini_json(
+    prompt: str,
+    parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+    model_name: Optional[str] = None,
     temperature: float = 0.1,
     max_retries: int = 2,
     timeout_sec: int = 240,
+    cancel_event: Optional[threading.Event] = None,
+    continue_truncated: Optional[Callable[..., Dict[str, Any]]] = None,
+    on_event: Optional[Callable[[tuple], None]] = None,
 ) -> Dict[str, Any]:
-    
+    """
+    Sends one JSON-mode prompt with retries (429 back-off, invalid-JSON re-prompt)
+    and returns parse(json). Malformed JSON is repaired locally first; truncated
+    output is passed to continue_truncated(partial, model_name, on_event, cancel_event)
+    (if given) to fetch only the rest from the same model.
+    A validation error that survives repair counts as invalid JSON.
+
+    Tek bir JSON modlu prompt'u tekrar denemelerle gönderir (429 bekleme, geçersiz
+    JSON'da yeniden prompt) ve parse(json) döner. Bozuk JSON önce yerelde onarılır;
+    kesik çıktı sadece kalanı almak için continue_truncated'a (verildiyse) iletilir.
+
+    With Config.LLM_STREAMING the streaming endpoint is used; see _read_stream.
+    Config.LLM_STREAMING ile akış uç noktası kullanılır; bkz. _read_stream.
+    """
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY didn't found.")
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
+    # "model@https://endpoint/v1beta" targets another endpoint for this model.
+    # "model@https://endpoint/v1beta" bu model için başka bir uç nokta kullanır.
+    model_name = model_name or Config.LLM_MODEL_CHAIN[0]
+    model, _, api_base = model_name.partition("@")
+    api_base = (api_base or Config.GEMINI_API_BASE).rstrip("/")
 
-    prompt = _build_prompt(
-        segments, 
-        summary_lang=summary_lang, 
-        transcript_lang=transcript_lang,
-        keywords=keywords,
-        focus_exclusive=focus_exclusive
-    )
-
-    print(f"\n🚀 PROMPT SENT TO AI (Aggressive Renaming Active):")
-    print(f"   Target Summary Lang: {summary_lang}")
-    print(f"   Target Transcript Lang: {transcript_lang}")
-    print(f"   Using Model: {model_name}")
+    streaming = Config.LLM_STREAMING
+    if streaming:
+        url = f"{api_base}/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
+    else:
+        url = f"{api_base}/models/{model}:generateContent?key={api_key}"
+    headers = {"Content-Type": "application/json"}
 
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
@@ -221,37 +661,71 @@ def analyze_audio_segments_with_gemini(
     last_error: Optional[Exception] = None
     
     for attempt in range(max_retries + 1):
+        # A cancelled job never starts another (paid) LLM call.
+        # İptal edilmiş bir iş asla yeni bir (ücretli) LLM çağrısı başlatmaz.
+        raise_if_cancelled(cancel_event)
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout_sec)
+            if streaming:
+                # The read timeout applies per chunk, so it bounds a stall, not the whole answer.
+                # Okuma zaman aşımı parça başınadır; tüm cevabı değil bir takılmayı sınırlar.
+                resp = requests.post(
+                    url, headers=headers, json=payload, stream=True,
+                    timeout=(10, Config.LLM_STREAM_STALL_SEC),
+                )
+            else:
+                resp = requests.post(url, headers=headers, json=payload, timeout=timeout_sec)
             
             # --- 429 ERROR MANAGEMENT (UPDATED: 60 SECONDS) ---
             # --- 429 HATASI YÖNETİMİ (GÜNCELLENDİ: 60 SANİYE) ---
             if resp.status_code == 429:
+                # Release the connection before waiting; a streamed body is otherwise held open.
+                # Beklemeden önce bağlantıyı bırak; aksi halde akışlı gövde açık tutulur.
+                resp.close()
                 print(f"⚠️ Speed ​​Limit (429) - {attempt+1}. Attempt failed. Waiting 60 seconds...")
-                time.sleep(60) # <--- Google'ın istediği süre kadar bekle (1 dk)
+                sleep_unless_cancelled(60, cancel_event) # <--- Google'ın istediği süre kadar bekle (1 dk)
                 if attempt == max_retries:
                      raise RuntimeError(f"HTTP 429: Rate Limit Exceeded after waiting")
                 continue # Döngüye devam et, tekrar dene
 
             if resp.status_code != 200:
-                print(f"Gemini API Error: {resp.text}")
-                raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
+                body = resp.text
+                resp.close()
+                print(f"Gemini API Error: {body}")
+                raise RuntimeError(f"HTTP {resp.status_code}: {body}")
 
-            data = resp.json()
-            candidates = data.get("candidates", [])
-            if not candidates:
-                raise RuntimeError("No candidates returned")
+            interrupted = False
+            if streaming:
+                raw_text, finish_reason, interrupted = _read_stream(
+                    resp, on_event, cancel_event, time.monotonic() + timeout_sec
+                )
+                if not raw_text:
+                    raise RuntimeError("No text in response")
+            else:
+                data = resp.json()
+                candidates = data.get("candidates", [])
+                if not candidates:
+                    raise RuntimeError("No candidates returned")
 
-            parts = candidates[0].get("content", {}).get("parts", [])
-            if not parts or "text" not in parts[0]:
-                raise RuntimeError("No text in response")
+                parts = candidates[0].get("content", {}).get("parts", [])
+                if not parts or "text" not in parts[0]:
+                    raise RuntimeError("No text in response")
 
-            raw_text = parts[0]["text"]
-            parsed = _safe_json_loads(raw_text)
+                raw_text = parts[0]["text"]
+                finish_reason = candidates[0].get("finishReason")
 
-            validated = StructuredSummary.model_validate(parsed)
-            return validated.model_dump()
+            parsed, report = repair_json(raw_text)
+            _count("responses")
+            _count("repaired" if report["repairs"] else "clean")
+            if report["repairs"]:
+                print(f"🩹 LLM JSON repaired locally: {', '.join(report['repairs'])}")
 
+            truncated = report["truncated"] or interrupted or finish_reason == "MAX_TOKENS"
+            if truncated and continue_truncated is not None and isinstance(parsed, dict):
+                parsed = continue_truncated(parsed, model_name, on_event, cancel_event)
+            return parse(parsed)
+
+        except JobCancelled:
+            raise
         except Exception as e:
             last_error = e
             print(f"Attempt {attempt+1} failed: {str(e)}")
@@ -259,6 +733,7 @@ def analyze_audio_segments_with_gemini(
             # If it's not a 429 error (e.g., a JSON error), correct the prompt and try again immediately.
             # 429 hatası değilse (örn json hatasıysa) promptu düzeltip hemen dene
             if "429" not in str(e) and attempt < max_retries: 
+                _count("full_retries")
                 payload["contents"][0]["parts"][0]["text"] = (
                     prompt + 
                     "\n\nERROR: Invalid JSON. Return ONLY valid JSON."
@@ -269,13 +744,652 @@ def analyze_audio_segments_with_gemini(
             # 429 hatasıysa ve yukarıdaki if'e girmediyse (yani request kütüphanesinden exception fırlattıysa)
             if "429" in str(e) and attempt < max_retries:
                  print(f"⚠️ 429 Exception detected. Waiting 60s...")
-                 time.sleep(60)
+                 sleep_unless_cancelled(60, cancel_event)
                  continue
 
             break
 
+    _count("failed")
     raise RuntimeError(f"Analysis failed after retries: {last_error}")
 
+
+def _timed_call(model: str, prompt: str, prompt_tokens: int, **kwargs) -> Dict[str, Any]:
+    started = time.monotonic()
+    try:
+        result = _call_gemini_json(prompt, model_name=model, **kwargs)
+    except JobCancelled:
+        raise
+    except Exception:
+        _record_model(model, "errors")
+        raise
+    _record_model(model, "ok", time.monotonic() - started, prompt_tokens)
+    return result
+
+
+def _call_hedged(
+    chain: List[str],
+    prompt: str,
+    prompt_tokens: int,
+    cancel_event: Optional[threading.Event],
+    on_event: Optional[Callable[[tuple], None]],
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Runs the chain with hedging: the next model is started when the current one
+    is slower than its hedge_delay, or immediately when it fails. The first valid
+    answer wins and the other attempts are told to stop.
+
+    Only used with LLM_STREAMING: a streamed attempt checks its cancel event between
+    chunks (and a stall is bounded by LLM_STREAM_STALL_SEC), so a losing attempt really
+    stops. "cancelled" is recorded by the attempt itself once it has been aborted.
+
+    Attempts run in helper threads; streamed events are handed back to the calling
+    thread (which owns the DB session), and only from the attempt that streamed first.
+
+    Zinciri hedging ile çalıştırır: mevcut model hedge_delay'inden yavaşsa ya da hata
+    verirse sonraki model başlatılır. İlk geçerli cevap kazanır, diğerlerine durması söylenir.
+
+    Sadece LLM_STREAMING ile kullanılır: akışlı deneme parçalar arasında iptal olayını
+    kontrol eder (takılma LLM_STREAM_STALL_SEC ile sınırlı), böylece kaybeden deneme
+    gerçekten durur. "cancelled" deneme iptal edildiğinde denemenin kendisi tarafından sayılır.
+
+    Denemeler yardımcı thread'lerde çalışır; akış olayları çağıran thread'e (DB
+    oturumunun sahibi) geri verilir, sadece ilk akışa başlayan denemeden.
+    """
+    results: "queue.Queue[tuple]" = queue.Queue()
+    attempts: List[threading.Event] = []
+
+    def launch() -> None:
+        i = len(attempts)
+        model = chain[i]
+        attempt_cancel = threading.Event()
+        attempts.append(attempt_cancel)
+        sink = (lambda event: results.put(("event", i, event))) if on_event is not None else None
+
+        def run() -> None:
+            started = time.monotonic()
+            try:
+                value = _call_gemini_json(
+                    prompt, model_name=model, cancel_event=attempt_cancel, on_event=sink, **kwargs
+                )
+                results.put(("ok", i, value, time.monotonic() - started))
+            except JobCancelled:
+                # Counted here, when the attempt has actually stopped.
+                # Burada sayılır, deneme gerçekten durduğunda.
+                _record_model(model, "cancelled")
+                results.put(("cancelled", i, None, None))
+            except Exception as e:
+                results.put(("error", i, e, None))
+
+        threading.Thread(target=run, name=f"llm-attempt-{i}", daemon=True).start()
+
+    def cancel_all() -> None:
+        for attempt_cancel in attempts:
+            attempt_cancel.set()
+
+    launch()
+    hedge_at = time.monotonic() + hedge_delay(chain[0], prompt_tokens)
+    running, leader, last_error = 1, None, None
+
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            cancel_all()
+            raise_if_cancelled(cancel_event)
+
+        try:
+            item = results.get(timeout=0.2)
+        except queue.Empty:
+            if len(attempts) < len(chain) and time.monotonic() >= hedge_at:
+                slow = chain[len(attempts) - 1]
+                print(f"🐢 LLM {slow} slower than its hedge threshold, also asking {chain[len(attempts)]}...")
+                _record_model(slow, "hedged")
+                launch()
+                running += 1
+                hedge_at = time.monotonic() + hedge_delay(chain[len(attempts) - 1], prompt_tokens)
+            continue
+
+        kind, i = item[0], item[1]
+        if kind == "event":
+            if leader is None:
+                leader = i
+            if i == leader:
+                on_event(item[2])
+            continue
+
+        running -= 1
+        model = chain[i]
+        attempts[i].set()
+        if kind == "ok":
+            _record_model(model, "ok", item[3], prompt_tokens)
+            _record_model(model, "wins")
+            cancel_all()
+            if i:
+                print(f"🏁 LLM answer taken from {model} (chain position {i + 1}).")
+            return item[2]
+
+        if kind == "error":
+            _record_model(model, "errors")
+            last_error = item[2]
+            print(f"⚠️ LLM {model} failed: {str(last_error)}")
+            if leader == i:
+                leader = None
+            if len(attempts) < len(chain):
+                launch()
+                running += 1
+                hedge_at = time.monotonic() + hedge_delay(chain[len(attempts) - 1], prompt_tokens)
+                continue
+
+        if running == 0:
+            raise RuntimeError(f"All models in the LLM chain failed: {last_error}")
+
+
+def _call_llm(
+    prompt: str,
+    parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+    model_name: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+    on_event: Optional[Callable[[tuple], None]] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Sends a prompt through the model chain (Config.LLM_MODEL_CHAIN, or model_name if
+    given: one model or a comma-separated chain like LLM_MODEL_CHAIN). Without
+    LLM_HEDGING the next model is tried only after the previous one failed; with it
+    (and LLM_STREAMING), slow models are hedged (see _call_hedged).
+
+    Prompt'u model zinciri üzerinden gönderir (Config.LLM_MODEL_CHAIN veya verildiyse
+    model_name: tek model ya da LLM_MODEL_CHAIN gibi virgülle ayrılmış zincir).
+    LLM_HEDGING kapalıyken sonraki model sadece öncekinin hatasından sonra denenir;
+    açıkken (ve LLM_STREAMING ile) yavaş modeller hedge edilir (bkz. _call_hedged).
+    """
+    chain = parse_model_chain(model_name) if model_name else list(Config.LLM_MODEL_CHAIN)
+    prompt_tokens = estimate_tokens(prompt)
+    kwargs["parse"] = parse
+
+    # A blocking (non-streamed) request cannot be stopped once sent, so hedging it would
+    # leave the losing call running and billed; without streaming the chain is sequential.
+    # Bloklayan (akışsız) bir istek gönderildikten sonra durdurulamaz; hedge edilirse kaybeden
+    # çağrı çalışmaya (ve ücretlenmeye) devam eder. Akış yoksa zincir sıralı çalışır.
+    if Config.LLM_HEDGING and Config.LLM_STREAMING and len(chain) > 1:
+        return _call_hedged(chain, prompt, prompt_tokens, cancel_event, on_event, **kwargs)
+
+    last_error: Optional[Exception] = None
+    for position, model in enumerate(chain):
+        try:
+            return _timed_call(
+                model, prompt, prompt_tokens, cancel_event=cancel_event, on_event=on_event, **kwargs
+            )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            last_error = e
+            if position + 1 < len(chain):
+                print(f"↪️ LLM {model} failed, falling back to {chain[position + 1]}...")
+    raise last_error
+
+
+def _check_prompt_budget(prompt: str, max_prompt_tokens: Optional[int]) -> Tuple[int, int]:
+    # Hard budget: refuse to send rather than pay for an oversized request.
+    # Kesin bütçe: aşırı büyük istek için ödeme yapmak yerine göndermeyi reddet.
+    budget = max_prompt_tokens or Config.LLM_MAX_PROMPT_TOKENS
+    prompt_tokens = estimate_tokens(prompt)
+    if budget and prompt_tokens > budget:
+        raise PromptTooLargeError(
+            f"Prompt is ~{prompt_tokens} tokens, over the budget of {budget} tokens."
+        )
+    return prompt_tokens, budget
+
+
+def analyze_audio_segments_with_gemini(
+    segments: List[Dict[str, Any]],
+    summary_lang: str = "original",
+    transcript_lang: str = "original",
+    keywords: str = None,
+    focus_exclusive: bool = False,
+    model_name: Optional[str] = None, # None = Config.LLM_MODEL_CHAIN, or a comma-separated chain
+    temperature: float = 0.1,
+    max_retries: int = 2,
+    timeout_sec: int = 240,
+    max_prompt_tokens: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+    context: Optional[str] = None,
+    on_partial: Optional[Callable[[str, Any], None]] = None,
+    focus_retrieval: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    on_partial(kind, value), if given, receives streamed results early (LLM_STREAMING):
+    ("summary" | "keypoints" | "conversation_type", value) and ("segment", {idx, start, end, speaker, text}).
+
+    on_partial(kind, value) verilirse akıtılan sonuçları erken alır (LLM_STREAMING).
+
+    focus_retrieval (None = decide from Config.FOCUS_RETRIEVAL_MIN_SEGMENTS): in
+    focus-exclusive mode, analyze only the keyword-relevant rows; see _analyze_focused.
+    focus_retrieval (None = Config.FOCUS_RETRIEVAL_MIN_SEGMENTS'e göre): odak modunda
+    sadece anahtar kelimeyle ilgili satırları analiz et; bkz. _analyze_focused.
+    """
+    if focus_retrieval is None:
+        focus_retrieval = bool(
+            focus_exclusive and keywords and keywords.strip()
+            and Config.FOCUS_RETRIEVAL_MIN_SEGMENTS > 0
+            and len(segments) >= Config.FOCUS_RETRIEVAL_MIN_SEGMENTS
+            # Rows outside the excerpt keep their Whisper text, so they could not be translated.
+            # Alıntı dışındaki satırlar Whisper metnini korur, bu yüzden çevrilemezler.
+            and (transcript_lang or "original").lower() == "original"
+        )
+    if focus_retrieval:
+        rows = select_focus_rows(
+            [seg.get("text") or "" for seg in segments],
+            keywords,
+            top_k=Config.FOCUS_RETRIEVAL_TOP_K,
+            neighbors=Config.FOCUS_RETRIEVAL_NEIGHBORS,
+        )
+        if rows and len(rows) < len(segments):
+            return _analyze_focused(
+                segments, rows,
+                summary_lang=summary_lang,
+                keywords=keywords,
+                context=context,
+                on_partial=on_partial,
+                model_name=model_name,
+                temperature=temperature,
+                max_retries=max_retries,
+                timeout_sec=timeout_sec,
+                max_prompt_tokens=max_prompt_tokens,
+                cancel_event=cancel_event,
+            )
+        print(f"🔎 Focus retrieval: {len(rows)} of {len(segments)} rows match '{keywords}', sending all rows.")
+
+    prompt = _build_prompt(
+        segments, 
+        summary_lang=summary_lang, 
+        transcript_lang=transcript_lang,
+        keywords=keywords,
+        focus_exclusive=focus_exclusive,
+        context=context
+    )
+
+    budget = max_prompt_tokens or Config.LLM_MAX_PROMPT_TOKENS
+    prompt_tokens = estimate_tokens(prompt)
+    if budget and prompt_tokens > budget and len(segments) > 1:
+        return _analyze_in_windows(
+            segments, prompt_tokens, budget,
+            summary_lang=summary_lang,
+            transcript_lang=transcript_lang,
+            keywords=keywords,
+            focus_exclusive=focus_exclusive,
+            context=context,
+            on_partial=on_partial,
+            model_name=model_name,
+            temperature=temperature,
+            max_retries=max_retries,
+            timeout_sec=timeout_sec,
+            max_prompt_tokens=max_prompt_tokens,
+            cancel_event=cancel_event,
+        )
+
+    prompt_tokens, budget = _check_prompt_budget(prompt, max_prompt_tokens)
+    _, speaker_legend = _encode_segments_compact(segments)
+
+    print(f"\n🚀 PROMPT SENT TO AI (Aggressive Renaming Active):")
+    print(f"   Target Summary Lang: {summary_lang}")
+    print(f"   Target Transcript Lang: {transcript_lang}")
+    print(f"   Using Model: {model_name or ' -> '.join(Config.LLM_MODEL_CHAIN)}")
+    print(f"   Estimated Prompt Tokens: {prompt_tokens} / {budget}")
+
+    def on_event(event: tuple) -> None:
+        if event[0] == "item":
+            seg = event[1]
+            if isinstance(seg, dict) and seg.get("speaker") is not None:
+                restored = _restore_segments([seg], segments, speaker_legend)[0]
+                on_partial("segment", {"idx": seg.get("idx"), **restored})
+        elif event[1] in ("summary", "keypoints", "conversation_type"):
+            on_partial(event[1], event[2])
+
+    stream_events = on_event if on_partial is not None else None
+
+    def continue_truncated(
+        partial: Dict[str, Any],
+        answered_by: str,
+        sink: Optional[Callable[[tuple], None]],
+        attempt_cancel: Optional[threading.Event],
+    ) -> Dict[str, Any]:
+        # Salvaged segments are kept; only the missing rows are requested, not the whole prompt.
+        # The model that wrote the partial answer also writes the rest.
+        # Kurtarılan segmentler tutulur; tüm prompt değil sadece eksik satırlar istenir.
+        # Kısmi cevabı yazan model kalanı da yazar.
+        collected = [seg for seg in partial.get("segments") or [] if isinstance(seg, dict)]
+        for _ in range(Config.LLM_MAX_CONTINUATIONS):
+            done = [seg["idx"] for seg in collected if isinstance(seg.get("idx"), int)]
+            if collected and not done:
+                break
+            next_idx = max(done, default=-1) + 1
+            if next_idx >= len(segments):
+                break
+            print(f"✂️ LLM output truncated at row {next_idx}/{len(segments)}, requesting the rest only...")
+            _count("continuations")
+            names = sorted({seg["speaker"] for seg in collected if seg.get("speaker")})
+            more = _call_gemini_json(
+                _build_continuation_prompt(segments, next_idx, names, transcript_lang),
+                lambda obj: obj if isinstance(obj, dict) else {"segments": obj},
+                model_name=answered_by,
+                temperature=temperature,
+                max_retries=max_retries,
+                timeout_sec=timeout_sec,
+                cancel_event=attempt_cancel,
+                on_event=sink,
+            )
+            new = [
+                seg for seg in more.get("segments") or []
+                if isinstance(seg, dict) and isinstance(seg.get("idx"), int) and seg["idx"] >= next_idx
+            ]
+            if not new:
+                break
+            collected.extend(new)
+
+        done = [seg["idx"] for seg in collected if isinstance(seg.get("idx"), int)]
+        if done and max(done) + 1 < len(segments):
+            raise ValueError(f"Truncated answer: rows from {max(done) + 1} are missing")
+        partial["segments"] = collected
+        metadata = partial.get("metadata") if isinstance(partial.get("metadata"), dict) else {}
+        if not metadata.get("clean_transcript"):
+            metadata["clean_transcript"] = _clean_transcript_from(collected)
+        partial["metadata"] = metadata
+        return partial
+
+    def parse(parsed: Dict[str, Any]) -> Dict[str, Any]:
+        validated = StructuredSummary.model_validate(parsed)
+        result = validated.model_dump()
+        result["segments"] = _restore_segments(result["segments"], segments, speaker_legend)
+        clean = result["metadata"].get("clean_transcript")
+        if speaker_legend and isinstance(clean, str):
+            result["metadata"]["clean_transcript"] = re.sub(
+                r"\bSPK\d+\b", lambda m: speaker_legend.get(m.group(0), m.group(0)), clean
+            )
+        return result
+
+    return _call_llm(
+        prompt,
+        parse,
+        model_name=model_name,
+        temperature=temperature,
+        max_retries=max_retries,
+        timeout_sec=timeout_sec,
+        cancel_event=cancel_event,
+        continue_truncated=continue_truncated,
+        on_event=stream_events,
+    )
+
+
+def _analyze_in_windows(
+    segments: List[Dict[str, Any]],
+    prompt_tokens: int,
+    budget: int,
+    summary_lang: str,
+    transcript_lang: str,
+    keywords: Optional[str],
+    focus_exclusive: bool,
+    context: Optional[str],
+    on_partial: Optional[Callable[[str, Any], None]],
+    max_prompt_tokens: Optional[int],
+    cancel_event: Optional[threading.Event],
+    model_name: Optional[str],
+    **call_kwargs,
+) -> Dict[str, Any]:
+    """
+    Transcripts over the prompt budget: the rows are split into windows whose prompts
+    fit, each window is analyzed on its own and reduce_partial_analyses_with_gemini
+    merges them, as in the pipelined mode. Only if the fixed part of the prompt alone
+    is over the budget is PromptTooLargeError raised.
+
+    Prompt bütçesini aşan transkriptler: satırlar prompt'u sığan pencerelere bölünür,
+    her pencere ayrı analiz edilir ve reduce_partial_analyses_with_gemini ardışık moddaki
+    gibi birleştirir. Sadece prompt'un sabit kısmı tek başına bütçeyi aşarsa
+    PromptTooLargeError fırlatılır.
+    """
+    part_note = "This is part 100 of 100 of a longer recording, starting at 100000s. Summarize only this part."
+    overhead = estimate_tokens(_build_prompt(
+        [],
+        summary_lang=summary_lang,
+        transcript_lang=transcript_lang,
+        keywords=keywords,
+        focus_exclusive=focus_exclusive,
+        context=f"{context} {part_note}" if context else part_note,
+    ))
+    per_row = max(prompt_tokens - overhead, 1) / len(segments)
+    # 10% headroom: rows are not all the same length.
+    # %10 pay: satırların hepsi aynı uzunlukta değil.
+    rows_per_window = int((budget - overhead) * 0.9 / per_row)
+    if rows_per_window < 1:
+        raise PromptTooLargeError(
+            f"Prompt is ~{prompt_tokens} tokens, over the budget of {budget} tokens, "
+            f"and one row does not fit next to the ~{overhead} tokens of instructions."
+        )
+    windows = [segments[i:i + rows_per_window] for i in range(0, len(segments), rows_per_window)]
+    print(f"✂️ Prompt is ~{prompt_tokens} tokens, over the budget of {budget}: "
+          f"analyzing {len(windows)} windows of up to {rows_per_window} rows, then reducing...")
+
+    partials = []
+    offset = 0
+    for n, window in enumerate(windows, start=1):
+        raise_if_cancelled(cancel_event)
+        note = (
+            f"This is part {n} of {len(windows)} of a longer recording, starting at "
+            f"{float(window[0].get('start') or 0):.0f}s. Summarize only this part."
+        )
+        forward = None
+        if on_partial is not None:
+            # Only rows are forwarded early, renumbered to the whole transcript; a window's
+            # summary is not the recording's.
+            # Erken sadece satırlar iletilir, tüm transkripte göre numaralanır; bir pencerenin
+            # özeti kaydın özeti değildir.
+            def forward(kind: str, value: Any, base: int = offset) -> None:
+                if kind == "segment" and isinstance(value.get("idx"), int):
+                    on_partial(kind, {**value, "idx": value["idx"] + base})
+        partials.append(analyze_audio_segments_with_gemini(
+            window,
+            summary_lang=summary_lang,
+            transcript_lang=transcript_lang,
+            keywords=keywords,
+            focus_exclusive=focus_exclusive,
+            model_name=model_name,
+            max_prompt_tokens=max_prompt_tokens,
+            cancel_event=cancel_event,
+            context=f"{context} {note}" if context else note,
+            on_partial=forward,
+            focus_retrieval=False,
+            **call_kwargs,
+        ))
+        offset += len(window)
+
+    return reduce_partial_analyses_with_gemini(
+        partials,
+        summary_lang=summary_lang,
+        keywords=keywords,
+        focus_exclusive=focus_exclusive,
+        model_name=model_name,
+        cancel_event=cancel_event,
+        **call_kwargs,
+    )
+
+
+def _identify_speakers(segments: List[Dict[str, Any]], **call_kwargs) -> Dict[str, str]:
+    # Speaker label -> real name from the cheap naming pass; {} if unlabeled or on failure.
+    # Ucuz adlandırma çağrısından konuşmacı etiketi -> gerçek isim; etiketsizse veya hatada {}.
+    if not any(seg.get("speaker") for seg in segments):
+        return {}
+    prompt, speaker_legend = _build_speaker_prompt(segments)
+    try:
+        aliases = _call_llm(
+            prompt,
+            lambda parsed: SpeakerAliases.model_validate(parsed).model_dump(),
+            **call_kwargs,
+        )["speaker_aliases"]
+    except JobCancelled:
+        raise
+    except Exception as e:
+        print(f"⚠️ Speaker naming pass failed, keeping labels: {str(e)}")
+        return {}
+    return {
+        speaker_legend[code]: name.strip()
+        for code, name in aliases.items()
+        if code in speaker_legend and isinstance(name, str) and name.strip()
+    }
+
+
+def _analyze_focused(
+    segments: List[Dict[str, Any]],
+    rows: List[int],
+    summary_lang: str,
+    keywords: str,
+    context: Optional[str],
+    on_partial: Optional[Callable[[str, Any], None]],
+    max_prompt_tokens: Optional[int],
+    **call_kwargs,
+) -> Dict[str, Any]:
+    """
+    Focus-exclusive mode on long transcripts: the summary call sees only `rows`
+    (BM25 matches plus context), a cheap naming pass covers every speaker, and the
+    remaining rows keep their Whisper text under the resolved names. Same result
+    format as analyze_audio_segments_with_gemini.
+
+    Uzun transkriptlerde odak modu: özet çağrısı sadece `rows`u (BM25 eşleşmeleri
+    artı bağlam) görür, ucuz bir adlandırma çağrısı tüm konuşmacıları kapsar ve kalan
+    satırlar çözülen isimlerle Whisper metnini korur. Sonuç formatı
+    analyze_audio_segments_with_gemini ile aynıdır.
+    """
+    print(f"🔎 Focus retrieval: sending {len(rows)} of {len(segments)} rows matching '{keywords}'")
+    names = _identify_speakers(segments, **call_kwargs)
+
+    notes = [context] if context else []
+    notes.append(
+        f"This is an EXCERPT of a {len(segments)}-row recording: only the rows related to the "
+        f"focus keywords, with surrounding rows. Base the summary on these rows."
+    )
+    if names:
+        notes.append(
+            "Speakers already identified (label -> name): "
+            + ", ".join(f"{label} -> {name}" for label, name in names.items())
+            + ". Use these names."
+        )
+
+    def excerpt_partial(kind: str, value: Any) -> None:
+        # Excerpt rows are numbered from 0; report the original row index.
+        # Alıntı satırları 0'dan numaralanır; orijinal satır indeksini bildir.
+        if kind == "segment" and isinstance(value.get("idx"), int) and 0 <= value["idx"] < len(rows):
+            value = {**value, "idx": rows[value["idx"]]}
+        on_partial(kind, value)
+
+    result = analyze_audio_segments_with_gemini(
+        [segments[i] for i in rows],
+        summary_lang=summary_lang,
+        transcript_lang="original",
+        keywords=keywords,
+        focus_exclusive=True,
+        max_prompt_tokens=max_prompt_tokens,
+        context=" ".join(notes),
+        on_partial=excerpt_partial if on_partial is not None else None,
+        focus_retrieval=False,
+        **call_kwargs,
+    )
+
+    # Restored segments carry the source timings, which identify the original row.
+    # Geri eşlenen segmentler kaynak zamanlarını taşır; bunlar orijinal satırı belirler.
+    def key(seg: Dict[str, Any]) -> Tuple[float, float]:
+        return float(seg.get("start") or 0.0), float(seg.get("end") or 0.0)
+
+    row_by_time = {key(segments[i]): i for i in rows}
+    answered: Dict[int, Dict[str, Any]] = {}
+    for seg in result["segments"]:
+        i = row_by_time.get(key(seg))
+        if i is not None and i not in answered:
+            answered[i] = seg
+            label = segments[i].get("speaker")
+            if label and seg.get("speaker") and seg["speaker"] != label:
+                names.setdefault(label, seg["speaker"])
+
+    merged = []
+    for i, seg in enumerate(segments):
+        if i in answered:
+            merged.append(answered[i])
+            continue
+        label = seg.get("speaker") or ""
+        start, end = key(seg)
+        merged.append({
+            "start": start,
+            "end": end,
+            "speaker": names.get(label, label),
+            "text": " ".join(str(seg.get("text") or "").split()),
+        })
+
+    metadata = dict(result["metadata"])
+    metadata["clean_transcript"] = _clean_transcript_from(merged)
+    metadata["focus_rows"] = {"sent": len(rows), "total": len(segments)}
+    return {**result, "segments": merged, "metadata": metadata}
+
+
+def reduce_partial_analyses_with_gemini(
+    partials: List[Dict[str, Any]],
+    summary_lang: str = "original",
+    keywords: str = None,
+    focus_exclusive: bool = False,
+    model_name: Optional[str] = None,
+    temperature: float = 0.1,
+    max_retries: int = 2,
+    timeout_sec: int = 240,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """
+    Reduce step of the pipelined mode: merges window analyses (each in the
+    analyze_audio_segments_with_gemini format) into one result of the same format.
+
+    Ardışık modun birleştirme adımı: pencere analizlerini (her biri
+    analyze_audio_segments_with_gemini formatında) aynı formatta tek sonuca birleştirir.
+    """
+    prompt = _build_reduce_prompt(
+        partials,
+        summary_lang=summary_lang,
+        keywords=keywords,
+        focus_exclusive=focus_exclusive
+    )
+    prompt_tokens, budget = _check_prompt_budget(prompt, None)
+    print(f"\n🧩 REDUCE PROMPT SENT TO AI: {len(partials)} windows, ~{prompt_tokens} / {budget} tokens")
+
+    reduced = _call_llm(
+        prompt,
+        lambda parsed: ReducedSummary.model_validate(parsed).model_dump(),
+        model_name=model_name,
+        temperature=temperature,
+        max_retries=max_retries,
+        timeout_sec=timeout_sec,
+        cancel_event=cancel_event,
+    )
+
+    aliases = {k: v for k, v in reduced["speaker_aliases"].items() if k and v}
+    segments = []
+    transcripts = []
+    for part in partials:
+        for seg in part.get("segments") or []:
+            speaker = seg.get("speaker") or ""
+            segments.append({**seg, "speaker": aliases.get(speaker, speaker)})
+        clean = (part.get("metadata") or {}).get("clean_transcript")
+        if isinstance(clean, str) and clean.strip():
+            transcripts.append(clean.strip())
+
+    clean_transcript = "\n".join(transcripts)
+    if aliases:
+        pattern = re.compile(r"\b(" + "|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True)) + r")\b")
+        clean_transcript = pattern.sub(lambda m: aliases[m.group(1)], clean_transcript)
+
+    metadata = dict(reduced["metadata"])
+    metadata["clean_transcript"] = clean_transcript
+    return {
+        "conversation_type": reduced["conversation_type"],
+        "summary": reduced["summary"],
+        "keypoints": reduced["keypoints"],
+        "segments": segments,
+        "metadata": metadata,
+    }
+
 if __name__ == "__main__":
     print("--- Running Smart Naming & Merging Test ---")
     test_segments = [
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+
+class JobCancelled(RuntimeError):
+    """Raised inside the pipeline when the job's cancel event has been set."""
+
+
+def raise_if_cancelled(cancel_event: Optional[threading.Event]) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled("Job was cancelled.")
+
+
+def sleep_unless_cancelled(seconds: float, cancel_event: Optional[threading.Event]) -> None:
+    """
+    Sleeps like time.sleep, but wakes up and raises JobCancelled as soon as the job is cancelled.
+    time.sleep gibi bekler, ancak iş iptal edilirse hemen uyanır ve JobCancelled fırlatır.
+    """
+    if cancel_event is None:
+        time.sleep(seconds)
+        return
+    if cancel_event.wait(seconds):
+        raise JobCancelled("Job was cancelled.")
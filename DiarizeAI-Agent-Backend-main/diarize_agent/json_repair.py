@@ -0,0 +1,408 @@
+# src/diarize_agent/json_repair.py
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+# Tolerant parser for LLM JSON output. Fixes the usual defects locally instead of
+# paying for a full re-prompt:
+#   - code fences / text around the object
+#   - trailing commas, missing commas between values, mismatched closing brackets
+#   - raw control characters (newlines) inside strings
+#   - truncated output: close an open string, drop a dangling key or partial value and
+#     close the brackets; unfinished array items (a half-written segment) are dropped
+#     so a continuation can ask for them again. Last resort: cut back to the last
+#     complete array item.
+#
+# LLM JSON çıktısı için toleranslı ayrıştırıcı. Yaygın hataları tam bir yeniden
+# istek ödemek yerine yerelde düzeltir:
+#   - kod blokları / nesnenin etrafındaki metin
+#   - sondaki virgüller, değerler arasında eksik virgüller, uyumsuz kapanış parantezleri
+#   - string içindeki ham kontrol karakterleri (satır sonları)
+#   - kesik çıktı: açık string'i kapat, sarkan anahtarı veya yarım değeri at ve
+#     parantezleri kapat; bitmemiş dizi elemanları (yarım yazılmış bir segment) atılır,
+#     böylece devam çağrısı onları yeniden isteyebilir. Son çare: son tam dizi
+#     elemanına kadar geri kes.
+
+_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*(?:```)?$", flags=re.DOTALL | re.IGNORECASE)
+_WHITESPACE = " \t\r\n"
+_LITERAL_END = _WHITESPACE + ",:]}"
+
+
+def _strip_wrapping(text: str) -> str:
+    text = (text or "").strip()
+    m = _FENCE.match(text)
+    if m:
+        text = m.group(1).strip()
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    return text[start:] if start != -1 else text
+
+
+def _scan(text: str) -> Tuple[str, List[str], bool]:
+    """
+    Single pass over the text with a bracket stack. Each level tracks what it
+    expects next (key / colon / value / comma), which is enough to fix commas
+    and to know the last point where the document could be cleanly closed.
+
+    Parantez yığınıyla metin üzerinden tek geçiş. Her seviye sırada ne beklediğini
+    (anahtar / iki nokta / değer / virgül) tutar; bu, virgülleri düzeltmek ve
+    belgenin temizce kapatılabileceği son noktayı bilmek için yeterlidir.
+    """
+    out: List[str] = []
+    repairs: List[str] = []
+    # stack items: [container, expecting, item start]; container is "{" or "[", item
+    # start is the position in `out` where the current member (key) or item began.
+    # yığın elemanları: [kap, beklenen, eleman başı]; kap "{" veya "[", eleman başı
+    # mevcut üyenin (anahtar) veya elemanın `out` içinde başladığı konum.
+    stack: List[List[Any]] = []
+    in_string = escape = is_key = False
+    literal = False
+    literal_start = 0
+    # Last cut point: (len(out), open containers) right after a complete item of an
+    # array or of the root object.
+    # Son kesme noktası: bir dizinin veya kök nesnenin tam bir elemanından hemen sonra.
+    safe = None
+
+    def note(kind: str) -> None:
+        if kind not in repairs:
+            repairs.append(kind)
+
+    def value_done() -> None:
+        nonlocal safe
+        if stack:
+            stack[-1][1] = "comma"
+            if stack[-1][0] == "[" or len(stack) == 1:
+                safe = (len(out), [level[0] for level in stack])
+
+    def before_value() -> None:
+        # Inserts a missing comma when a new item starts right after a finished one.
+        # Bitmiş bir elemanın hemen ardından yeni eleman başlıyorsa eksik virgülü ekler.
+        if stack and stack[-1][1] == "comma":
+            out.append(",")
+            note("missing_comma")
+            stack[-1][1] = "key" if stack[-1][0] == "{" else "value"
+
+    def begin_item(is_value: bool = True) -> None:
+        # A new object member (at its key) or array item starts here; a value being
+        # written leaves its level "open" until it completes.
+        # Yeni bir nesne üyesi (anahtarında) veya dizi elemanı burada başlar; yazılmakta
+        # olan bir değer, tamamlanana kadar seviyesini "open" bırakır.
+        if not stack:
+            return
+        if stack[-1][0] == "[" or stack[-1][1] == "key":
+            stack[-1][2] = len(out)
+        if is_value and stack[-1][1] != "key":
+            stack[-1][1] = "open"
+
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if is_key:
+                    stack[-1][1] = "colon"
+                else:
+                    value_done()
+            continue
+
+        if literal:
+            if ch not in _LITERAL_END:
+                out.append(ch)
+                continue
+            literal = False
+            value_done()
+
+        if ch in _WHITESPACE:
+            out.append(ch)
+            continue
+
+        if ch in "}]":
+            if not stack:
+                break
+            while out and out[-1] in _WHITESPACE:
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                note("trailing_comma")
+            expected = "}" if stack[-1][0] == "{" else "]"
+            if ch != expected:
+                note("mismatched_bracket")
+            stack.pop()
+            out.append(expected)
+            if not stack:
+                return "".join(out), repairs, False
+            value_done()
+            continue
+
+        if ch == ",":
+            if stack and stack[-1][1] == "comma":
+                out.append(ch)
+                stack[-1][1] = "key" if stack[-1][0] == "{" else "value"
+            else:
+                note("extra_comma")
+            continue
+
+        if ch == ":":
+            if stack and stack[-1][1] == "colon":
+                stack[-1][1] = "value"
+            out.append(ch)
+            continue
+
+        if ch == '"':
+            before_value()
+            is_key = bool(stack) and stack[-1][0] == "{" and stack[-1][1] == "key"
+            begin_item(is_value=not is_key)
+            in_string = True
+            out.append(ch)
+            continue
+
+        if ch in "{[":
+            before_value()
+            begin_item()
+            out.append(ch)
+            stack.append([ch, "key" if ch == "{" else "value", len(out)])
+            continue
+
+        # number / true / false / null
+        before_value()
+        begin_item()
+        literal = True
+        literal_start = len(out)
+        out.append(ch)
+
+    if not stack:
+        return "".join(out), repairs, False
+
+    note("truncated")
+    closed = _close_truncated(out, stack, in_string, escape, is_key, literal, literal_start, note)
+    try:
+        json.loads(closed, strict=False)
+        return closed, repairs, True
+    except ValueError:
+        pass
+
+    # Last resort: keep everything up to the last complete item, then close.
+    # Son çare: son tam elemana kadar her şeyi tut, sonra kapat.
+    if safe is None:
+        return "".join(out), repairs, True
+    cut, containers = safe
+    closing = "".join("}" if c == "{" else "]" for c in reversed(containers))
+    return "".join(out[:cut]) + closing, repairs, True
+
+
+def _drop_tail(out: List[str], start: int) -> None:
+    # Removes out[start:] and the whitespace / comma left in front of it.
+    # out[start:]'ı ve önünde kalan boşluk / virgülü siler.
+    del out[start:]
+    while out and out[-1] in _WHITESPACE + ",":
+        out.pop()
+
+
+def _close_truncated(
+    out: List[str],
+    stack: List[List[Any]],
+    in_string: bool,
+    escape: bool,
+    is_key: bool,
+    literal: bool,
+    literal_start: int,
+    note: Callable[[str], None],
+) -> str:
+    """
+    Closes a document cut off by EOF in place (works on a copy of `out`).
+    EOF ile kesilmiş bir belgeyi yerinde kapatır (`out`'un kopyası üzerinde çalışır).
+    """
+    out = list(out)
+    stack = [list(level) for level in stack]
+    top = stack[-1]
+
+    # The token EOF interrupted: an object value string is closed; a key, a partial
+    # literal ("tru", "1.") or an unfinished array item is dropped.
+    # EOF'un böldüğü belirteç: nesne değeri olan string kapatılır; anahtar, yarım literal
+    # ("tru", "1.") veya bitmemiş dizi elemanı atılır.
+    if in_string:
+        if is_key or top[0] == "[":
+            _drop_tail(out, top[2])
+        else:
+            if escape:
+                out.pop()  # a lone backslash would escape the closing quote
+            out.append('"')
+            note("unterminated_string")
+            top[1] = "comma"
+    elif literal:
+        try:
+            json.loads("".join(out[literal_start:]))
+            top[1] = "comma"
+        except ValueError:
+            _drop_tail(out, top[2])
+
+    for depth in range(len(stack) - 1, -1, -1):
+        container, expecting, start = stack[depth]
+        if container == "{" and expecting in ("colon", "value"):
+            # Dangling key ("a" or "a":) without a value.
+            # Değeri olmayan sarkan anahtar ("a" veya "a":).
+            _drop_tail(out, start)
+        while out and out[-1] in _WHITESPACE + ",":
+            out.pop()
+        out.append("}" if container == "{" else "]")
+        if depth and stack[depth - 1][0] == "[":
+            # An array item the output never finished is dropped, not half-kept.
+            # Çıktının hiç bitiremediği dizi elemanı yarım tutulmaz, atılır.
+            _drop_tail(out, stack[depth - 1][2])
+    return "".join(out)
+
+
+def repair_json(raw_text: str) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Parses LLM JSON output, repairing it if needed.
+    Returns (value, report) with report = {"repairs": [...], "truncated": bool}.
+    Raises ValueError if nothing usable can be recovered.
+
+    LLM JSON çıktısını ayrıştırır, gerekirse onarır.
+    (değer, rapor) döner; rapor = {"repairs": [...], "truncated": bool}.
+    Kullanılabilir bir şey kurtarılamazsa ValueError fırlatır.
+    """
+    text = _strip_wrapping(raw_text)
+    try:
+        return json.loads(text, strict=False), {"repairs": [], "truncated": False}
+    except ValueError:
+        pass
+
+    fixed, repairs, truncated = _scan(text)
+    try:
+        value = json.loads(fixed, strict=False)
+    except ValueError as e:
+        raise ValueError(f"Unrepairable JSON ({', '.join(repairs) or 'no known defect'}): {e}") from e
+    return value, {"repairs": repairs, "truncated": truncated}
+
+
+class JsonStreamObserver:
+    """
+    Watches a JSON object arrive in pieces and reports what is already complete:
+    each top-level field once its value closes, and each item of the `items_key`
+    array as soon as that item closes.
+
+    Parça parça gelen bir JSON nesnesini izler ve tamamlananları bildirir:
+    değeri kapanan her üst seviye alanı ve `items_key` dizisinin her elemanını
+    kapandığı anda.
+
+    feed(chunk) returns a list of events: ("item", value) or ("field", key, value).
+    """
+
+    def __init__(self, items_key: str = "segments"):
+        self.items_key = items_key
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"          # top level: key | colon | value | comma
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[tuple]:
+        self.buffer += chunk
+        events: List[tuple] = []
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        self._key = buf[self._key_start + 1:i]
+                        self._key_start = None
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._value_start is not None:
+                        self._emit_field(buf, i, events)
+                    elif self._depth == 2 and self._item_start is not None and self._in_items():
+                        self._emit_item(buf, i, events)
+                i += 1
+                continue
+
+            if ch in " \t\r\n":
+                i += 1
+                continue
+
+            if self._depth == 1:
+                if self._expect == "key" and ch == '"':
+                    self._key_start = i
+                    self._in_string = True
+                elif self._expect == "colon" and ch == ":":
+                    self._expect = "value"
+                elif self._expect == "value":
+                    self._value_start = i
+                    self._expect = "comma"
+                    if ch == '"':
+                        self._in_string = True
+                    elif ch in "{[":
+                        self._depth += 1
+                elif self._expect == "comma":
+                    if ch == ",":
+                        # Literal (number / true / false / null) values end at the comma.
+                        if self._value_start is not None:
+                            self._emit_field(buf, i - 1, events)
+                        self._expect = "key"
+                    elif ch == "}":
+                        if self._value_start is not None:
+                            self._emit_field(buf, i - 1, events)
+                        self._depth = 0
+                i += 1
+                continue
+
+            # depth >= 2
+            if ch == '"':
+                if self._depth == 2 and self._in_items() and self._item_start is None:
+                    self._item_start = i
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 2 and self._in_items() and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None and self._in_items():
+                    self._emit_item(buf, i, events)
+                elif self._depth == 1:
+                    self._emit_field(buf, i, events)
+            i += 1
+        self._pos = i
+        return events
+
+    def _in_items(self) -> bool:
+        return self._key == self.items_key
+
+    def _emit_item(self, buf: str, end: int, events: List[tuple]) -> None:
+        try:
+            events.append(("item", json.loads(buf[self._item_start:end + 1], strict=False)))
+        except ValueError:
+            pass
+        self._item_start = None
+
+    def _emit_field(self, buf: str, end: int, events: List[tuple]) -> None:
+        start, self._value_start = self._value_start, None
+        if self._key == self.items_key:
+            return
+        try:
+            events.append(("field", self._key, json.loads(buf[start:end + 1].strip(), strict=False)))
+        except ValueError:
+            pass
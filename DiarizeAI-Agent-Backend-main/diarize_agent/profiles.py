@@ -0,0 +1,119 @@
+# src/diarize_agent/profiles.py
+
+import json
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+# Processing profiles: named bundles of ASR and LLM settings chosen per job
+# (`processingProfile` on run). None means "use the global setting".
+#   whisper_model               Whisper size (None = WHISPER_MODEL)
+#   beam_size / best_of         beam search at T=0 / samples at T>0 (None = greedy)
+#   temperatures                fallback temperatures; more than one retries bad windows
+#   condition_on_previous_text  feed the previous text to the decoder
+#   vad                         skip windows without speech energy
+#   window_sec                  ASR window length (None = WHISPER_WINDOW_SEC)
+#   llm_model                   model chain, comma separated (None = LLM_MODEL_CHAIN)
+#
+# İşleme profilleri: iş başına seçilen (run'da `processingProfile`) adlandırılmış ASR ve
+# LLM ayar paketleri. None "genel ayarı kullan" demektir.
+#   whisper_model               Whisper boyutu (None = WHISPER_MODEL)
+#   beam_size / best_of         T=0'da beam search / T>0'da örnek sayısı (None = açgözlü)
+#   temperatures                yedek sıcaklıklar; birden fazlası kötü pencereleri yeniden dener
+#   condition_on_previous_text  önceki metni decoder'a ver
+#   vad                         konuşma enerjisi olmayan pencereleri atla
+#   window_sec                  ASR pencere uzunluğu (None = WHISPER_WINDOW_SEC)
+#   llm_model                   model zinciri, virgülle ayrılmış (None = LLM_MODEL_CHAIN)
+DEFAULT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "fast": {
+        "whisper_model": "base",
+        "beam_size": None,
+        "best_of": None,
+        "temperatures": [0.0],
+        "condition_on_previous_text": False,
+        "vad": True,
+        "window_sec": 60,
+        "llm_model": "gemini-2.5-flash-lite,gemini-2.5-flash",
+    },
+    "balanced": {
+        "whisper_model": None,
+        "beam_size": None,
+        "best_of": None,
+        "temperatures": [0.0],
+        "condition_on_previous_text": True,
+        "vad": False,
+        "window_sec": None,
+        "llm_model": None,
+    },
+    "accurate": {
+        "whisper_model": "medium",
+        "beam_size": 5,
+        "best_of": 5,
+        "temperatures": [0.0, 0.2, 0.4, 0.6],
+        "condition_on_previous_text": True,
+        "vad": False,
+        "window_sec": 600,
+        "llm_model": "gemini-2.5-pro,gemini-2.5-flash",
+    },
+}
+
+
+def _load_profiles() -> Dict[str, Dict[str, Any]]:
+    # PROCESSING_PROFILES (JSON) overrides fields of the built-in profiles or adds new ones;
+    # a new profile starts from "balanced".
+    # PROCESSING_PROFILES (JSON) yerleşik profillerin alanlarını değiştirir veya yenilerini
+    # ekler; yeni bir profil "balanced"dan başlar.
+    profiles = {name: dict(fields) for name, fields in DEFAULT_PROFILES.items()}
+    if Config.PROCESSING_PROFILES:
+        try:
+            overrides = json.loads(Config.PROCESSING_PROFILES)
+        except ValueError as e:
+            raise ValueError(f"PROCESSING_PROFILES is not valid JSON: {e}") from e
+        for name, fields in overrides.items():
+            base = profiles.get(name.lower(), DEFAULT_PROFILES["balanced"])
+            profiles[name.lower()] = {**base, **(fields or {})}
+    return profiles
+
+
+PROFILES = _load_profiles()
+
+
+def profile_names() -> List[str]:
+    return list(PROFILES)
+
+
+def get_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The named profile (DEFAULT_PROCESSING_PROFILE if None) with global defaults filled in.
+    Raises ValueError for an unknown name.
+
+    Adı verilen profil (None ise DEFAULT_PROCESSING_PROFILE), genel varsayılanlar doldurulmuş.
+    Bilinmeyen adda ValueError fırlatır.
+    """
+    key = (name or Config.DEFAULT_PROCESSING_PROFILE).lower()
+    if key not in PROFILES:
+        raise ValueError(f"Unknown processing profile '{name}'. Available: {', '.join(PROFILES)}")
+    profile = dict(PROFILES[key])
+    profile["name"] = key
+    profile["whisper_model"] = profile.get("whisper_model") or Config.WHISPER_MODEL
+    profile["window_sec"] = profile.get("window_sec") or Config.WHISPER_WINDOW_SEC
+    profile["temperatures"] = list(profile.get("temperatures") or [0.0])
+    return profile
+
+
+def profile_models(names: Optional[List[str]] = None) -> List[str]:
+    """
+    Whisper models needed by the given profiles, for warm-up. None means only
+    DEFAULT_PROCESSING_PROFILE: the other profiles' models load on their first job
+    instead of holding memory on every worker.
+
+    Verilen profillerin ihtiyaç duyduğu Whisper modelleri, ısınma için. None sadece
+    DEFAULT_PROCESSING_PROFILE demektir: diğer profillerin modelleri her worker'da bellek
+    tutmak yerine ilk işlerinde yüklenir.
+    """
+    models: List[str] = []
+    for name in names or [Config.DEFAULT_PROCESSING_PROFILE]:
+        model = get_profile(name)["whisper_model"]
+        if model not in models:
+            models.append(model)
+    return models
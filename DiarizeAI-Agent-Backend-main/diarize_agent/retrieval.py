@@ -0,0 +1,95 @@
+# src/diarize_agent/retrieval.py
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Local lexical retrieval (BM25) over a job's segments, used to send only the
+# keyword-relevant part of a long transcript in focus-exclusive mode.
+# No embeddings, no downloads: a few milliseconds even for hour-long meetings.
+#
+# Bir işin segmentleri üzerinde yerel sözcüksel arama (BM25); odak modunda uzun bir
+# transkriptin sadece anahtar kelimeyle ilgili kısmını göndermek için kullanılır.
+# Embedding yok, indirme yok: saatlik toplantılarda bile birkaç milisaniye.
+
+_WORD = re.compile(r"\w+", flags=re.UNICODE)
+# Query terms at least this long also match longer words starting with them, which
+# covers suffixes ("toplantı" -> "toplantıda", "budget" -> "budgets").
+# En az bu uzunluktaki sorgu terimleri onlarla başlayan daha uzun kelimeleri de eşler;
+# bu ekleri kapsar ("toplantı" -> "toplantıda", "budget" -> "budgets").
+PREFIX_MIN_LEN = 4
+
+
+def tokenize(text: str) -> List[str]:
+    # casefold, plus the Turkish dotted capital I that casefold turns into "i̇".
+    # casefold, ayrıca casefold'un "i̇"ye çevirdiği Türkçe noktalı büyük İ.
+    return _WORD.findall((text or "").replace("İ", "i").casefold())
+
+
+class Bm25Index:
+    """
+    Okapi BM25 over short documents (one per segment).
+    Kısa belgeler (segment başına bir) üzerinde Okapi BM25.
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs: List[Counter] = [Counter(tokenize(doc)) for doc in documents]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.doc_freq: Counter = Counter()
+        for tf in self.term_freqs:
+            self.doc_freq.update(tf.keys())
+
+    def _expand(self, term: str) -> List[str]:
+        if len(term) < PREFIX_MIN_LEN:
+            return [term] if term in self.doc_freq else []
+        return [t for t in self.doc_freq if t.startswith(term)]
+
+    def _idf(self, term: str) -> float:
+        n, df = len(self.term_freqs), self.doc_freq[term]
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> List[float]:
+        terms: Dict[str, float] = {}
+        for q in set(tokenize(query)):
+            for term in self._expand(q):
+                terms[term] = self._idf(term)
+
+        scores = [0.0] * len(self.term_freqs)
+        if not terms or not self.avg_length:
+            return scores
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1.0 - self.b + self.b * self.lengths[i] / self.avg_length)
+            score = 0.0
+            for term, idf in terms.items():
+                f = tf.get(term)
+                if f:
+                    score += idf * f * (self.k1 + 1.0) / (f + norm)
+            scores[i] = score
+        return scores
+
+
+def select_focus_rows(
+    texts: List[str],
+    keywords: str,
+    top_k: int = 40,
+    neighbors: int = 2,
+    index: Optional[Bm25Index] = None,
+) -> List[int]:
+    """
+    Indices (sorted) of the top_k matching rows for the keywords, each widened with
+    `neighbors` rows of context on both sides. Empty if nothing matches.
+
+    Anahtar kelimelere en iyi uyan top_k satırın (sıralı) indeksleri; her biri iki
+    yandan `neighbors` satır bağlamla genişletilir. Hiçbir şey uymazsa boş.
+    """
+    index = index or Bm25Index(texts)
+    scores = index.scores(keywords)
+    hits = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: scores[i], reverse=True)[:max(0, top_k)]
+    rows = set()
+    for i in hits:
+        rows.update(range(max(0, i - neighbors), min(len(texts), i + neighbors + 1)))
+    return sorted(rows)
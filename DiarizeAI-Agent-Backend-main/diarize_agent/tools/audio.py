@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+class AudioProbeError(ValueError):
+    """Raised when an upload has no decodable audio stream."""
+
+
+# Whisper works on 16 kHz mono audio; the normalized cache is stored in that format.
+# Whisper 16 kHz mono ses ile çalışır; normalize edilmiş önbellek bu formatta saklanır.
+SAMPLE_RATE = 16000
+PCM_SUFFIX = ".16k.pcm"
+
+
+def pcm_cache_path(audio_file_path: str) -> str:
+    """
+    Path of the normalized PCM artifact stored next to the upload.
+    Yüklenen dosyanın yanında saklanan normalize PCM dosyasının yolu.
+    """
+    path = Path(audio_file_path)
+    return str(path.with_name(path.stem + PCM_SUFFIX))
+
+
+def _probe_with_ffprobe(audio_file_path: str) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration,format_name:stream=codec_type,codec_name,channels,sample_rate,duration",
+        "-of", "json",
+        str(audio_file_path),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, timeout=30)
+    if proc.returncode != 0:
+        raise AudioProbeError(proc.stderr.decode(errors="ignore").strip() or "ffprobe could not read the file")
+    info = json.loads(proc.stdout or b"{}")
+    stream = next((st for st in info.get("streams", []) if st.get("codec_type") == "audio"), None)
+    if stream is None:
+        raise AudioProbeError("No audio stream found")
+    duration = (info.get("format") or {}).get("duration") or stream.get("duration")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "codec": stream.get("codec_name"),
+        "channels": int(stream["channels"]) if stream.get("channels") else None,
+        "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+        "format": (info.get("format") or {}).get("format_name"),
+    }
+
+
+_FFMPEG_DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_FFMPEG_AUDIO = re.compile(r"Stream #\S+.*?Audio:\s*([\w-]+)[^,]*,\s*(\d+)\s*Hz,\s*([^,\n]+)")
+_CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "7.1": 8}
+
+
+def _probe_with_ffmpeg(audio_file_path: str) -> dict:
+    # Fallback for ffmpeg-only installs: parse the header banner of `ffmpeg -i`.
+    # Sadece ffmpeg olan kurulumlar için yedek: `ffmpeg -i` başlık çıktısını ayrıştır.
+    proc = subprocess.run(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-i", str(audio_file_path)],
+        capture_output=True, timeout=30,
+    )
+    banner = proc.stderr.decode(errors="ignore")
+    audio = _FFMPEG_AUDIO.search(banner)
+    if audio is None:
+        raise AudioProbeError(banner.strip().splitlines()[-1] if banner.strip() else "No audio stream found")
+    duration = _FFMPEG_DURATION.search(banner)
+    layout = audio.group(3).strip().split("(")[0].strip()
+    channels = _CHANNEL_LAYOUTS.get(layout)
+    if channels is None:
+        m = re.match(r"(\d+) channels", layout)
+        channels = int(m.group(1)) if m else None
+    return {
+        "duration": (
+            int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+            if duration else None
+        ),
+        "codec": audio.group(1),
+        "channels": channels,
+        "sample_rate": int(audio.group(2)),
+        "format": None,
+    }
+
+
+def probe_audio(audio_file_path: str) -> dict:
+    """
+    Reads only the container/stream headers (no decoding) to get duration, codec,
+    channels and sample rate. Raises AudioProbeError for undecodable files.
+
+    Sadece kapsayıcı/akış başlıklarını okur (çözme yok): süre, codec, kanal ve
+    örnekleme hızı. Çözülemeyen dosyalarda AudioProbeError fırlatır.
+    """
+    if not Path(audio_file_path).exists():
+        raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
+    if shutil.which("ffprobe"):
+        return _probe_with_ffprobe(audio_file_path)
+    return _probe_with_ffmpeg(audio_file_path)
+
+
+def normalize_audio(audio_file_path: str, out_path: str | None = None) -> dict:
+    """
+    Decodes the upload once with ffmpeg into raw 16 kHz mono int16 PCM.
+    Yüklenen dosyayı ffmpeg ile bir kez ham 16 kHz mono int16 PCM'e çözer.
+
+    Returns:
+        dict: pcm_path, samples, duration (seconds)
+    """
+    audio_path = Path(audio_file_path)
+    if not audio_path.exists():
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+    out_path = out_path or pcm_cache_path(str(audio_path))
+    tmp_path = f"{out_path}.part"
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", str(audio_path),
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-f", "s16le",
+        "-c:a", "pcm_s16le",
+        tmp_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to decode audio: {proc.stderr.decode(errors='ignore').strip()}")
+        # Atomic publish: readers never see a half-written cache file.
+        # Atomik yayınlama: okuyucular yarım yazılmış önbellek dosyasını asla görmez.
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    samples = os.path.getsize(out_path) // 2
+    return {
+        "pcm_path": out_path,
+        "samples": samples,
+        "duration": samples / SAMPLE_RATE,
+    }
+
+
+def transcode_to_opus(audio_file_path: str, out_path: str, bitrate: str = "24k") -> str:
+    """
+    Re-encodes audio to mono Opus (Ogg container), published atomically at out_path.
+    Sesi mono Opus'a (Ogg kapsayıcı) yeniden kodlar, out_path'e atomik olarak yazılır.
+    """
+    tmp_path = f"{out_path}.part"
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", str(audio_file_path),
+        "-vn",
+        "-ac", "1",
+        "-c:a", "libopus",
+        "-b:a", bitrate,
+        "-application", "voip",
+        "-f", "ogg",
+        tmp_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to transcode audio: {proc.stderr.decode(errors='ignore').strip()}")
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return out_path
+
+
+def iter_opus_transcode(audio_file_path: str, bitrate: str = "32k", chunk_size: int = 64 * 1024):
+    """
+    Streams a mono Opus (Ogg) rendition while ffmpeg encodes it, so playback can
+    start before the whole file is converted. Closing the generator stops ffmpeg.
+
+    Mono Opus (Ogg) kopyasını ffmpeg kodlarken akıtır; böylece dosyanın tamamı
+    dönüştürülmeden oynatma başlayabilir. Üreteç kapatılınca ffmpeg durur.
+    """
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", str(audio_file_path),
+        "-vn",
+        "-ac", "1",
+        "-c:a", "libopus",
+        "-b:a", bitrate,
+        "-application", "audio",
+        "-f", "ogg",
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            chunk = proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to transcode audio: {proc.stderr.read().decode(errors='ignore').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def iter_pcm_blocks(audio_file_path: str, block_samples: int, pcm_path: str | None = None):
+    """
+    Yields the audio as consecutive int16 16 kHz mono blocks of block_samples (the last
+    one may be shorter): zero-copy slices of the memory-mapped PCM cache when it exists
+    (see load_pcm), otherwise decoded by an ffmpeg pipe. Only one decoded block is held
+    at a time, so memory does not grow with the recording's length. Closing the
+    generator stops ffmpeg.
+
+    Sesi ardışık, block_samples uzunluğunda int16 16 kHz mono bloklar halinde verir
+    (sonuncusu daha kısa olabilir): PCM önbelleği varsa belleğe eşlenmiş önbelleğin
+    kopyasız dilimleri (bkz. load_pcm), yoksa ffmpeg borusuyla çözülür. Aynı anda tek
+    çözülmüş blok tutulur; bellek kaydın uzunluğuyla büyümez. Üreteç kapatılınca ffmpeg durur.
+    """
+    import numpy as np
+
+    block_samples = max(1, int(block_samples))
+    block_bytes = block_samples * 2
+    if pcm_path and Path(pcm_path).exists():
+        # Mapped pages are file-backed and clean: the kernel shares them with other
+        # readers of the same cache and drops them under memory pressure.
+        # Eşlenen sayfalar dosya destekli ve temizdir: çekirdek onları aynı önbelleği
+        # okuyan diğerleriyle paylaşır ve bellek baskısında bırakır.
+        pcm = load_pcm(pcm_path)
+        for lo in range(0, len(pcm), block_samples):
+            yield pcm[lo: lo + block_samples]
+        return
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", str(audio_file_path),
+        "-vn",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-f", "s16le",
+        "-c:a", "pcm_s16le",
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if len(data) < 2:
+                break
+            yield np.frombuffer(data[: len(data) // 2 * 2], dtype=np.int16)
+        proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to decode audio: {proc.stderr.read().decode(errors='ignore').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def load_pcm(pcm_path: str):
+    """
+    Memory-maps the PCM cache as int16 without reading or copying it, for reruns,
+    chunk workers and VAD that need random access to the whole recording.
+
+    PCM önbelleğini okumadan/kopyalamadan int16 olarak belleğe eşler; tüm kayda
+    rastgele erişim isteyen yeniden çalıştırmalar, parça worker'ları ve VAD için.
+    """
+    import numpy as np
+
+    size = os.path.getsize(pcm_path) // 2
+    if size == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r", shape=(size,))
+
+
+def pcm_to_float32(pcm):
+    """
+    Converts an int16 PCM block (or a load_pcm slice) to the float32 [-1, 1] array Whisper expects.
+    int16 PCM bloğunu (veya bir load_pcm dilimini) Whisper'ın beklediği float32 [-1, 1] diziye çevirir.
+    """
+    import numpy as np
+
+    return np.asarray(pcm, dtype=np.float32) / 32768.0
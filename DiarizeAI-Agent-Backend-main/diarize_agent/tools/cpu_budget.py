@@ -0,0 +1,325 @@
+"""
+CPU budgeting for concurrent Whisper runs on one node.
+
+Every torch instance uses all cores by default, so two transcriptions side by side
+oversubscribe the CPU and finish later than one after the other. Here each
+transcription gets a slot: a fixed thread count and (optionally) its own core set,
+and at most `concurrency` slots exist per process.
+
+Tek düğümde eşzamanlı Whisper çalıştırmaları için CPU bütçesi.
+
+Her torch örneği varsayılan olarak tüm çekirdekleri kullanır; yan yana iki
+transkripsiyon CPU'yu aşırı yükler ve art arda çalışmalarından daha geç biter.
+Burada her transkripsiyon bir slot alır: sabit thread sayısı ve (isteğe bağlı) kendi
+çekirdek kümesi; süreç başına en fazla `concurrency` slot vardır.
+
+Usage / Kullanım:
+    python -m diarize_agent.tools.cpu_budget --plan
+    python -m diarize_agent.tools.cpu_budget --benchmark --audio sample.m4a --seconds 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+from diarize_agent.cancellation import raise_if_cancelled
+
+# Threads after which one CPU Whisper run stops scaling well (rough x86 figures;
+# the benchmark mode measures the real optimum of a machine).
+# Bir CPU Whisper çalıştırmasının iyi ölçeklenmeyi bıraktığı thread sayısı (kaba x86
+# değerleri; benchmark modu bir makinenin gerçek optimumunu ölçer).
+MODEL_THREAD_SWEET_SPOT = {"tiny": 2, "base": 2, "small": 4, "medium": 6, "large": 8, "turbo": 6}
+
+
+def available_cores() -> List[int]:
+    """
+    CPUs this process may run on (respects taskset / cgroup cpusets).
+    Bu sürecin çalışabileceği CPU'lar (taskset / cgroup cpuset'lerine uyar).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_core_list(spec: str) -> List[int]:
+    """
+    "0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]
+    """
+    cores = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cores.update(range(int(lo), int(hi) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def plan_asr(
+    cores: Optional[List[int]] = None,
+    model_name: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    threads: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Splits the cores into transcription slots. Unset values come from
+    ASR_CONCURRENCY / ASR_THREADS_PER_JOB, then from the model's sweet spot.
+
+    Çekirdekleri transkripsiyon slotlarına böler. Verilmeyen değerler
+    ASR_CONCURRENCY / ASR_THREADS_PER_JOB'dan, sonra modelin ideal noktasından gelir.
+    """
+    cores = list(cores or available_cores())
+    n = len(cores)
+    model = (model_name or Config.WHISPER_MODEL).split(".")[0]
+    threads = threads or Config.ASR_THREADS_PER_JOB or 0
+    concurrency = concurrency or Config.ASR_CONCURRENCY or 0
+
+    if not threads and concurrency:
+        threads = max(1, n // concurrency)
+    if not threads:
+        threads = max(1, min(MODEL_THREAD_SWEET_SPOT.get(model, 4), n))
+    if not concurrency:
+        concurrency = max(1, n // threads)
+
+    # An explicit oversubscribed setting wraps around the cores instead of failing.
+    # Açıkça aşırı yüklenmiş bir ayar hata vermek yerine çekirdekler üzerinde döner.
+    core_sets = [[cores[(i * threads + k) % n] for k in range(min(threads, n))] for i in range(concurrency)]
+    return {
+        "cores": n,
+        "model": model,
+        "concurrency": concurrency,
+        "threads_per_job": threads,
+        "core_sets": core_sets,
+    }
+
+
+_INTEROP_SET = False
+
+
+def _apply_thread_budget(threads: int, cores: Optional[List[int]], pin: bool) -> None:
+    global _INTEROP_SET
+    try:
+        import torch
+    except ImportError:
+        torch = None
+
+    if torch is not None:
+        # With torch's default OpenMP backend this applies to the calling thread.
+        # torch'un varsayılan OpenMP altyapısında bu, çağıran thread için geçerlidir.
+        torch.set_num_threads(threads)
+        if not _INTEROP_SET:
+            _INTEROP_SET = True
+            try:
+                torch.set_num_interop_threads(max(1, Config.ASR_INTEROP_THREADS))
+            except RuntimeError:
+                # Only allowed before the first inter-op parallel work of the process.
+                # Sadece sürecin ilk inter-op paralel işinden önce izinlidir.
+                pass
+
+    if pin and cores and hasattr(os, "sched_setaffinity"):
+        try:
+            # pid 0 = the calling thread on Linux; threads it starts later inherit the set.
+            # pid 0 = Linux'ta çağıran thread; sonradan başlattığı thread'ler kümeyi devralır.
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            print(f"⚠️ Could not pin ASR thread to cores {cores}: {str(e)}")
+
+
+def configure_process(threads: Optional[int] = None, cores: Optional[List[int]] = None, pin: bool = True) -> None:
+    """
+    Process-wide start-up settings for a dedicated ASR worker: pins the process to
+    `cores` and caps the BLAS/OpenMP pools. Must run before torch is imported.
+
+    Ayrılmış bir ASR worker'ı için süreç geneli başlangıç ayarları: süreci `cores`a
+    sabitler ve BLAS/OpenMP havuzlarını sınırlar. torch içe aktarılmadan önce çalışmalıdır.
+    """
+    if pin and cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    if threads:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ.setdefault(var, str(threads))
+
+
+class AsrSlots:
+    """
+    Hands out transcription slots of a plan. A thread gets the slot it had before
+    when possible, so its OpenMP pool keeps running on the same cores.
+
+    Bir planın transkripsiyon slotlarını dağıtır. Mümkünse bir thread önceki slotunu
+    alır; böylece OpenMP havuzu aynı çekirdeklerde çalışmaya devam eder.
+    """
+
+    def __init__(self, plan: Dict[str, Any], pin: bool = False):
+        self.plan = plan
+        self.pin = pin
+        self._cond = threading.Condition()
+        self._free = list(range(plan["concurrency"]))
+        self._last: Dict[int, int] = {}
+        self.waiting = 0
+
+    @contextmanager
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        me = threading.get_ident()
+        with self._cond:
+            self.waiting += 1
+            try:
+                while not self._free:
+                    # Waiting jobs still notice a cancel request.
+                    # Bekleyen işler iptal isteğini yine fark eder.
+                    self._cond.wait(timeout=1.0)
+                    raise_if_cancelled(cancel_event)
+            finally:
+                self.waiting -= 1
+            slot = self._last.get(me)
+            slot = slot if slot in self._free else self._free[0]
+            self._free.remove(slot)
+            self._last[me] = slot
+
+        cores = self.plan["core_sets"][slot]
+        _apply_thread_budget(self.plan["threads_per_job"], cores, self.pin)
+        try:
+            yield {"slot": slot, "threads": self.plan["threads_per_job"], "cores": cores}
+        finally:
+            with self._cond:
+                self._free.append(slot)
+                self._cond.notify()
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **{k: v for k, v in self.plan.items() if k != "core_sets"},
+                "pinned": self.pin,
+                "busy": self.plan["concurrency"] - len(self._free),
+                "waiting": self.waiting,
+            }
+
+
+_SLOTS: Optional[AsrSlots] = None
+_SLOTS_LOCK = threading.Lock()
+
+
+def asr_slots() -> AsrSlots:
+    """
+    Process-wide slot pool, planned on first use.
+    Süreç geneli slot havuzu, ilk kullanımda planlanır.
+    """
+    global _SLOTS
+    with _SLOTS_LOCK:
+        if _SLOTS is None:
+            _SLOTS = AsrSlots(plan_asr(), pin=Config.ASR_PIN_CORES)
+        return _SLOTS
+
+
+# -----------------------------
+# Benchmark mode
+# -----------------------------
+def _bench_child(audio_path: str, model_name: str, threads: int, cores: List[int], seconds: float, barrier, results) -> None:
+    configure_process(threads, cores)
+    import whisper
+
+    from diarize_agent.tools.audio import SAMPLE_RATE
+
+    _apply_thread_budget(threads, cores, pin=True)
+    model = whisper.load_model(model_name)
+    audio = whisper.load_audio(audio_path)[: int(seconds * SAMPLE_RATE)]
+    barrier.wait()
+    started = time.perf_counter()
+    model.transcribe(audio, fp16=False, temperature=0.0, verbose=None)
+    results.put(time.perf_counter() - started)
+
+
+def benchmark(audio_path: str, model_name: Optional[str] = None, seconds: float = 60.0) -> List[Dict[str, Any]]:
+    """
+    Runs `concurrency` pinned transcriptions side by side for each candidate split
+    (1, 2, 4, ... jobs sharing the cores) and reports audio seconds processed per
+    wall second. Models load before the clock starts.
+
+    Her aday bölünme için (çekirdekleri paylaşan 1, 2, 4, ... iş) `concurrency`
+    sabitlenmiş transkripsiyonu yan yana çalıştırır ve duvar saniyesi başına işlenen
+    ses saniyesini raporlar. Modeller saat başlamadan önce yüklenir.
+    """
+    import multiprocessing as mp
+
+    from diarize_agent.tools.audio import probe_audio
+
+    model_name = model_name or Config.WHISPER_MODEL
+    cores = available_cores()
+    duration = probe_audio(audio_path).get("duration") or seconds
+    seconds = min(seconds, duration)
+
+    splits = []
+    c = 1
+    while c <= len(cores):
+        splits.append(c)
+        c *= 2
+
+    ctx = mp.get_context("spawn")
+    report = []
+    for concurrency in splits:
+        plan = plan_asr(cores, model_name, concurrency=concurrency, threads=max(1, len(cores) // concurrency))
+        barrier = ctx.Barrier(concurrency)
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(
+                target=_bench_child,
+                args=(audio_path, model_name, plan["threads_per_job"], plan["core_sets"][i], seconds, barrier, results),
+            )
+            for i in range(concurrency)
+        ]
+        for p in procs:
+            p.start()
+        walls = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+        row = {
+            "concurrency": concurrency,
+            "threads_per_job": plan["threads_per_job"],
+            "job_seconds": round(max(walls), 2),
+            "throughput": round(concurrency * seconds / max(walls), 2),
+        }
+        report.append(row)
+        print(
+            f"⏱️ {concurrency} x {plan['threads_per_job']} threads: "
+            f"{row['job_seconds']}s per job, {row['throughput']}x real time total"
+        )
+
+    best = max(report, key=lambda r: r["throughput"])
+    print(f"\n🏆 Best split for '{model_name}' on {len(cores)} cores:")
+    print(f"   ASR_CONCURRENCY={best['concurrency']}")
+    print(f"   ASR_THREADS_PER_JOB={best['threads_per_job']}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper CPU budget planner")
+    parser.add_argument("--plan", action="store_true", help="Print the slot plan for this machine")
+    parser.add_argument("--benchmark", action="store_true", help="Measure throughput of each split")
+    parser.add_argument("--audio", help="Audio file used by --benchmark")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--seconds", type=float, default=60.0, help="Audio seconds transcribed per job")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        if not args.audio:
+            parser.error("--benchmark needs --audio")
+        benchmark(args.audio, args.model, args.seconds)
+    else:
+        plan = plan_asr(model_name=args.model)
+        print(f"🧮 {plan['cores']} cores, model '{plan['model']}': "
+              f"{plan['concurrency']} x {plan['threads_per_job']} threads")
+        for i, cores in enumerate(plan["core_sets"]):
+            print(f"   slot {i}: cores {cores}")
+
+
+if __name__ == "__main__":
+    main()
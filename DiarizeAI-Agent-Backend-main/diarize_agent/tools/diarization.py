@@ -0,0 +1,464 @@
+"""
+Lightweight local speaker diarization (CPU, NumPy only).
+
+The ASR loop hands every decoded window to a Diarizer, which turns it into MFCC
+speaker embeddings on its own thread while Whisper transcribes the same window.
+Embeddings are over-clustered with k-means and the clusters merged while the
+Bayesian information criterion (BIC) says two of them are one voice; segments get
+SPEAKER_XX labels by time overlap before the LLM step, so the model only has to put
+names on speakers instead of guessing the turns.
+
+Hafif yerel konuşmacı ayrımı (CPU, sadece NumPy).
+
+ASR döngüsü çözülen her pencereyi bir Diarizer'a verir; Whisper aynı pencereyi
+transkribe ederken Diarizer onu kendi thread'inde MFCC konuşmacı vektörlerine çevirir.
+Vektörler k-means ile fazla sayıda kümeye ayrılır ve Bayes bilgi ölçütü (BIC) iki
+kümenin tek ses olduğunu söyledikçe birleştirilir; segmentler LLM adımından önce zaman
+örtüşmesine göre SPEAKER_XX etiketleri alır; böylece model konuşma sıralarını tahmin
+etmek yerine sadece konuşmacılara isim verir.
+"""
+
+from __future__ import annotations
+
+import math
+import queue
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from diarize_agent.cancellation import raise_if_cancelled
+from diarize_agent.tools.audio import SAMPLE_RATE
+
+# MFCC front end: 25 ms frames every 10 ms, 40 mel bands, 20 coefficients (c0, the
+# loudness, is dropped from the embedding).
+# MFCC ön ucu: 10 ms'de bir 25 ms'lik kareler, 40 mel bandı, 20 katsayı (ses şiddeti
+# olan c0 vektöre alınmaz).
+FRAME_SAMPLES = 400
+HOP_SAMPLES = 160
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 20
+
+# One embedding per 1.5 s, every 0.75 s: mean + std of the MFCCs of its speech frames
+# (for the initial k-means) and their Gaussian statistics (for the BIC merges).
+# Stretches with less than MIN_SPEECH_RATIO frames above SPEECH_DB (dBFS) get none.
+# 0.75 sn'de bir, 1.5 sn'lik bir vektör: konuşma karelerinin MFCC ortalaması + std'si
+# (ilk k-means için) ve Gauss istatistikleri (BIC birleştirmeleri için).
+# Kareleri MIN_SPEECH_RATIO'dan azı SPEECH_DB'nin (dBFS) üstündeyse vektör üretilmez.
+EMBED_SAMPLES = int(1.5 * SAMPLE_RATE)
+EMBED_HOP_SAMPLES = int(0.75 * SAMPLE_RATE)
+SPEECH_DB = -45.0
+MIN_SPEECH_RATIO = 0.3
+
+# Embeddings computed per MFCC pass (~30 s of audio), so a 10 min ASR window never
+# turns into one big frame matrix.
+# MFCC geçişi başına hesaplanan vektör sayısı (~30 sn ses); 10 dk'lık bir ASR penceresi
+# hiçbir zaman tek büyük kare matrisine dönüşmez.
+EMBEDS_PER_PASS = 40
+
+# Clusters of the initial k-means, before BIC merging brings them down to the speakers.
+# BIC birleştirmesi konuşmacı sayısına indirmeden önceki ilk k-means küme sayısı.
+INITIAL_CLUSTERS = 16
+
+# ΔBIC weighs a merge as if the pair had at most this many frames (~80 s of speech).
+# Its evidence grows with the frame count but the penalty only with its log, so in
+# long recordings one voice would otherwise stay split into several clusters.
+# ΔBIC bir birleştirmeyi çiftin en fazla bu kadar karesi varmış gibi tartar (~80 sn konuşma).
+# Kanıt kare sayısıyla, ceza ise sadece logaritmasıyla büyür; yoksa uzun kayıtlarda tek
+# bir ses birkaç kümeye bölünmüş kalırdı.
+BIC_MAX_FRAMES = 8000
+
+# A cluster never longer than this many embeddings in a row (~2.25 s) only holds turn
+# changes: windows with frames of both speakers, which BIC sees as a third voice.
+# Art arda bundan uzun hiç sürmeyen bir küme (~2.25 sn) sadece konuşma geçişlerini
+# tutar: iki konuşmacının da karelerini içeren ve BIC'in üçüncü bir ses sandığı pencereler.
+TRANSITION_RUN = 2
+
+
+@lru_cache(maxsize=1)
+def _mel_filterbank():
+    import numpy as np
+
+    def hz_to_mel(f):
+        return 2595.0 * np.log10(1.0 + f / 700.0)
+
+    def mel_to_hz(m):
+        return 700.0 * (10.0 ** (m / 2595.0) - 1.0)
+
+    edges = mel_to_hz(np.linspace(hz_to_mel(20.0), hz_to_mel(SAMPLE_RATE / 2 - 400), N_MELS + 2))
+    bins = np.fft.rfftfreq(N_FFT, 1.0 / SAMPLE_RATE)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    bank = np.maximum(0.0, np.minimum((bins - lower) / (center - lower), (upper - bins) / (upper - center)))
+    mel = np.arange(N_MELS)
+    dct = np.cos(np.pi / N_MELS * (mel[None, :] + 0.5) * np.arange(N_MFCC)[:, None])
+    return bank.astype(np.float32), dct.astype(np.float32), np.hamming(FRAME_SAMPLES).astype(np.float32)
+
+
+def mfcc(samples):
+    """
+    MFCCs and frame energies (dBFS) of float32 16 kHz audio: (frames, N_MFCC), (frames,).
+    16 kHz float32 sesin MFCC'leri ve kare enerjileri (dBFS): (kareler, N_MFCC), (kareler,).
+    """
+    import numpy as np
+
+    bank, dct, window = _mel_filterbank()
+    count = 1 + (len(samples) - FRAME_SAMPLES) // HOP_SAMPLES
+    if count <= 0:
+        return np.zeros((0, N_MFCC), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SAMPLES)[::HOP_SAMPLES][:count]
+    energy_db = 10.0 * np.log10(np.maximum(np.mean(np.square(frames), axis=1), 1e-12))
+    power = np.square(np.abs(np.fft.rfft(frames * window, N_FFT))).astype(np.float32)
+    log_mel = np.log(np.maximum(power @ bank.T, 1e-10))
+    return log_mel @ dct.T, energy_db
+
+
+def _embed(frame_mfcc, frame_db):
+    # (mean + std vector, frame count, sum, sum of outer products) or None for silence.
+    # (ortalama + std vektörü, kare sayısı, toplam, dış çarpımların toplamı) veya sessizlikte None.
+    import numpy as np
+
+    speech = frame_db > SPEECH_DB
+    if len(speech) == 0 or speech.mean() < MIN_SPEECH_RATIO:
+        return None
+    coeffs = frame_mfcc[speech][:, 1:].astype(np.float64)
+    vector = np.concatenate([coeffs.mean(axis=0), coeffs.std(axis=0)])
+    return vector, len(coeffs), coeffs.sum(axis=0), (coeffs.T @ coeffs).astype(np.float32)
+
+
+def _normalize(embeddings):
+    import numpy as np
+
+    z = (embeddings - embeddings.mean(axis=0)) / (embeddings.std(axis=0) + 1e-6)
+    return z / (np.linalg.norm(z, axis=1, keepdims=True) + 1e-9)
+
+
+def _kmeans(z, k: int, rng, iterations: int = 25):
+    # Spherical k-means (cosine) with k-means++ seeding.
+    # k-means++ başlangıçlı küresel k-means (kosinüs).
+    import numpy as np
+
+    centers = [z[rng.integers(len(z))]]
+    for _ in range(1, k):
+        distance = np.maximum(1.0 - np.max(z @ np.array(centers).T, axis=1), 0.0)
+        total = distance.sum()
+        pick = rng.choice(len(z), p=distance / total) if total > 0 else rng.integers(len(z))
+        centers.append(z[pick])
+    centers = np.array(centers)
+    labels = np.zeros(len(z), dtype=int)
+    for step in range(iterations):
+        new_labels = np.argmax(z @ centers.T, axis=1)
+        if step and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = z[labels == c]
+            # An emptied cluster restarts from the worst-fitting embedding.
+            # Boşalan küme en kötü uyan vektörden yeniden başlar.
+            center = members.sum(axis=0) if len(members) else z[np.argmin(np.max(z @ centers.T, axis=1))]
+            centers[c] = center / (np.linalg.norm(center) + 1e-9)
+    return labels
+
+
+def _log_det(count, total, outer) -> float:
+    import numpy as np
+
+    mean = total / count
+    cov = outer / count - np.outer(mean, mean) + 1e-6 * np.eye(len(mean))
+    return float(np.linalg.slogdet(cov)[1])
+
+
+def _delta_bic(a, b, penalty: float) -> float:
+    # > 0: two Gaussians explain the frames better than one (different speakers).
+    # > 0: kareleri iki Gauss tek Gauss'tan iyi açıklıyor (farklı konuşmacılar).
+    count = a[0] + b[0]
+    scale = min(1.0, BIC_MAX_FRAMES / count)
+    dim = len(a[1])
+    params = dim + dim * (dim + 1) / 2
+    gain = 0.5 * scale * (
+        count * _log_det(count, a[1] + b[1], a[2] + b[2]) - a[0] * _log_det(*a) - b[0] * _log_det(*b)
+    )
+    return gain - penalty * 0.5 * params * math.log(count * scale)
+
+
+def cluster_embeddings(embeddings, max_speakers: int, penalty: float):
+    """
+    Speaker index per embedding (the tuples of _embed). k-means over-clusters the
+    mean/std vectors, then the closest pair by ΔBIC is merged until every pair is
+    a distinct voice and at most max_speakers remain. Seeded, so the same audio
+    always gets the same clusters.
+
+    Vektör başına konuşmacı indeksi (_embed demetleri). k-means ortalama/std vektörlerini
+    fazla sayıda kümeye ayırır, sonra her çift farklı bir ses olana ve en fazla
+    max_speakers kalana kadar ΔBIC'e göre en yakın çift birleştirilir. Tohumludur; aynı
+    ses her zaman aynı kümeleri alır.
+    """
+    import numpy as np
+
+    labels = np.zeros(len(embeddings), dtype=int)
+    if len(embeddings) < 4 or max_speakers < 2:
+        return labels
+    z = _normalize(np.stack([e[0] for e in embeddings]))
+    labels = _kmeans(z, min(INITIAL_CLUSTERS, len(z) // 4), np.random.default_rng(0))
+
+    stats = {}
+    for (_, count, total, outer), label in zip(embeddings, labels.tolist()):
+        if label in stats:
+            acc = stats[label]
+            stats[label] = (acc[0] + count, acc[1] + total, acc[2] + outer)
+        else:
+            stats[label] = (count, total, outer.astype(np.float64))
+    merged = {label: label for label in stats}
+    while len(stats) > 1:
+        keys = sorted(stats)
+        score, a, b = min(
+            (_delta_bic(stats[a], stats[b], penalty), a, b)
+            for i, a in enumerate(keys) for b in keys[i + 1:]
+        )
+        if score > 0 and len(stats) <= max_speakers:
+            break
+        other = stats.pop(b)
+        stats[a] = (stats[a][0] + other[0], stats[a][1] + other[1], stats[a][2] + other[2])
+        for label, target in merged.items():
+            if target == b:
+                merged[label] = a
+    labels = np.array([merged[label] for label in labels.tolist()])
+    labels = _absorb_transitions(z, labels)
+
+    # A single embedding between two of another speaker is a flicker, not a turn.
+    # Başka bir konuşmacının iki vektörü arasındaki tek vektör bir titremedir, sıra değil.
+    if len(labels) > 2:
+        flicker = (labels[:-2] == labels[2:]) & (labels[1:-1] != labels[:-2])
+        labels[1:-1][flicker] = labels[:-2][flicker]
+    return labels
+
+
+def _absorb_transitions(z, labels):
+    # Embeddings of transition-only clusters go to the more similar of the speakers
+    # just before and after them.
+    # Sadece geçiş içeren kümelerin vektörleri, hemen önceki ve sonraki konuşmacılardan
+    # daha benzer olanına verilir.
+    import numpy as np
+
+    longest: Dict[int, int] = {}
+    run = 0
+    for i, label in enumerate(labels.tolist()):
+        run = run + 1 if i and labels[i - 1] == label else 1
+        longest[label] = max(longest.get(label, 0), run)
+    speakers = [label for label, length in longest.items() if length > TRANSITION_RUN]
+    if not speakers or len(speakers) == len(longest):
+        return labels
+
+    centers = {}
+    for label in speakers:
+        center = z[labels == label].sum(axis=0)
+        centers[label] = center / (np.linalg.norm(center) + 1e-9)
+    result = labels.copy()
+    for i in np.flatnonzero(~np.isin(labels, speakers)).tolist():
+        before = next((labels[j] for j in range(i - 1, -1, -1) if labels[j] in centers), None)
+        after = next((labels[j] for j in range(i + 1, len(labels)) if labels[j] in centers), None)
+        candidates = [label for label in (before, after) if label is not None]
+        result[i] = max(candidates, key=lambda label: float(z[i] @ centers[label]))
+    return result
+
+
+class Diarizer:
+    """
+    Speaker labels for one recording, computed next to the ASR loop.
+
+        diarizer = Diarizer(cancel_event).start()
+        transcribe_audio_with_whisper(..., on_audio=diarizer.feed)
+        diarizer.label(segments)          # any time; waits for the audio fed so far
+        diarizer.label(segments, relabel=True)  # after finish(): final labels for every row
+        diarizer.finish()
+
+    Failures are kept in `error` and leave segments unlabeled (the LLM then infers speakers).
+
+    Bir kaydın konuşmacı etiketleri, ASR döngüsünün yanında hesaplanır. Hatalar `error`'da
+    tutulur ve segmentleri etiketsiz bırakır (LLM konuşmacıları kendisi çıkarır).
+    """
+
+    def __init__(self, cancel_event: Optional[threading.Event] = None):
+        self.cancel_event = cancel_event
+        self.max_speakers = Config.DIARIZATION_MAX_SPEAKERS
+        self.penalty = Config.DIARIZATION_BIC_PENALTY
+        # Two windows in flight at most: a lagging diarizer slows ASR down instead of
+        # holding decoded audio in memory.
+        # En fazla iki pencere yolda: geride kalan diarizer, çözülmüş sesi bellekte
+        # biriktirmek yerine ASR'yi yavaşlatır.
+        self._queue: "queue.Queue" = queue.Queue(maxsize=2)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._fed = 0
+        self._processed = 0
+        self._done = False
+        self._failed = False
+        self._buffer = None
+        self._buffer_start = 0
+        self._starts: List[float] = []
+        self._embeddings: List[Any] = []
+        self._names: Dict[int, int] = {}
+        self._next_name = 0
+        self.compute_seconds = 0.0
+        self.speakers = 0
+        self.error: Optional[str] = None
+
+    def start(self) -> "Diarizer":
+        self._thread = threading.Thread(target=self._run, name="diarizer", daemon=True)
+        self._thread.start()
+        return self
+
+    def feed(self, window, start_sec: float) -> None:
+        """
+        on_audio callback of the ASR loop: one decoded float32 window and its start.
+        ASR döngüsünün on_audio geri çağrısı: çözülmüş bir float32 pencere ve başlangıcı.
+        """
+        if self._failed or self._done:
+            return
+        with self._cond:
+            self._fed += 1
+        self._queue.put((window, int(round(start_sec * SAMPLE_RATE))))
+
+    def finish(self) -> None:
+        """
+        No more audio: the tail is embedded and the thread exits. Also safe on errors.
+        Başka ses yok: kalan kısım işlenir ve thread çıkar. Hata durumunda da güvenlidir.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            started = time.perf_counter()
+            try:
+                if not self._failed:
+                    if item is None:
+                        self._consume(final=True)
+                    else:
+                        self._append(*item)
+                        self._consume(final=False)
+            except Exception as e:
+                # Reported by the caller: stdout is muted while Whisper runs.
+                # Çağıran raporlar: Whisper çalışırken stdout susturulur.
+                self.error = str(e) or type(e).__name__
+                self._failed = True
+            self.compute_seconds += time.perf_counter() - started
+            with self._cond:
+                if item is None:
+                    self._done = True
+                else:
+                    self._processed += 1
+                self._cond.notify_all()
+            if item is None:
+                return
+
+    def _append(self, window, start: int) -> None:
+        import numpy as np
+
+        window = np.asarray(window, dtype=np.float32)
+        if self._buffer is None or start != self._buffer_start + len(self._buffer):
+            # First window, or a gap: start a new stretch.
+            # İlk pencere veya bir boşluk: yeni bir parça başlat.
+            self._buffer, self._buffer_start = window, start
+        else:
+            self._buffer = np.concatenate([self._buffer, window])
+
+    def _consume(self, final: bool) -> None:
+        buffer = self._buffer
+        if buffer is None:
+            return
+        frames_per_embed = 1 + (EMBED_SAMPLES - FRAME_SAMPLES) // HOP_SAMPLES
+        frames_per_hop = EMBED_HOP_SAMPLES // HOP_SAMPLES
+        while len(buffer) >= EMBED_SAMPLES:
+            count = min(EMBEDS_PER_PASS, 1 + (len(buffer) - EMBED_SAMPLES) // EMBED_HOP_SAMPLES)
+            span = (count - 1) * EMBED_HOP_SAMPLES + EMBED_SAMPLES
+            frame_mfcc, frame_db = mfcc(buffer[:span])
+            for j in range(count):
+                lo = j * frames_per_hop
+                embedding = _embed(frame_mfcc[lo: lo + frames_per_embed], frame_db[lo: lo + frames_per_embed])
+                if embedding is not None:
+                    self._starts.append((self._buffer_start + j * EMBED_HOP_SAMPLES) / SAMPLE_RATE)
+                    self._embeddings.append(embedding)
+            buffer = buffer[count * EMBED_HOP_SAMPLES:]
+            self._buffer_start += count * EMBED_HOP_SAMPLES
+        if final and len(buffer) >= EMBED_SAMPLES // 3:
+            frame_mfcc, frame_db = mfcc(buffer)
+            embedding = _embed(frame_mfcc, frame_db)
+            if embedding is not None:
+                self._starts.append(self._buffer_start / SAMPLE_RATE)
+                self._embeddings.append(embedding)
+        self._buffer = buffer.copy() if len(buffer) else None
+
+    def _wait_for_fed_audio(self) -> None:
+        with self._cond:
+            while not self._done and not self._failed and self._processed < self._fed:
+                self._cond.wait(timeout=0.5)
+                raise_if_cancelled(self.cancel_event)
+
+    def label(self, segments: List[Dict[str, Any]], relabel: bool = False) -> int:
+        """
+        Sets "speaker" (SPEAKER_XX) on segments that have none, by time overlap with the
+        clustered embeddings; with relabel=True existing labels are overwritten too, since
+        a later clustering can split or merge earlier clusters. Names are kept stable
+        across calls where possible: a cluster keeps the name most of its embeddings had
+        before. Returns the number of speakers found.
+
+        Konuşmacısı olmayan segmentlere, kümelenmiş vektörlerle zaman örtüşmesine göre
+        "speaker" (SPEAKER_XX) atar; relabel=True ile mevcut etiketler de yenilenir, çünkü
+        sonraki bir kümeleme önceki kümeleri bölebilir veya birleştirebilir. İsimler mümkün
+        olduğunca sabit kalır: bir küme, vektörlerinin çoğunun daha önce taşıdığı ismi korur.
+        Bulunan konuşmacı sayısını döner.
+        """
+        import numpy as np
+
+        self._wait_for_fed_audio()
+        if self._failed or not self._embeddings or not segments:
+            return 0
+        started = time.perf_counter()
+        count = len(self._embeddings)
+        starts = np.asarray(self._starts[:count])
+        clusters = cluster_embeddings(self._embeddings[:count], self.max_speakers, self.penalty)
+
+        names = np.empty(count, dtype=int)
+        taken = set()
+        # Clusters in order of first appearance, so SPEAKER_00 is whoever spoke first.
+        # Kümeler ilk görünme sırasına göre; SPEAKER_00 ilk konuşandır.
+        for cluster in sorted(set(clusters.tolist()), key=lambda c: int(np.argmax(clusters == c))):
+            members = np.flatnonzero(clusters == cluster)
+            previous = [self._names[i] for i in members if i in self._names and self._names[i] not in taken]
+            if previous:
+                name = max(set(previous), key=previous.count)
+            else:
+                name = self._next_name
+                self._next_name += 1
+            taken.add(name)
+            names[members] = name
+        self._names = dict(enumerate(names.tolist()))
+        self.speakers = len(taken)
+
+        ends = starts + EMBED_SAMPLES / SAMPLE_RATE
+        for seg in segments:
+            if seg.get("speaker") and not relabel:
+                continue
+            seg_start = float(seg.get("start") or 0.0)
+            seg_end = max(float(seg.get("end") or seg_start), seg_start)
+            lo = int(np.searchsorted(starts, seg_start - EMBED_SAMPLES / SAMPLE_RATE))
+            hi = int(np.searchsorted(starts, seg_end, side="right"))
+            overlap = np.minimum(ends[lo:hi], seg_end) - np.maximum(starts[lo:hi], seg_start)
+            if hi > lo and overlap.max() > 0:
+                votes: Dict[int, float] = {}
+                for name, amount in zip(names[lo:hi].tolist(), overlap.tolist()):
+                    if amount > 0:
+                        votes[name] = votes.get(name, 0.0) + amount
+                name = max(votes, key=votes.get)
+            else:
+                # No speech embedding under the segment: take the nearest one.
+                # Segmentin altında konuşma vektörü yok: en yakını alınır.
+                middle = (seg_start + seg_end) / 2
+                name = int(names[np.argmin(np.abs(starts + EMBED_SAMPLES / SAMPLE_RATE / 2 - middle))])
+            seg["speaker"] = f"SPEAKER_{name:02d}"
+        self.compute_seconds += time.perf_counter() - started
+        return self.speakers
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
+import threading
+import time
 import warnings
 from contextlib import contextmanager, redirect_stderr, redirect_stdout
 from io import StringIO
 from pathlib import Path
+from typing import Callable
 
-import whisper
 from config import Config
+from diarize_agent.cancellation import raise_if_cancelled
+from diarize_agent.profiles import get_profile
+from diarize_agent.tools.audio import SAMPLE_RATE, iter_pcm_blocks, pcm_to_float32
+from diarize_agent.tools.cpu_budget import asr_slots
+
+# Whisper (and therefore torch) is imported lazily so that processes which only
+# serve auth/listing routes never pay the ML start-up cost.
+# Whisper (ve dolayısıyla torch) tembel olarak içe aktarılır; sadece auth/listeleme
+# yapan süreçler ML başlangıç maliyetini hiç ödemez.
+_MODEL_CACHE: dict = {}
+_MODEL_LOCK = threading.Lock()
+_MODEL_LOAD_SECONDS: dict = {}
 
 
 @contextmanager
@@ -18,51 +32,277 @@ def _suppress_output_and_warnings():
             yield
 
 
-def transcribe_audio_with_whisper(audio_file_path: str) -> dict:
+def get_whisper_model(model_name: str | None = None):
+    """
+    Returns a cached Whisper model, loading it on first use.
+    Önbellekteki Whisper modelini döndürür, ilk kullanımda yükler.
+    """
+    name = model_name or Config.WHISPER_MODEL
+    model = _MODEL_CACHE.get(name)
+    if model is not None:
+        return model
+
+    with _MODEL_LOCK:
+        model = _MODEL_CACHE.get(name)
+        if model is None:
+            started = time.perf_counter()
+            import whisper
+
+            with _suppress_output_and_warnings():
+                model = whisper.load_model(name)
+            _MODEL_CACHE[name] = model
+            _MODEL_LOAD_SECONDS[name] = round(time.perf_counter() - started, 3)
+    return model
+
+
+def is_whisper_model_loaded(model_name: str | None = None) -> bool:
+    return (model_name or Config.WHISPER_MODEL) in _MODEL_CACHE
+
+
+def whisper_model_status() -> dict:
+    """
+    Snapshot of loaded models and their load times, used by /readyz.
+    Yüklü modellerin ve yükleme sürelerinin anlık görüntüsü (/readyz kullanır).
+    """
+    return {
+        "configured": Config.WHISPER_MODEL,
+        "loaded": sorted(_MODEL_CACHE),
+        "load_seconds": dict(_MODEL_LOAD_SECONDS),
+    }
+
+
+def warm_up_models(model_names: list | None = None) -> None:
+    """
+    Loads the given Whisper models (default: the configured one) ahead of the first job
+    (used by workers / WARMUP_MODELS).
+    Verilen Whisper modellerini (varsayılan: yapılandırılmış olan) ilk işten önce yükler
+    (worker'lar / WARMUP_MODELS kullanır).
+    """
+    for name in model_names or [Config.WHISPER_MODEL]:
+        started = time.perf_counter()
+        get_whisper_model(name)
+        print(f"🔥 Whisper '{name}' warm in {time.perf_counter() - started:.2f}s")
+
+
+# Rough peak bytes per window sample inside model.transcribe: the int16 block and its
+# float32 copy, the padded copy for the mel, the complex STFT (201 bins / 160 hop) and
+# its magnitudes, and the 80-bin log-mel itself.
+# model.transcribe içinde pencere örneği başına yaklaşık tepe byte: int16 blok ve float32
+# kopyası, mel için dolgulu kopya, karmaşık STFT (201 bin / 160 adım) ve genlikleri,
+# ve 80 binlik log-mel'in kendisi.
+_BYTES_PER_WINDOW_SAMPLE = 28
+
+
+def _window_samples(window_sec: float) -> int:
+    """
+    Window length in samples: window_sec, shortened to fit ASR_DECODE_MAX_MB,
+    never below Whisper's 30 s chunk.
+    Örnek cinsinden pencere uzunluğu: window_sec, ASR_DECODE_MAX_MB'ye sığacak
+    şekilde kısaltılır, Whisper'ın 30 sn'lik parçasının altına inmez.
+    """
+    import whisper
+
+    samples = int(window_sec * SAMPLE_RATE)
+    if Config.ASR_DECODE_MAX_MB > 0:
+        samples = min(samples, int(Config.ASR_DECODE_MAX_MB * 1024 * 1024 / _BYTES_PER_WINDOW_SAMPLE))
+    return max(samples, whisper.audio.N_SAMPLES)
+
+
+# Energy VAD for the profiles with `vad`: a window is skipped when fewer than
+# VAD_MIN_SPEECH_RATIO of its 30 ms frames are louder than VAD_THRESHOLD_DB (dBFS).
+# `vad` açık profiller için enerji VAD'ı: 30 ms'lik karelerinin VAD_MIN_SPEECH_RATIO'sundan
+# azı VAD_THRESHOLD_DB'den (dBFS) yüksekse pencere atlanır.
+VAD_FRAME_SAMPLES = 480
+VAD_THRESHOLD_DB = -45.0
+VAD_MIN_SPEECH_RATIO = 0.02
+
+
+def _has_speech(window) -> bool:
+    import numpy as np
+
+    frames = len(window) // VAD_FRAME_SAMPLES
+    if frames == 0:
+        return bool(len(window))
+    rms = np.sqrt(np.mean(np.square(window[: frames * VAD_FRAME_SAMPLES].reshape(frames, -1)), axis=1))
+    loud = rms > 10 ** (VAD_THRESHOLD_DB / 20)
+    return float(np.mean(loud)) >= VAD_MIN_SPEECH_RATIO
+
+
+def transcribe_audio_with_whisper(
+    audio_file_path: str,
+    pcm_path: str | None = None,
+    cancel_event: threading.Event | None = None,
+    on_window: Callable[[list], None] | None = None,
+    options: dict | None = None,
+    on_audio: Callable[..., None] | None = None,
+) -> dict:
+    """
+    Transcribes window by window with the settings of a processing profile
+    (options = profiles.get_profile(...); default profile if None). If given,
+    on_window(segments) is called with the segments of each finished window so
+    callers can start downstream work early, and on_audio(samples, start_sec) with
+    each decoded window before Whisper starts on it (diarization runs meanwhile).
+
+    Bir işleme profilinin ayarlarıyla pencere pencere transkribe eder (options =
+    profiles.get_profile(...); None ise varsayılan profil). Verilirse on_window(segments)
+    her biten pencerenin segmentleriyle çağrılır; böylece çağıran sonraki işlere erken başlayabilir.
+    on_audio(samples, start_sec) ise çözülen her pencereyle, Whisper ona başlamadan önce
+    çağrılır (bu sırada konuşmacı ayrımı çalışır).
+
+    Runs inside an ASR slot (thread budget / core set, see cpu_budget); if all slots
+    are busy it waits instead of oversubscribing the CPU.
+    Bir ASR slotu içinde çalışır (thread bütçesi / çekirdek kümesi, bkz. cpu_budget);
+    tüm slotlar doluysa CPU'yu aşırı yüklemek yerine bekler.
+    """
     audio_path = Path(audio_file_path)
-    if not audio_path.exists():
+    if not audio_path.exists() and not (pcm_path and Path(pcm_path).exists()):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
-    with _suppress_output_and_warnings():
-        model = whisper.load_model(Config.WHISPER_MODEL)
-
-        # 1) Dil tespiti (AUTO) + güven skoru
-        # 1) Language detection (AUTO) + confidence score
-        audio = whisper.load_audio(str(audio_path))
-        audio = whisper.pad_or_trim(audio)
-        mel = whisper.log_mel_spectrogram(audio).to(model.device)
-        _, probs = model.detect_language(mel)
-
-        detected_lang = max(probs, key=probs.get)
-        detected_prob = float(probs[detected_lang])
-
-        # 2) Transcribe (dil parametresi vermiyoruz -> auto)
-        # 2) Transcribe (we don't specify a language parameter -> auto)
-        result = model.transcribe(# result içinde 'text' ve 'segments' var text tüm konuşma segments ise zaman aralıklarıyla parçalara ayrılmış hali 
-            # The result contains 'text' and 'segments'. 'Text' represents the entire conversation, and 'segments' represents the conversation broken down into segments with time intervals.
-            
-            str(audio_path),
-            fp16=False,
-            verbose=False,
-            temperature=0.0, # daha tutarlı sonuçlar için yaratıcılık yok halüsinasyon azalt
-                             # For more consistent results, creativity is lacking, hallucination reduction
-            no_speech_threshold=0.6, # sessizlik algılama eşiği konuşma olasılığı %60 altındaysa sessizlik kabul et ve atla
-                                     # Silence detection threshold: If the probability of speech is below 60%, acknowledge and skip the silence.
-            logprob_threshold=-1.0, 
-            compression_ratio_threshold=2.4,
-            condition_on_previous_text=True, # bağlamı koru bir cümleyi çevirirken önceki cümleleri de dikkate alır
-                                             # Preserve context: When translating a sentence, consider the sentences that precede it.
+    raise_if_cancelled(cancel_event)
+    with asr_slots().acquire(cancel_event):
+        return _transcribe_windows(
+            audio_path, pcm_path, cancel_event, on_window, options or get_profile(), on_audio
         )
 
-    clean_text = " ".join((result.get("text") or "").split())
-    segments = [
-    {
-        "start": float(s["start"]),
-        "end": float(s["end"]),
-        "text": " ".join((s.get("text") or "").split()),
+
+def _emit(window_segments: list, segments: list, on_window: Callable[[list], None] | None) -> None:
+    segments.extend(window_segments)
+    if on_window is not None and window_segments:
+        on_window(list(window_segments))
+
+
+def _transcribe_windows(
+    audio_path: Path,
+    pcm_path: str | None,
+    cancel_event: threading.Event | None,
+    on_window: Callable[[list], None] | None,
+    options: dict,
+    on_audio: Callable[..., None] | None = None,
+) -> dict:
+    model = get_whisper_model(options["whisper_model"])
+    import numpy as np
+    import whisper
+
+    temperatures = options["temperatures"]
+    decode_options = {
+        "temperature": tuple(temperatures) if len(temperatures) > 1 else temperatures[0],
+        "condition_on_previous_text": options["condition_on_previous_text"],
     }
-    for s in (result.get("segments") or [])
-]
+    # Whisper drops beam_size at T>0 and best_of at T=0 itself.
+    # Whisper T>0'da beam_size'ı, T=0'da best_of'u kendisi düşürür.
+    if options.get("beam_size"):
+        decode_options["beam_size"] = options["beam_size"]
+    if options.get("best_of"):
+        decode_options["best_of"] = options["best_of"]
+    skipped = 0
+
+    segments = []
+    window_samples = _window_samples(options["window_sec"])
+    # Consecutive windows share `overlap` samples, so a word cut by a window edge is heard
+    # whole by the next window. Segments starting in a window's overlap tail are held
+    # back and left to the next window, which drops what was already emitted.
+    # Ardışık pencereler `overlap` örnek paylaşır; pencere kenarının böldüğü bir kelime
+    # sonraki pencerede bütün duyulur. Bir pencerenin örtüşen sonunda başlayan segmentler
+    # bekletilir ve sonraki pencereye bırakılır; o da zaten verilmiş olanları atar.
+    overlap = min(int(Config.WHISPER_WINDOW_OVERLAP_SEC * SAMPLE_RATE), window_samples // 4)
+    # Audio arrives block by block (PCM cache or ffmpeg pipe), one window per block plus
+    # the previous overlap, so only the current window and its mel are ever in memory.
+    # Ses blok blok gelir (PCM önbelleği veya ffmpeg borusu), blok başına bir pencere
+    # artı önceki örtüşme; bellekte sadece mevcut pencere ve onun mel'i bulunur.
+    blocks = iter_pcm_blocks(str(audio_path), window_samples - overlap, pcm_path=pcm_path)
+    with _suppress_output_and_warnings():
+        offset = 0
+        tail = None
+        held: list = []
+        emitted_until = 0.0
+        previous_text = None
+        detected_lang = None
+        # Transcribe window by window so a cancelled job stops between windows.
+        # The tail of the previous window is passed as prompt to keep context.
+        # Pencere pencere transkribe et; iptal edilen iş pencereler arasında durur.
+        # Bağlamı korumak için önceki pencerenin sonu prompt olarak verilir.
+        try:
+            for block in blocks:
+                raise_if_cancelled(cancel_event)
+                fresh = pcm_to_float32(block)
+                del block
+                # Only new audio goes to on_audio: the diarizer expects contiguous samples.
+                # on_audio'ya sadece yeni ses gider: diarizer kesintisiz örnek bekler.
+                if on_audio is not None:
+                    on_audio(fresh, offset / SAMPLE_RATE)
+                window = fresh if tail is None else np.concatenate([tail, fresh])
+                window_start = offset - (0 if tail is None else len(tail))
+                offset += len(fresh)
+                tail = window[-overlap:].copy() if overlap else None
+                del fresh
+
+                if detected_lang is None:
+                    # Dil tespiti (AUTO), ilk pencerenin ilk 30 sn'si üzerinden
+                    # Language detection (AUTO) on the first 30 s of the first window
+                    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(window)).to(model.device)
+                    _, probs = model.detect_language(mel)
+                    del mel
+                    detected_lang = max(probs, key=probs.get)
+
+                if options.get("vad") and not _has_speech(window):
+                    skipped += 1
+                    # Nothing here re-transcribes the held segments; keep them as they are.
+                    # Burada bekletilen segmentleri yeniden transkribe eden yok; oldukları gibi kalırlar.
+                    _emit(held, segments, on_window)
+                    if held:
+                        emitted_until = max(emitted_until, held[-1]["end"])
+                    held = []
+                    continue
+
+                result = model.transcribe(# result içinde 'text' ve 'segments' var text tüm konuşma segments ise zaman aralıklarıyla parçalara ayrılmış hali 
+                    # The result contains 'text' and 'segments'. 'Text' represents the entire conversation, and 'segments' represents the conversation broken down into segments with time intervals.
+            
+                    window,
+                    language=detected_lang,
+                    initial_prompt=previous_text if options["condition_on_previous_text"] else None,
+                    fp16=False,
+                    verbose=False,
+                    # temperature 0 (balanced/fast): daha tutarlı sonuçlar için yaratıcılık yok halüsinasyon azalt
+                    # temperature 0 (balanced/fast): for more consistent results, creativity is lacking, hallucination reduction
+                    no_speech_threshold=0.6, # sessizlik algılama eşiği konuşma olasılığı %60 altındaysa sessizlik kabul et ve atla
+                                             # Silence detection threshold: If the probability of speech is below 60%, acknowledge and skip the silence.
+                    logprob_threshold=-1.0, 
+                    compression_ratio_threshold=2.4,
+                    # condition_on_previous_text: bağlamı koru bir cümleyi çevirirken önceki cümleleri de dikkate alır
+                    # condition_on_previous_text: preserve context, consider the sentences that precede it.
+                    **decode_options,
+                )
+
+                offset_sec = window_start / SAMPLE_RATE
+                window_segments = [
+                    {
+                        "start": float(s["start"]) + offset_sec,
+                        "end": float(s["end"]) + offset_sec,
+                        "text": " ".join((s.get("text") or "").split()),
+                    }
+                    for s in (result.get("segments") or [])
+                ]
+                # The held segments of the previous window are replaced by this one's.
+                # Önceki pencerenin bekletilen segmentleri bu pencereninkilerle değişir.
+                window_segments = [
+                    {**seg, "start": max(seg["start"], emitted_until)}
+                    for seg in window_segments if (seg["start"] + seg["end"]) / 2 >= emitted_until
+                ]
+                hold_from = (window_start + len(window) - overlap) / SAMPLE_RATE
+                held = [seg for seg in window_segments if overlap and seg["start"] >= hold_from]
+                ready = window_segments[: len(window_segments) - len(held)]
+                _emit(ready, segments, on_window)
+                if ready:
+                    emitted_until = max(emitted_until, ready[-1]["end"])
+                    previous_text = " ".join(seg["text"] for seg in ready[-3:])
+            # Nothing follows the last window: its held segments are final.
+            # Son pencereden sonra bir şey gelmez: bekletilen segmentleri kesindir.
+            _emit(held, segments, on_window)
+        finally:
+            blocks.close()
+
+    if skipped:
+        print(f"🔇 VAD skipped {skipped} silent window(s)")
 
     return {
         
@@ -79,6 +319,10 @@ def transcribe_audio_with_whisper(audio_file_path: str) -> dict:
 #--------------------------------------------------------------------------------------------------
 #                                   PYNOTE DIARIZATION
 #--------------------------------------------------------------------------------------------------
+# Kept for reference; speaker labels now come from the local CPU stage in
+# diarize_agent/tools/diarization.py (no HF token, runs next to Whisper).
+# Referans için tutuluyor; konuşmacı etiketleri artık diarize_agent/tools/diarization.py
+# içindeki yerel CPU aşamasından gelir (HF token gerekmez, Whisper'ın yanında çalışır).
 # logging.getLogger("pyannote").setLevel(logging.ERROR)
 # warnings.filterwarnings("ignore")
 
@@ -0,0 +1,224 @@
+# src/exporters.py
+
+import glob
+import io
+import os
+import re
+import uuid
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+# Export renderers are generators: they yield one cue / paragraph at a time so
+# peak memory stays flat no matter how long the transcript is.
+# Dışa aktarma fonksiyonları generator'dır: her seferinde bir altyazı / paragraf
+# üretirler, böylece transkript ne kadar uzun olursa olsun bellek sabit kalır.
+
+EXPORT_FORMATS = {
+    "srt": ("application/x-subrip; charset=utf-8", "srt"),
+    "vtt": ("text/vtt; charset=utf-8", "vtt"),
+    "txt": ("text/plain; charset=utf-8", "txt"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+}
+
+
+def _timestamp(seconds: Any, sep: str) -> str:
+    try:
+        ms = int(round(max(float(seconds), 0.0) * 1000))
+    except (TypeError, ValueError):
+        ms = 0
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{sep}{ms:03d}"
+
+
+def _clean(text: Any) -> str:
+    return " ".join(str(text or "").split())
+
+
+def render_srt(segments: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for i, seg in enumerate(segments, start=1):
+        speaker = _clean(seg.get("speaker"))
+        text = _clean(seg.get("text"))
+        line = f"{speaker}: {text}" if speaker else text
+        yield f"{i}\n{_timestamp(seg.get('start'), ',')} --> {_timestamp(seg.get('end'), ',')}\n{line}\n\n"
+
+
+def render_vtt(segments: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    yield "WEBVTT\n\n"
+    for seg in segments:
+        speaker = _clean(seg.get("speaker")).replace(">", "")
+        text = _clean(seg.get("text"))
+        line = f"<v {speaker}>{text}" if speaker else text
+        yield f"{_timestamp(seg.get('start'), '.')} --> {_timestamp(seg.get('end'), '.')}\n{line}\n\n"
+
+
+def _transcript_lines(segments: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for seg in segments:
+        stamp = _timestamp(seg.get("start"), ".")[:-4]
+        speaker = _clean(seg.get("speaker"))
+        text = _clean(seg.get("text"))
+        yield f"[{stamp}] {speaker}: {text}" if speaker else f"[{stamp}] {text}"
+
+
+def render_txt(doc: Dict[str, Any]) -> Iterator[str]:
+    if doc.get("summary"):
+        yield "SUMMARY\n"
+        yield f"{doc['summary'].strip()}\n\n"
+    if doc.get("keypoints"):
+        yield "KEY POINTS\n"
+        for point in doc["keypoints"]:
+            yield f"- {_clean(point)}\n"
+        yield "\n"
+    yield "TRANSCRIPT\n"
+    for line in _transcript_lines(doc.get("segments") or []):
+        yield f"{line}\n"
+
+
+# -----------------------------
+# DOCX (minimal WordprocessingML package, written as a streamed zip)
+# -----------------------------
+_INVALID_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOC_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+_DOC_TAIL = '<w:sectPr/></w:body></w:document>'
+
+
+def _paragraph(text: str, bold: bool = False, size: Optional[int] = None) -> str:
+    props = ""
+    if bold or size:
+        props = "<w:rPr>" + ("<w:b/>" if bold else "") + (f'<w:sz w:val="{size}"/>' if size else "") + "</w:rPr>"
+    body = escape(_INVALID_XML.sub("", text))
+    return f'<w:p><w:r>{props}<w:t xml:space="preserve">{body}</w:t></w:r></w:p>'
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Unseekable sink for zipfile; the generator drains it after each write.
+    zipfile için geri sarılamayan hedef; generator her yazmadan sonra boşaltır.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def render_docx(doc: Dict[str, Any]) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        yield sink.drain()
+
+        with zf.open("word/document.xml", "w", force_zip64=True) as part:
+            part.write(_DOC_HEAD.encode("utf-8"))
+            if doc.get("summary"):
+                part.write(_paragraph("Summary", bold=True, size=32).encode("utf-8"))
+                for block in str(doc["summary"]).splitlines():
+                    part.write(_paragraph(block).encode("utf-8"))
+            if doc.get("keypoints"):
+                part.write(_paragraph("Key Points", bold=True, size=32).encode("utf-8"))
+                for point in doc["keypoints"]:
+                    part.write(_paragraph(f"• {_clean(point)}").encode("utf-8"))
+            part.write(_paragraph("Transcript", bold=True, size=32).encode("utf-8"))
+            for line in _transcript_lines(doc.get("segments") or []):
+                part.write(_paragraph(line).encode("utf-8"))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            part.write(_DOC_TAIL.encode("utf-8"))
+    yield sink.drain()
+
+
+def render_export(fmt: str, doc: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    Streams an export as bytes. `doc` holds summary, keypoints and segments.
+    Dışa aktarımı bayt olarak akıtır. `doc` summary, keypoints ve segments içerir.
+    """
+    if fmt == "docx":
+        yield from render_docx(doc)
+        return
+    if fmt == "srt":
+        pieces = render_srt(doc.get("segments") or [])
+    elif fmt == "vtt":
+        pieces = render_vtt(doc.get("segments") or [])
+    elif fmt == "txt":
+        pieces = render_txt(doc)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    for piece in pieces:
+        yield piece.encode("utf-8")
+
+
+# -----------------------------
+# Render cache (keyed on job id + updated_at)
+# -----------------------------
+def export_cache_path(cache_dir: str, job_id: int, version: str, fmt: str) -> str:
+    return os.path.join(cache_dir, f"job_{job_id}_{version}.{fmt}")
+
+
+def purge_exports(cache_dir: str, job_id: int, keep_version: Optional[str] = None) -> None:
+    """
+    Removes cached exports of a job, except those of `keep_version`.
+    Bir işin önbellekteki dışa aktarımlarını siler, `keep_version` olanlar hariç.
+    """
+    for path in glob.glob(os.path.join(cache_dir, f"job_{job_id}_*")):
+        if keep_version and os.path.basename(path).startswith(f"job_{job_id}_{keep_version}."):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def stream_and_cache(chunks: Iterator[bytes], cache_path: str) -> Iterator[bytes]:
+    """
+    Yields chunks to the client while writing them to the cache; the cache file
+    is published only if the whole export was produced.
+    Parçaları istemciye gönderirken önbelleğe de yazar; önbellek dosyası sadece
+    dışa aktarımın tamamı üretildiyse yayınlanır.
+    """
+    tmp_path = f"{cache_path}.{uuid.uuid4().hex}.part"
+    completed = False
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in chunks:
+                out.write(chunk)
+                yield chunk
+        os.replace(tmp_path, cache_path)
+        completed = True
+    finally:
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
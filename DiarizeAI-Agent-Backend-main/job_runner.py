@@ -0,0 +1,264 @@
+# src/job_runner.py
+
+import os
+import json
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import or_, update
+
+from config import Config
+from models import db, Job
+from pipeline import run_whisper_and_agent, run_agent_on_text
+from profiling import ProfileSession, should_profile
+from diarize_agent.cancellation import JobCancelled
+from diarize_agent.profiles import get_profile
+from diarize_agent.tools.audio import normalize_audio
+
+
+def ensure_normalized_audio(job: Job) -> None:
+    """
+    Builds the PCM cache for a job if it is missing and records its size on the job.
+    Eksikse iş için PCM önbelleğini oluşturur ve boyutunu işe kaydeder.
+    """
+    if job.pcm_path and os.path.exists(job.pcm_path):
+        return
+    info = normalize_audio(job.audio_path)
+    job.pcm_path = info["pcm_path"]
+    job.audio_samples = info["samples"]
+    job.audio_duration = info["duration"]
+
+
+class _PartialResultWriter:
+    """
+    on_partial handler: collects streamed LLM output and stores it on
+    job.partial_result, at most every LLM_PARTIAL_FLUSH_SEC (summary right away).
+
+    on_partial işleyicisi: akıtılan LLM çıktısını toplar ve job.partial_result'a
+    en fazla LLM_PARTIAL_FLUSH_SEC'te bir yazar (özet hemen).
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.fields: Dict[str, Any] = {}
+        self.segments: Dict[Any, Dict[str, Any]] = {}
+        self._last_flush = 0.0
+
+    def __call__(self, kind: str, value: Any) -> None:
+        if kind == "segment":
+            self.segments[value.get("idx", len(self.segments))] = value
+        else:
+            self.fields[kind] = value
+        if kind == "summary" or time.monotonic() - self._last_flush >= Config.LLM_PARTIAL_FLUSH_SEC:
+            self.flush()
+
+    def flush(self) -> None:
+        ordered = sorted(self.segments.values(), key=lambda seg: seg.get("start") or 0.0)
+        self.job.partial_result = {**self.fields, "segments": ordered}
+        db.session.commit()
+        self._last_flush = time.monotonic()
+
+
+def _mark_cancelled(job: Job) -> None:
+    # A queue worker that merely lost its lease must not overwrite the new owner's state,
+    # so only inline jobs (no lease) or jobs with a cancel request are marked.
+    # Sadece kirasını kaybeden kuyruk worker'ı yeni sahibin durumunu ezmemeli; bu yüzden
+    # yalnızca inline işler (kirasız) veya iptal istenen işler işaretlenir.
+    db.session.rollback()
+    db.session.execute(
+        update(Job)
+        .where(
+            Job.id == job.id,
+            Job.status.in_(("queued", "processing")),
+            or_(Job.lease_owner.is_(None), Job.cancel_requested.is_(True)),
+        )
+        .values(status="cancelled", error_message="Cancelled by user.")
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _store_profile(job_id: int, path: str) -> None:
+    # The run has already committed (or rolled back) its own state; only the report
+    # path is written here, and the previous report of the job is removed.
+    # Çalıştırma kendi durumunu zaten commit (veya rollback) etti; burada sadece rapor
+    # yolu yazılır ve işin önceki raporu silinir.
+    db.session.rollback()
+    previous = db.session.query(Job.profile_path).filter(Job.id == job_id).scalar()
+    db.session.execute(
+        update(Job).where(Job.id == job_id).values(profile_path=path)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if previous and previous != path and os.path.exists(previous):
+        os.remove(previous)
+
+
+def _profiled(kind: str) -> Callable:
+    """
+    Runs the wrapped execute_* under cProfile when the job asked for it
+    (profile_requested) or PROFILE_SAMPLE_RATE picks it; errors are profiled too.
+
+    Sarılan execute_* fonksiyonunu, iş istediyse (profile_requested) veya
+    PROFILE_SAMPLE_RATE seçtiyse cProfile altında çalıştırır; hatalar da profillenir.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(job_id: int, *args, **kwargs):
+            job = db.session.get(Job, job_id)
+            if job is None or not should_profile(job.profile_requested):
+                return fn(job_id, *args, **kwargs)
+            session = ProfileSession(job_id, kind).start()
+            try:
+                return fn(job_id, *args, **kwargs)
+            finally:
+                _store_profile(job_id, session.stop())
+        return wrapper
+    return decorator
+
+
+@_profiled("run")
+def execute_run(job_id: int, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Runs Whisper + Agent for a job and stores the result. Must run inside an app context.
+    Bir iş için Whisper + Agent çalıştırır ve sonucu kaydeder. App context içinde çalışmalıdır.
+    """
+    job = db.session.get(Job, job_id)
+    try:
+        job.status = "processing"
+        job.error_message = None
+        job.partial_result = None
+        db.session.commit()
+
+        try:
+            ensure_normalized_audio(job)
+            db.session.commit()
+        except Exception as e:
+            print(f"⚠️ AUDIO NORMALIZATION FAILED, decoding directly: {str(e)}")
+
+        out = run_whisper_and_agent(
+            audio_path=job.audio_path,
+            summary_lang=job.summary_lang,
+            transcript_lang=job.transcript_lang,
+            keywords=job.input_keywords,
+            focus_exclusive=job.focus_exclusive,
+            flags=job.flags,
+            pcm_path=job.pcm_path,
+            cancel_event=cancel_event,
+            target_langs=job.target_langs,
+            cached_variants=job.variants,
+            on_partial=_PartialResultWriter(job) if Config.LLM_STREAMING else None,
+            processing_profile=job.processing_profile
+        )
+
+        job.conversation_type = out.get("conversation_type", "unknown")
+        job.summary = out.get("summary", "unknown")
+        job.keypoints_json = json.dumps(out.get("keypoints", []), ensure_ascii=False)
+
+        segments_data = out.get("segments", []) or out.get("transcript_segments", [])
+
+        try:
+            job.segments = segments_data
+        except:
+            pass
+
+        md = out.get("metadata") or {}
+        job.language = md.get("language")
+        job.clean_transcript = md.get("clean_transcript")
+
+        if "variants" in out:
+            job.variants = out["variants"]
+
+        timings = out.get("timings") or {}
+        # ETA statistics are kept per Whisper model, so record the one the profile used.
+        # ETA istatistikleri Whisper modeline göre tutulur; profilin kullandığı kaydedilir.
+        job.whisper_model = get_profile(job.processing_profile)["whisper_model"]
+        job.asr_seconds = timings.get("asr_seconds")
+        job.llm_seconds = timings.get("llm_seconds")
+
+        job.partial_result = None
+        job.status = "done"
+        job.run_count += 1
+        db.session.commit()
+
+        response_payload = job.to_dict()
+        response_payload['segments'] = segments_data
+        return response_payload
+
+    except JobCancelled:
+        print(f"🛑 Job {job_id} cancelled.")
+        _mark_cancelled(job)
+        raise
+    except Exception as e:
+        print(f"❌ ERROR DURING PROCESSING: {str(e)}")
+        db.session.rollback()
+        job.status = "error"
+        job.error_message = str(e)
+        job.run_count += 1
+        db.session.commit()
+        raise
+
+
+@_profiled("reanalyze")
+def execute_reanalysis(
+    job_id: int,
+    updated_segments: List[Dict[str, Any]],
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Runs only the Agent on user-edited segments. Must run inside an app context.
+    Sadece Agent'ı kullanıcının düzenlediği segmentler üzerinde çalıştırır.
+    """
+    job = db.session.get(Job, job_id)
+    try:
+        print(f"♻️ RE-ANALYZING Job {job_id} with {len(updated_segments)} segments...")
+        job.status = "processing"
+        job.partial_result = None
+        db.session.commit()
+
+        out = run_agent_on_text(
+            segments=updated_segments,
+            summary_lang=job.summary_lang,
+            transcript_lang=job.transcript_lang,
+            keywords=job.input_keywords,
+            focus_exclusive=job.focus_exclusive,
+            flags=job.flags,
+            cancel_event=cancel_event,
+            target_langs=job.target_langs,
+            cached_variants=job.variants,
+            on_partial=_PartialResultWriter(job) if Config.LLM_STREAMING else None,
+            processing_profile=job.processing_profile
+        )
+
+        job.summary = out.get("summary", job.summary)
+        if "variants" in out:
+            job.variants = out["variants"]
+        job.keypoints_json = json.dumps(out.get("keypoints", []), ensure_ascii=False)
+
+        gemini_segments = out.get("segments")
+        if gemini_segments and len(gemini_segments) > 0:
+            job.segments = gemini_segments
+        else:
+            job.segments = updated_segments
+
+        job.partial_result = None
+        job.status = "done"
+        db.session.commit()
+
+        response_payload = job.to_dict()
+        response_payload['segments'] = job.segments
+        return response_payload
+
+    except JobCancelled:
+        print(f"🛑 Re-analysis of job {job_id} cancelled.")
+        _mark_cancelled(job)
+        raise
+    except Exception as e:
+        print(f"❌ ERROR DURING RE-ANALYSIS: {str(e)}")
+        db.session.rollback()
+        job.status = "error"
+        job.error_message = str(e)
+        db.session.commit()
+        raise
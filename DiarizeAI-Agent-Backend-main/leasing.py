@@ -0,0 +1,238 @@
+# src/leasing.py
+
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, update
+
+from config import Config
+from models import db, Job, tr_now
+
+# Lease protocol on the jobs table (works on SQLite and any SQL backend):
+#   queued --claim (conditional UPDATE)--> processing + lease_owner/lease_expires_at
+#   the owner heartbeats to extend the lease; an expired lease is requeued.
+# jobs tablosunda kiralama protokolü (SQLite ve her SQL backend'de çalışır):
+#   queued --claim (koşullu UPDATE)--> processing + lease_owner/lease_expires_at
+#   sahibi kirayı uzatmak için heartbeat gönderir; süresi dolan kira yeniden kuyruğa alınır.
+
+
+ACTIVE_STATUSES = ("queued", "processing")
+
+
+def mark_queued_if_idle(job_id: int, stale_after_sec: Optional[float] = None) -> bool:
+    """
+    Compare-and-set idle -> queued in one conditional UPDATE: of concurrent run requests
+    for the same job exactly one gets True. With stale_after_sec, a lease-less row stuck
+    in queued/processing for longer than that is taken over too. The caller commits.
+
+    Tek bir koşullu UPDATE ile boşta -> queued karşılaştır-ve-ata: aynı iş için eşzamanlı
+    çalıştırma isteklerinden tam olarak biri True alır. stale_after_sec verilirse, bundan
+    uzun süre queued/processing'de takılı kalmış kirasız satır da devralınır. Commit çağırana aittir.
+    """
+    idle = Job.status.notin_(ACTIVE_STATUSES)
+    if stale_after_sec:
+        idle = or_(idle, and_(
+            Job.lease_owner.is_(None),
+            Job.updated_at < tr_now() - timedelta(seconds=stale_after_sec),
+        ))
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, idle)
+        .values(status="queued", error_message=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def enqueue_job(job: Job, task: str, payload: Any = None) -> None:
+    """
+    Marks a job as queued for any worker. The caller commits.
+    İşi herhangi bir worker için kuyruğa alınmış olarak işaretler. Commit çağırana aittir.
+    """
+    job.status = "queued"
+    job.task = task
+    job.task_payload = payload
+    job.error_message = None
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.lease_attempts = 0
+    job.cancel_requested = False
+
+
+def claim_next_job(worker_id: str, candidates: int = 20, profiles: Optional[List[str]] = None) -> Optional[Job]:
+    """
+    Atomically claims the best queued job for this worker, or returns None.
+    Users take turns: the one with fewer running jobs first, then the one served least
+    recently; priority only orders jobs within one user's queue. Users already at
+    SCHEDULER_PER_USER_LIMIT running jobs are skipped. Jobs without a user id are each
+    their own queue (at most `candidates` of them are considered, oldest first). With
+    `profiles`, only jobs of those processing profiles are considered (worker --profiles).
+
+    Bu worker için en uygun kuyruktaki işi atomik olarak alır veya None döner.
+    Kullanıcılar sırayla hizmet alır: önce daha az çalışan işi olan, sonra en uzun süredir
+    hizmet almayan; öncelik sadece bir kullanıcının kendi işlerini sıralar.
+    SCHEDULER_PER_USER_LIMIT kadar çalışan işi olan kullanıcılar atlanır. user id'siz her iş
+    kendi kuyruğudur (en eski `candidates` tanesi dikkate alınır). `profiles` verilirse
+    sadece o işleme profillerindeki işler dikkate alınır (worker --profiles).
+    """
+    running = dict(
+        db.session.query(Job.user_id, func.count(Job.id))
+        .filter(Job.status == "processing", Job.user_id.isnot(None))
+        .group_by(Job.user_id)
+        .all()
+    )
+    last_served = dict(
+        db.session.query(Job.user_id, func.max(Job.claimed_at))
+        .filter(Job.user_id.isnot(None), Job.claimed_at.isnot(None))
+        .group_by(Job.user_id)
+        .all()
+    )
+    query = Job.query.filter(Job.status == "queued")
+    if profiles:
+        query = query.filter(func.coalesce(Job.processing_profile, Config.DEFAULT_PROCESSING_PROFILE).in_(profiles))
+
+    def rank(user_id: Optional[int], oldest_id: int) -> Tuple:
+        served = last_served.get(user_id)
+        return (running.get(user_id, 0), served is not None, served or datetime.min, oldest_id)
+
+    # (rank, user_id, job_id): a user's job is looked up only when it is that user's turn.
+    # (sıra, user_id, job_id): bir kullanıcının işi sadece sırası geldiğinde aranır.
+    heads = [
+        (rank(user_id, oldest_id), user_id, None)
+        for user_id, oldest_id in (
+            query.filter(Job.user_id.isnot(None))
+            .with_entities(Job.user_id, func.min(Job.id))
+            .group_by(Job.user_id)
+            .all()
+        )
+        if running.get(user_id, 0) < Config.SCHEDULER_PER_USER_LIMIT
+    ]
+    heads += [
+        (rank(None, job_id), None, job_id)
+        for (job_id,) in (
+            query.filter(Job.user_id.is_(None))
+            .with_entities(Job.id)
+            .order_by(Job.id.asc())
+            .limit(candidates)
+            .all()
+        )
+    ]
+    heads.sort(key=lambda head: head[0])
+
+    for _, user_id, job_id in heads:
+        if job_id is None:
+            job_id = (
+                query.filter(Job.user_id == user_id)
+                .with_entities(Job.id)
+                .order_by(Job.priority.desc(), Job.id.asc())
+                .limit(1)
+                .scalar()
+            )
+            if job_id is None:
+                continue
+        now = tr_now()
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(
+                status="processing",
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=Config.LEASE_SECONDS),
+                heartbeat_at=now,
+                claimed_at=now,
+                lease_attempts=func.coalesce(Job.lease_attempts, 0) + 1,
+            )
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            db.session.expire_all()
+            return db.session.get(Job, job_id)
+    return None
+
+
+def heartbeat(job_id: int, worker_id: str) -> Tuple[bool, bool]:
+    """
+    Extends the lease. Returns (still_owned, cancel_requested).
+    Kirayı uzatır. (hala_sahip, iptal_istendi) döner.
+    """
+    now = tr_now()
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.lease_owner == worker_id, Job.status == "processing")
+        .values(lease_expires_at=now + timedelta(seconds=Config.LEASE_SECONDS), heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return False, False
+    cancel_requested = db.session.query(Job.cancel_requested).filter(Job.id == job_id).scalar()
+    return True, bool(cancel_requested)
+
+
+def release_job(job_id: int, worker_id: str) -> None:
+    db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.lease_owner == worker_id)
+        .values(lease_owner=None, lease_expires_at=None, task_payload=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def requeue_expired_jobs() -> int:
+    """
+    Requeues jobs whose worker stopped heartbeating; gives up after LEASE_MAX_ATTEMPTS.
+    Worker'ı heartbeat göndermeyi bırakan işleri yeniden kuyruğa alır; LEASE_MAX_ATTEMPTS sonra vazgeçer.
+    """
+    now = tr_now()
+    expired = (Job.status == "processing") & (Job.lease_expires_at.isnot(None)) & (Job.lease_expires_at < now)
+
+    failed = db.session.execute(
+        update(Job)
+        .where(expired, Job.lease_attempts >= Config.LEASE_MAX_ATTEMPTS)
+        .values(
+            status="error",
+            error_message="Worker lost the job too many times.",
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    requeued = db.session.execute(
+        update(Job)
+        .where(expired, or_(Job.lease_attempts.is_(None), Job.lease_attempts < Config.LEASE_MAX_ATTEMPTS))
+        .values(status="queued", lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+
+    if requeued or failed:
+        print(f"♻️ Lease expiry: {requeued} job(s) requeued, {failed} job(s) failed.")
+    return requeued
+
+
+def request_cancel(job_id: int) -> Optional[str]:
+    """
+    Cancels a queued job directly, or flags a leased job so its worker stops.
+    Returns "queued", "running" or None if the job is in neither state.
+
+    Kuyruktaki işi doğrudan iptal eder veya kiralanmış işi worker'ı dursun diye işaretler.
+    """
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="cancelled", error_message="Cancelled by user.")
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        db.session.commit()
+        return "queued"
+
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "processing", Job.lease_owner.isnot(None))
+        .values(cancel_requested=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return "running" if result.rowcount == 1 else None
@@ -2,10 +2,12 @@
 
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 import json
 # Import security functions for password hashing
 # Şifre hashleme için güvenlik fonksiyonlarını içe aktar
 from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
@@ -16,6 +18,14 @@ except ImportError:
 db = SQLAlchemy()
 TR_TZ = ZoneInfo("Europe/Istanbul")
 
+
+def tr_now():
+    """
+    Naive Istanbul time, the convention used by every timestamp column.
+    Naive İstanbul saati; tüm zaman damgası sütunlarında kullanılan kural.
+    """
+    return datetime.now(TR_TZ).replace(tzinfo=None)
+
 class User(db.Model):
     """
     User table: Stores user credentials securely.
@@ -33,7 +43,9 @@ class User(db.Model):
     jobs = db.relationship('Job', backref='owner', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Cost is configurable (PASSWORD_HASH_METHOD); existing hashes keep verifying.
+        # Maliyet ayarlanabilir (PASSWORD_HASH_METHOD); mevcut hash'ler doğrulanmaya devam eder.
+        self.password_hash = generate_password_hash(password, method=Config.PASSWORD_HASH_METHOD)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -68,6 +80,23 @@ class Job(db.Model):
     error_message = db.Column(db.Text, nullable=True)
     run_count = db.Column(db.Integer, nullable=False, default=0) 
 
+    # Scheduling priority (higher runs first) / Zamanlama önceliği (yüksek olan önce çalışır)
+    priority = db.Column(db.Integer, nullable=True, default=0)
+
+    # --- Queue lease (JOB_EXECUTION=queue) / Kuyruk kirası ---
+    # task: "run" | "reanalyze"; task_payload holds reanalysis segments until claimed.
+    # task: "run" | "reanalyze"; task_payload yeniden analiz segmentlerini tutar.
+    task = db.Column(db.String(20), nullable=True)
+    task_payload = db.Column(db.JSON, nullable=True)
+    lease_owner = db.Column(db.String(120), nullable=True, index=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    # When a worker last claimed the job; claim_next_job serves the user who waited longest.
+    # Bir worker'ın işi en son aldığı an; claim_next_job en uzun bekleyen kullanıcıya hizmet eder.
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    lease_attempts = db.Column(db.Integer, nullable=True, default=0)
+    cancel_requested = db.Column(db.Boolean, nullable=True, default=False)
+
     # --- NEW FIELDS FOR PROMPT ENGINEERING ---
     # --- PROMPT MÜHENDİSLİĞİ İÇİN YENİ ALANLAR ---
     summary_lang = db.Column(db.String(10), default="original") 
@@ -75,6 +104,46 @@ class Job(db.Model):
     input_keywords = db.Column(db.Text, nullable=True) 
     focus_exclusive = db.Column(db.Boolean, default=False) 
 
+    # Extra output languages produced from the same transcription, and their results:
+    # {lang: {summary, keypoints, segments, clean_transcript, ..., fingerprint}}
+    # Aynı transkripsiyondan üretilen ek çıktı dilleri ve sonuçları.
+    target_langs = db.Column(db.JSON, nullable=True)
+    variants = db.Column(db.JSON, nullable=True)
+
+    # --- Normalized audio cache (16 kHz mono int16 PCM next to the upload) ---
+    # --- Normalize ses önbelleği (yüklenen dosyanın yanında 16 kHz mono int16 PCM) ---
+    pcm_path = db.Column(db.Text, nullable=True)
+    audio_duration = db.Column(db.Float, nullable=True)
+    audio_samples = db.Column(db.Integer, nullable=True)
+
+    # Header probe at upload / Yüklemede başlık taraması
+    audio_codec = db.Column(db.String(40), nullable=True)
+    audio_channels = db.Column(db.Integer, nullable=True)
+    audio_sample_rate = db.Column(db.Integer, nullable=True)
+
+    # Processing profile (fast | balanced | accurate, see diarize_agent/profiles.py)
+    # İşleme profili (fast | balanced | accurate, bkz. diarize_agent/profiles.py)
+    processing_profile = db.Column(db.String(20), nullable=True)
+
+    # Measured processing cost of the last run (feeds ETA estimates)
+    # Son çalıştırmanın ölçülen işlem maliyeti (ETA tahminlerini besler)
+    whisper_model = db.Column(db.String(40), nullable=True)
+    asr_seconds = db.Column(db.Float, nullable=True)
+    llm_seconds = db.Column(db.Float, nullable=True)
+
+    # Streamed LLM output of the current run (summary, segments...) until it finishes.
+    # Mevcut çalıştırmanın akıtılan LLM çıktısı (özet, segmentler...) bitene kadar.
+    partial_result = db.Column(db.JSON, nullable=True)
+
+    # On-demand profiling: requested for the next run / .prof file of the last profiled run
+    # İsteğe bağlı profilleme: sonraki çalıştırma için istendi mi / son profillenen çalıştırmanın .prof dosyası
+    profile_requested = db.Column(db.Boolean, nullable=True)
+    profile_path = db.Column(db.Text, nullable=True)
+
+    # Retention tier: original | opus | dropped (None means original)
+    # Saklama kademesi: original | opus | dropped (None orijinal demektir)
+    audio_tier = db.Column(db.String(20), nullable=True, default="original")
+
     # --- NEW: User Flags (Timestamps) ---
     # --- YENİ: Kullanıcı Bayrakları (Zaman Damgaları) ---
     flags = db.Column(db.JSON, default=[])
@@ -103,12 +172,72 @@ class Job(db.Model):
                 "segments": self.segments,
                 "flags": self.flags or [],
                 "status": self.status,
+                "partial_result": self.partial_result,
                 "error_message": self.error_message,
                 "run_count": self.run_count,
+                "priority": self.priority,
                 "summary_lang": self.summary_lang,
                 "transcript_lang": self.transcript_lang,
                 "input_keywords": self.input_keywords,
                 "focus_exclusive": self.focus_exclusive,
+                "processing_profile": self.processing_profile or Config.DEFAULT_PROCESSING_PROFILE,
+                "target_langs": self.target_langs or [],
+                "available_langs": self.available_langs(),
+                "audio_duration": self.audio_duration,
+                "audio_samples": self.audio_samples,
+                "audio_tier": self.audio_tier or "original",
+                "audio_codec": self.audio_codec,
+                "audio_channels": self.audio_channels,
+                "audio_sample_rate": self.audio_sample_rate,
+                "asr_seconds": self.asr_seconds,
+                "llm_seconds": self.llm_seconds,
                 "created_at": self.created_at.isoformat() if self.created_at else None,
                 "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            }
\ No newline at end of file
+            }
+
+    def available_langs(self):
+        langs = [self.summary_lang or "original"]
+        for lang, variant in (self.variants or {}).items():
+            if not variant.get("error") and lang not in langs:
+                langs.append(lang)
+        return langs
+
+    def variant_dict(self, lang):
+        """
+        to_dict() with the output fields of one language variant, or None if it is missing.
+        Bir dil varyantının çıktı alanlarıyla to_dict(); varyant yoksa None.
+        """
+        data = self.to_dict()
+        if not lang or lang.lower() in ("original", (self.summary_lang or "original").lower()):
+            data["selected_lang"] = self.summary_lang or "original"
+            return data
+        variant = (self.variants or {}).get(lang.lower())
+        if not variant or variant.get("error"):
+            return None
+        for key in ("conversation_type", "summary", "keypoints", "segments", "clean_transcript",
+                    "summary_lang", "transcript_lang"):
+            data[key] = variant.get(key)
+        data["selected_lang"] = lang.lower()
+        return data
+
+
+def upgrade_schema():
+    """
+    Adds columns that exist on the models but not yet in the database.
+    create_all() never alters existing tables, so older DB files need this.
+
+    Modellerde olup veritabanında henüz olmayan sütunları ekler.
+    create_all() mevcut tabloları değiştirmez, eski DB dosyaları buna ihtiyaç duyar.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            print(f"🛠 Added column {table.name}.{column.name}")
+    db.session.commit()
\ No newline at end of file
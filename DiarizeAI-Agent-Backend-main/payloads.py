@@ -0,0 +1,209 @@
+# src/payloads.py
+"""
+Pre-serialized job payloads for the hot read paths (GET /api/jobs/<id>, GET /api/jobs).
+
+A job's JSON is rendered once per version and kept as bytes in an in-process LRU,
+so repeated reads skip to_dict() and re-encoding of the segments. The key includes
+updated_at (bumped by every ORM/Core write) plus the audio fields retention changes
+without touching updated_at. orjson is used when installed.
+
+Sık okunan yollar için önceden serileştirilmiş iş içerikleri (GET /api/jobs/<id>, GET /api/jobs).
+
+Bir işin JSON'u her sürüm için bir kez üretilir ve süreç içi LRU'da byte olarak tutulur;
+tekrarlanan okumalar to_dict() ve segmentlerin yeniden kodlanmasını atlar. Anahtar,
+updated_at'i (her ORM/Core yazımında artar) ve saklamanın updated_at'e dokunmadan
+değiştirdiği ses alanlarını içerir. Kuruluysa orjson kullanılır.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Response, abort
+
+from config import Config
+from models import db, Job
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """
+    JSON bytes (UTF-8): orjson if available, otherwise a compact json.dumps.
+    JSON byte'ları (UTF-8): varsa orjson, yoksa kompakt json.dumps.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_bytes_response(body: bytes, status: int = 200) -> Response:
+    return Response(body, status=status, mimetype="application/json")
+
+
+class PayloadCache:
+    """
+    Thread-safe LRU of encoded payloads, bounded by total bytes.
+    Toplam byte ile sınırlı, thread-safe kodlanmış içerik LRU'su.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Tuple, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            # Older versions of the same job are dead weight once a newer one is stored.
+            # Aynı işin yenisi kaydedilince eski sürümleri gereksiz yüktür.
+            for stale in [k for k in self._items if k[0] == key[0] and k[1:4] != key[1:4]]:
+                self._size -= len(self._items.pop(stale))
+            self._items[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def discard(self, job_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._items if k[0] == job_id]:
+                self._size -= len(self._items.pop(key))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "encoder": "orjson" if orjson is not None else "json",
+            }
+
+
+_CACHE = PayloadCache(int(Config.JOB_PAYLOAD_CACHE_MB * 1024 * 1024))
+
+# Only these columns are read on a cache hit: loading the row itself would decode
+# the segments JSON, which is the cost being avoided.
+# Önbellek isabetinde sadece bu sütunlar okunur: satırın kendisini yüklemek segments
+# JSON'unu çözerdi; kaçınılan maliyet de budur.
+_VERSION_COLUMNS = (Job.id, Job.updated_at, Job.audio_path, Job.audio_tier, Job.user_id)
+
+
+def _key(row, lang: Optional[str]) -> Tuple:
+    return (
+        row.id,
+        row.updated_at.isoformat() if row.updated_at else None,
+        row.audio_path,
+        row.audio_tier,
+        (lang or "").lower(),
+    )
+
+
+def _encode(job, lang: Optional[str]) -> Optional[bytes]:
+    data = job.variant_dict(lang) if lang else job.to_dict()
+    return None if data is None else dumps(data)
+
+
+# Owner filter default: every job. user_id=None means jobs without an owner.
+# Sahip filtresi varsayılanı: tüm işler. user_id=None sahibi olmayan işler demektir.
+ANY_USER: Any = object()
+
+
+def _owned_by(row, user_id) -> bool:
+    return user_id is ANY_USER or row.user_id == user_id
+
+
+def _filter_owner(query, user_id):
+    if user_id is ANY_USER:
+        return query
+    return query.filter(Job.user_id.is_(None) if user_id is None else Job.user_id == user_id)
+
+
+def job_payload(job_id: int, lang: Optional[str] = None, user_id: Any = ANY_USER) -> Optional[bytes]:
+    """
+    Encoded to_dict() (or variant_dict(lang)) of a job, from cache when unchanged.
+    Aborts with 404 if the job does not exist or is not owned by user_id (None: no
+    owner); None if the language variant is missing.
+
+    Bir işin kodlanmış to_dict()'i (veya variant_dict(lang)), değişmediyse önbellekten.
+    İş yoksa veya user_id'ye (None: sahipsiz) ait değilse 404 ile durur; dil varyantı yoksa None.
+    """
+    if Config.JOB_PAYLOAD_CACHE_MB <= 0:
+        job = Job.query.get_or_404(job_id)
+        if not _owned_by(job, user_id):
+            abort(404)
+        return _encode(job, lang)
+
+    row = db.session.query(*_VERSION_COLUMNS).filter(Job.id == job_id).first()
+    if row is None or not _owned_by(row, user_id):
+        abort(404)
+    key = _key(row, lang)
+    body = _CACHE.get(key)
+    if body is None:
+        body = _encode(Job.query.get_or_404(job_id), lang)
+        if body is not None:
+            _CACHE.put(key, body)
+    return body
+
+
+def jobs_list_payload(user_id: Any = ANY_USER) -> bytes:
+    """
+    JSON array of all jobs (newest first), or only user_id's jobs (None: jobs without
+    an owner), joined from the cached per-job bytes; only changed jobs are loaded and encoded.
+
+    Tüm işlerin (veya sadece user_id'nin işlerinin; None: sahipsiz işler) JSON dizisi (en
+    yeni önce), önbellekteki byte'lardan birleştirilir; sadece değişen işler yüklenir ve kodlanır.
+    """
+    if Config.JOB_PAYLOAD_CACHE_MB <= 0:
+        query = _filter_owner(Job.query, user_id)
+        return b"[" + b",".join(dumps(job.to_dict()) for job in query.order_by(Job.id.desc()).all()) + b"]"
+
+    query = _filter_owner(db.session.query(*_VERSION_COLUMNS), user_id)
+    rows = query.order_by(Job.id.desc()).all()
+    bodies: Dict[int, bytes] = {}
+    missing: Dict[int, Tuple] = {}
+    for row in rows:
+        key = _key(row, None)
+        body = _CACHE.get(key)
+        if body is None:
+            missing[row.id] = key
+        else:
+            bodies[row.id] = body
+    if missing:
+        for job in Job.query.filter(Job.id.in_(list(missing))).all():
+            body = dumps(job.to_dict())
+            # The row may have changed since the version query; store it under its own version.
+            # Satır sürüm sorgusundan beri değişmiş olabilir; kendi sürümüyle saklanır.
+            _CACHE.put(_key(job, None), body)
+            bodies[job.id] = body
+    return b"[" + b",".join(bodies[row.id] for row in rows if row.id in bodies) + b"]"
+
+
+def forget_job(job_id: int) -> None:
+    _CACHE.discard(job_id)
+
+
+def payload_cache_stats() -> Dict[str, Any]:
+    return _CACHE.stats()
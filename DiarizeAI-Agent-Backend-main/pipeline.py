@@ -1,25 +1,472 @@
 # src/pipeline.py
 
-from typing import Dict, Any, List
-from diarize_agent.agent import analyze_audio_segments_with_gemini
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from config import Config
+from diarize_agent.agent import analyze_audio_segments_with_gemini, reduce_partial_analyses_with_gemini
+from diarize_agent.cancellation import JobCancelled
+from diarize_agent.profiles import get_profile
+from diarize_agent.tools.diarization import Diarizer
 from diarize_agent.tools.tools import transcribe_audio_with_whisper
 
+_GENERIC_SPEAKER = re.compile(r"^(SPK|SPEAKER_)\d+$")
+
+
+def variant_fingerprint(segments: List[Dict[str, Any]], **settings: Any) -> str:
+    """
+    Identifies one LLM input: the transcript plus the language/focus settings.
+    Tek bir LLM girdisini tanımlar: transkript ve dil/odak ayarları.
+    """
+    rows = [[seg.get("start"), seg.get("end"), seg.get("speaker"), seg.get("text")] for seg in segments or []]
+    blob = json.dumps({"segments": rows, **settings}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _VariantFanOut:
+    """
+    Extra output languages from one transcript: one concurrent LLM call per language.
+    A cached variant with the same fingerprint is reused without calling the LLM;
+    a failed language is stored with its error instead of failing the whole job.
+
+    Tek transkriptten ek çıktı dilleri: dil başına eşzamanlı bir LLM çağrısı.
+    Aynı parmak izine sahip önbellekteki varyant LLM çağrılmadan yeniden kullanılır;
+    başarısız olan dil tüm işi düşürmek yerine hatasıyla saklanır.
+    """
+
+    def __init__(
+        self,
+        target_langs: List[str],
+        cached: Optional[Dict[str, Any]],
+        transcript_lang: str,
+        keywords: Optional[str],
+        focus_exclusive: bool,
+        cancel_event: Optional[threading.Event],
+        llm_model: Optional[str] = None,
+    ):
+        self.target_langs = target_langs
+        self.cached = cached or {}
+        self.translate_transcript = bool(transcript_lang and transcript_lang.lower() != "original")
+        self.keywords = keywords
+        self.focus_exclusive = focus_exclusive
+        self.cancel_event = cancel_event
+        self.llm_model = llm_model
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[str, Tuple[str, Future]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._segments: List[Dict[str, Any]] = []
+
+    def _settings(self, lang: str) -> Dict[str, Any]:
+        return {
+            "summary_lang": lang,
+            # The transcript is translated only if the primary output translates it too.
+            # Transkript sadece birincil çıktı da çeviriyorsa çevrilir.
+            "transcript_lang": lang if self.translate_transcript else "original",
+            "keywords": self.keywords,
+            "focus_exclusive": self.focus_exclusive,
+        }
+
+    def start(self, segments: List[Dict[str, Any]]) -> None:
+        self._segments = segments
+        missing = []
+        for lang in self.target_langs:
+            settings = self._settings(lang)
+            fingerprint = variant_fingerprint(segments, **settings)
+            hit = self.cached.get(lang)
+            if hit and hit.get("fingerprint") == fingerprint and not hit.get("error"):
+                print(f"♻️ Language variant '{lang}' reused from cache.")
+                self._results[lang] = hit
+            else:
+                missing.append((lang, settings, fingerprint))
+        if not missing:
+            return
+
+        print(f"🌐 Language variants running: {', '.join(lang for lang, _, _ in missing)}")
+        self._executor = ThreadPoolExecutor(max_workers=len(missing), thread_name_prefix="llm-variant")
+        for lang, settings, fingerprint in missing:
+            future = self._executor.submit(
+                analyze_audio_segments_with_gemini,
+                segments=segments,
+                cancel_event=self.cancel_event,
+                model_name=self.llm_model,
+                **settings,
+            )
+            self._futures[lang] = (fingerprint, future)
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        for lang, (fingerprint, future) in self._futures.items():
+            settings = self._settings(lang)
+            try:
+                result = future.result()
+            except JobCancelled:
+                raise
+            except Exception as e:
+                print(f"⚠️ Language variant '{lang}' failed: {str(e)}")
+                self._results[lang] = {**settings, "fingerprint": fingerprint, "error": str(e)}
+                continue
+            md = result.get("metadata") or {}
+            self._results[lang] = {
+                **settings,
+                "fingerprint": fingerprint,
+                "conversation_type": result.get("conversation_type"),
+                "summary": result.get("summary"),
+                "keypoints": result.get("keypoints") or [],
+                "segments": result.get("segments") or self._segments,
+                "language": md.get("language"),
+                "clean_transcript": md.get("clean_transcript"),
+            }
+        return {lang: self._results[lang] for lang in self.target_langs if lang in self._results}
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _start_diarizer(cancel_event: Optional[threading.Event]) -> Optional[Diarizer]:
+    # Fed by the ASR loop (on_audio), so it works on the audio Whisper already decoded.
+    # ASR döngüsü tarafından beslenir (on_audio); Whisper'ın zaten çözdüğü ses üzerinde çalışır.
+    return Diarizer(cancel_event).start() if Config.DIARIZATION_ENABLED else None
+
+
+def _label_speakers(diarizer: Diarizer, segments: List[Dict[str, Any]]) -> None:
+    # Final clustering over the whole recording; labels given to earlier windows are replaced.
+    # Tüm kayıt üzerinde son kümeleme; önceki pencerelere verilen etiketler yenilenir.
+    diarizer.finish()
+    speakers = diarizer.label(segments, relabel=True)
+    if diarizer.error:
+        print(f"⚠️ Diarization failed, speakers are left to the LLM: {diarizer.error}")
+    else:
+        print(f"🗣 Diarization: {speakers} speaker(s), {diarizer.compute_seconds:.1f}s CPU next to Whisper")
+
+
+def _remap_window_labels(
+    sent: List[Dict[str, Any]], source: List[Dict[str, Any]], partial: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Rewrites the SPEAKER_XX labels a window's LLM answer kept, from the labels that window
+    was sent with to the final ones on the same rows, so the reduce step sees one labeling.
+    Real names are left alone.
+
+    Bir pencerenin LLM cevabında kalan SPEAKER_XX etiketlerini, pencerenin gönderildiği
+    etiketlerden aynı satırların son etiketlerine çevirir; böylece birleştirme tek bir
+    etiketleme görür. Gerçek isimlere dokunulmaz.
+    """
+    votes: Dict[str, Dict[str, float]] = {}
+    for old_seg, new_seg in zip(sent, source):
+        old, new = old_seg.get("speaker"), new_seg.get("speaker")
+        if old and new:
+            duration = max(float(new_seg.get("end") or 0) - float(new_seg.get("start") or 0), 0.01)
+            votes.setdefault(old, {})
+            votes[old][new] = votes[old].get(new, 0.0) + duration
+    mapping = {old: max(counts, key=counts.get) for old, counts in votes.items()}
+    mapping = {old: new for old, new in mapping.items() if old != new}
+    output = partial.get("segments") or []
+    row_aligned = len(output) == len(sent)
+    if not mapping and not row_aligned:
+        return partial
+
+    segments = []
+    for n, seg in enumerate(output):
+        speaker = seg.get("speaker") or ""
+        if _GENERIC_SPEAKER.match(speaker):
+            if row_aligned and speaker == sent[n].get("speaker") and source[n].get("speaker"):
+                # One row out per row in: take that row's final label.
+                # Girdi satırı başına bir çıktı satırı: o satırın son etiketi alınır.
+                speaker = source[n]["speaker"]
+            else:
+                speaker = mapping.get(speaker, speaker)
+        segments.append({**seg, "speaker": speaker} if speaker != seg.get("speaker") else seg)
+
+    remapped = {**partial, "segments": segments}
+    metadata = partial.get("metadata") or {}
+    clean = metadata.get("clean_transcript")
+    if mapping and isinstance(clean, str):
+        pattern = re.compile(r"\b(" + "|".join(re.escape(old) for old in mapping) + r")\b")
+        remapped["metadata"] = {**metadata, "clean_transcript": pattern.sub(lambda m: mapping[m.group(1)], clean)}
+    return remapped
+
+
+def _variant_langs(target_langs: Optional[List[str]], summary_lang: str) -> List[str]:
+    primary = (summary_lang or "original").lower()
+    return [lang for lang in (target_langs or []) if lang and lang.lower() != primary]
+
+
+def _run_overlapped(
+    audio_path: str,
+    pcm_path: Optional[str],
+    cancel_event: Optional[threading.Event],
+    summary_lang: str,
+    transcript_lang: str,
+    keywords: Optional[str],
+    focus_exclusive: bool,
+    after_asr: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    profile: Optional[Dict[str, Any]] = None,
+    on_partial: Optional[Callable[[str, Any], None]] = None,
+) -> Tuple[Any, Dict[str, Any], float, float, int]:
+    """
+    Pipelined mode: every PIPELINE_LLM_WINDOW_MINUTES of transcript is analyzed by
+    the LLM while Whisper keeps transcribing; a reduce call merges the windows at the end.
+    Short recordings that never fill a window fall back to a single LLM call.
+    on_partial receives the windows' rows as they stream, numbered against the whole
+    transcript, always on the calling thread (it may own the DB session).
+
+    Ardışık mod: her PIPELINE_LLM_WINDOW_MINUTES'lık transkript Whisper transkribe etmeye
+    devam ederken LLM ile analiz edilir; sonda bir birleştirme çağrısı pencereleri birleştirir.
+    Hiç pencere dolduramayan kısa kayıtlar tek LLM çağrısına döner.
+    on_partial pencerelerin satırlarını aktıkça, tüm transkripte göre numaralanmış olarak
+    alır; her zaman çağıran thread'de (DB oturumunun sahibi olabilir).
+
+    Returns: transcription, analysis_result, asr_seconds, llm_seconds (after ASR), llm_windows
+    """
+    window_sec = Config.PIPELINE_LLM_WINDOW_MINUTES * 60
+    executor = ThreadPoolExecutor(max_workers=max(1, Config.PIPELINE_LLM_WORKERS), thread_name_prefix="llm-window")
+    futures: List[Future] = []
+    # Per window: the transcript rows themselves (relabeled as clustering improves) and
+    # the copies the LLM was sent (labels as of that moment).
+    # Pencere başına: transkript satırlarının kendisi (kümeleme iyileştikçe yeniden
+    # etiketlenir) ve LLM'e gönderilen kopyalar (o anki etiketler).
+    sources: List[List[Dict[str, Any]]] = []
+    batches: List[List[Dict[str, Any]]] = []
+    pending: List[Dict[str, Any]] = []
+    # Streamed rows of the window calls, handed from the LLM threads to this thread.
+    # Pencere çağrılarının akan satırları; LLM thread'lerinden bu thread'e verilir.
+    partial_rows: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+    profile = profile or get_profile()
+    lang_kwargs = {
+        "summary_lang": summary_lang,
+        "transcript_lang": transcript_lang,
+        "keywords": keywords,
+        "focus_exclusive": focus_exclusive,
+        "model_name": profile["llm_model"],
+    }
+
+    def known_speakers() -> Tuple[List[str], Dict[str, str]]:
+        names = set()
+        votes: Dict[str, Dict[str, int]] = {}
+        for source, f in zip(sources, futures):
+            if f.done() and not f.cancelled() and f.exception() is None:
+                output = f.result().get("segments") or []
+                names.update(
+                    seg["speaker"] for seg in output
+                    if seg.get("speaker") and not _GENERIC_SPEAKER.match(seg["speaker"])
+                )
+                # One row out per row in: the current diarization label of a row -> the
+                # name it got, so the hint matches the labels of the next window. Rows
+                # left unnamed vote too, so a few relabeled boundary rows cannot alias.
+                # Girdi satırı başına bir çıktı satırı: bir satırın güncel ayrım etiketi ->
+                # aldığı isim; böylece ipucu sonraki pencerenin etiketleriyle örtüşür.
+                # İsimsiz kalan satırlar da oy verir; yeniden etiketlenen birkaç sınır
+                # satırı takma ad oluşturamaz.
+                if len(output) == len(source):
+                    for row, seg in zip(source, output):
+                        label, name = row.get("speaker"), seg.get("speaker") or ""
+                        if label and _GENERIC_SPEAKER.match(label):
+                            name = "" if _GENERIC_SPEAKER.match(name) else name
+                            votes.setdefault(label, {})
+                            votes[label][name] = votes[label].get(name, 0) + 1
+        aliases = {label: max(counts, key=counts.get) for label, counts in votes.items()}
+        return sorted(names), {label: name for label, name in aliases.items() if name}
+
+    def drain_partials() -> None:
+        while True:
+            try:
+                row = partial_rows.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                on_partial("segment", row)
+            except Exception as e:
+                print(f"⚠️ Partial result handler failed: {str(e)}")
+
+    def submit_pending() -> None:
+        source = list(pending)
+        pending.clear()
+        forward = None
+        if on_partial is not None:
+            # Only rows are forwarded early; a window's summary is not the recording's.
+            # Erken sadece satırlar iletilir; bir pencerenin özeti kaydın özeti değildir.
+            def forward(kind: str, value: Any, base: int = sum(len(rows) for rows in sources)) -> None:
+                if kind == "segment" and isinstance(value.get("idx"), int):
+                    partial_rows.put({**value, "idx": value["idx"] + base})
+        if diarizer is not None:
+            # Earlier windows are relabeled too, so every row carries today's clustering.
+            # Önceki pencereler de yeniden etiketlenir; her satır güncel kümelemeyi taşır.
+            diarizer.label([row for rows in sources for row in rows] + source, relabel=True)
+        batch = [dict(seg) for seg in source]
+        context = (
+            f"This is part {len(futures) + 1} of a longer recording, starting at "
+            f"{float(batch[0].get('start') or 0):.0f}s. Summarize only this part."
+        )
+        speakers, aliases = known_speakers()
+        if speakers:
+            context += f" Speakers named in earlier parts: {', '.join(speakers)}. Reuse these names for the same people."
+        if aliases:
+            context += f" Speaker labels named in earlier parts: {', '.join(f'{k}={v}' for k, v in sorted(aliases.items()))}."
+        sources.append(source)
+        batches.append(batch)
+        futures.append(executor.submit(
+            analyze_audio_segments_with_gemini,
+            segments=batch,
+            cancel_event=cancel_event,
+            context=context,
+            on_partial=forward,
+            **lang_kwargs,
+        ))
+
+    def on_window(window_segments: List[Dict[str, Any]]) -> None:
+        drain_partials()
+        pending.extend(window_segments)
+        if pending[-1]["end"] - pending[0]["start"] >= window_sec:
+            submit_pending()
+
+    diarizer = _start_diarizer(cancel_event)
+    try:
+        asr_started = time.perf_counter()
+        transcription = transcribe_audio_with_whisper(
+            audio_path, pcm_path=pcm_path, cancel_event=cancel_event, on_window=on_window, options=profile,
+            on_audio=diarizer.feed if diarizer else None,
+        )
+        asr_seconds = time.perf_counter() - asr_started
+        print(f"🎤 Whisper finished in {asr_seconds:.1f}s, {len(futures)} LLM windows already started.")
+        if diarizer is not None:
+            _label_speakers(diarizer, transcription.get("segments", []))
+        if after_asr is not None:
+            after_asr(transcription.get("segments", []))
+
+        # Only the LLM time left after ASR adds to latency, so that is what gets recorded.
+        # Gecikmeye sadece ASR'den sonra kalan LLM süresi eklenir; kaydedilen de odur.
+        llm_started = time.perf_counter()
+        if not futures:
+            analysis_result = analyze_audio_segments_with_gemini(
+                segments=transcription.get("segments", []),
+                cancel_event=cancel_event,
+                on_partial=on_partial,
+                **lang_kwargs,
+            )
+        else:
+            if pending:
+                submit_pending()
+            waiting = set(futures)
+            while waiting:
+                _, waiting = wait(waiting, timeout=0.5, return_when=FIRST_COMPLETED)
+                if on_partial is not None:
+                    drain_partials()
+            partials = [f.result() for f in futures]
+            if diarizer is not None:
+                partials = [
+                    _remap_window_labels(batch, source, partial)
+                    for batch, source, partial in zip(batches, sources, partials)
+                ]
+            print(f"🧩 {len(partials)} LLM windows done, reducing...")
+            analysis_result = reduce_partial_analyses_with_gemini(
+                partials,
+                summary_lang=summary_lang,
+                keywords=keywords,
+                focus_exclusive=focus_exclusive,
+                model_name=profile["llm_model"],
+                cancel_event=cancel_event,
+            )
+        llm_seconds = time.perf_counter() - llm_started
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if diarizer is not None:
+            diarizer.finish()
+
+    return transcription, analysis_result, asr_seconds, llm_seconds, len(futures)
+
+
 def run_whisper_and_agent(
     audio_path: str,
     summary_lang: str = "original",
     transcript_lang: str = "original",
     keywords: str = None,
     focus_exclusive: bool = False,
-    flags: List[float] = None
+    flags: List[float] = None,
+    pcm_path: str = None,
+    cancel_event: Optional[threading.Event] = None,
+    target_langs: Optional[List[str]] = None,
+    cached_variants: Optional[Dict[str, Any]] = None,
+    on_partial: Optional[Callable[[str, Any], None]] = None,
+    processing_profile: Optional[str] = None
 ) -> Dict[str, Any]:
     
     print(f"\n--- 🔍 DEBUG STARTED: {audio_path} ---")
     if flags:
         print(f"🚩 Input Flags Received: {flags}")
 
-    # 1. Transcribe the audio file
+    profile = get_profile(processing_profile)
+    print(f"🎚 Profile '{profile['name']}': Whisper {profile['whisper_model']}, "
+          f"LLM {profile['llm_model'] or ' -> '.join(Config.LLM_MODEL_CHAIN)}")
+
+    # Extra languages reuse this one transcription (no second Whisper run).
+    # Ek diller bu tek transkripsiyonu kullanır (ikinci Whisper çalıştırması yok).
+    fan_out = None
+    extra_langs = _variant_langs(target_langs, summary_lang)
+    if extra_langs:
+        fan_out = _VariantFanOut(
+            extra_langs, cached_variants, transcript_lang, keywords, focus_exclusive, cancel_event,
+            llm_model=profile["llm_model"],
+        )
+
+    try:
+        if Config.PIPELINE_LLM_WINDOW_MINUTES > 0:
+            print(f"🔀 Pipelined mode: LLM windows of {Config.PIPELINE_LLM_WINDOW_MINUTES:g} min overlap Whisper")
+            transcription, analysis_result, asr_seconds, llm_seconds, llm_windows = _run_overlapped(
+                audio_path, pcm_path, cancel_event,
+                summary_lang, transcript_lang, keywords, focus_exclusive,
+                after_asr=fan_out.start if fan_out else None,
+                profile=profile,
+                on_partial=on_partial,
+            )
+            segments_to_process = transcription.get("segments", []) if isinstance(transcription, dict) else []
+            variants = fan_out.collect() if fan_out else None
+            return _merge_analysis(
+                analysis_result, segments_to_process, flags, asr_seconds, llm_seconds, llm_windows, variants
+            )
+
+        return _run_sequential(
+            audio_path, summary_lang, transcript_lang, keywords, focus_exclusive,
+            flags, pcm_path, cancel_event, fan_out, on_partial, profile,
+        )
+    finally:
+        if fan_out:
+            fan_out.close()
+
+
+def _run_sequential(
+    audio_path: str,
+    summary_lang: str,
+    transcript_lang: str,
+    keywords: Optional[str],
+    focus_exclusive: bool,
+    flags: Optional[List[float]],
+    pcm_path: Optional[str],
+    cancel_event: Optional[threading.Event],
+    fan_out: Optional[_VariantFanOut],
+    on_partial: Optional[Callable[[str, Any], None]] = None,
+    profile: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    profile = profile or get_profile()
+
+    # 1. Transcribe the audio file (speakers are diarized meanwhile)
+    # 1. Ses dosyasını transkribe et (bu sırada konuşmacılar ayrılır)
     print("🎤 Whisper running...")
-    transcription = transcribe_audio_with_whisper(audio_path)
+    diarizer = _start_diarizer(cancel_event)
+    asr_started = time.perf_counter()
+    try:
+        transcription = transcribe_audio_with_whisper(
+            audio_path, pcm_path=pcm_path, cancel_event=cancel_event, options=profile,
+            on_audio=diarizer.feed if diarizer else None,
+        )
+    finally:
+        if diarizer is not None:
+            diarizer.finish()
+    asr_seconds = time.perf_counter() - asr_started
     
     print(f"🎤 Whisper Result Type: {type(transcription)}")
 
@@ -39,19 +486,51 @@ def run_whisper_and_agent(
     count = len(segments_to_process) if segments_to_process else 0
     print(f"📊 Segment Count to Process: {count}")
 
+    if diarizer is not None:
+        _label_speakers(diarizer, segments_to_process)
+
+    if fan_out:
+        fan_out.start(segments_to_process)
+
     # 3. Analyze with Gemini
     print(f"🤖 Gemini Agent Running -> Lang: {summary_lang}, Transcript: {transcript_lang}")
     
+    llm_started = time.perf_counter()
     analysis_result = analyze_audio_segments_with_gemini(
         segments=segments_to_process, 
         summary_lang=summary_lang,
         transcript_lang=transcript_lang,
         keywords=keywords,
-        focus_exclusive=focus_exclusive
+        focus_exclusive=focus_exclusive,
+        model_name=profile["llm_model"],
+        cancel_event=cancel_event,
+        on_partial=on_partial
     )
     
+    llm_seconds = time.perf_counter() - llm_started
+    variants = fan_out.collect() if fan_out else None
+    return _merge_analysis(analysis_result, segments_to_process, flags, asr_seconds, llm_seconds, 1, variants)
+
+
+def _merge_analysis(
+    analysis_result: Dict[str, Any],
+    segments_to_process: List[Dict[str, Any]],
+    flags: Optional[List[float]],
+    asr_seconds: float,
+    llm_seconds: float,
+    llm_windows: int = 1,
+    variants: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     # --- SMART MERGE LOGIC ---
     if isinstance(analysis_result, dict):
+        # Stage timings feed the real-time-factor based ETA at upload.
+        # Aşama süreleri yüklemedeki gerçek zaman faktörü tabanlı ETA'yı besler.
+        analysis_result["timings"] = {
+            "asr_seconds": asr_seconds,
+            "llm_seconds": llm_seconds,
+            "llm_windows": llm_windows,
+        }
+
         gemini_segments = analysis_result.get("segments")
         
         if gemini_segments and isinstance(gemini_segments, list) and len(gemini_segments) > 0:
@@ -61,6 +540,8 @@ def run_whisper_and_agent(
             analysis_result["segments"] = segments_to_process if segments_to_process is not None else []
         
         analysis_result["flags"] = flags or []
+        if variants is not None:
+            analysis_result["variants"] = variants
             
         print(f"📦 Final Package Segment Status: {len(analysis_result.get('segments', []))} items.")
     
@@ -75,7 +556,12 @@ def run_agent_on_text(
     transcript_lang: str = "original",
     keywords: str = None,
     focus_exclusive: bool = False,
-    flags: List[float] = None
+    flags: List[float] = None,
+    cancel_event: Optional[threading.Event] = None,
+    target_langs: Optional[List[str]] = None,
+    cached_variants: Optional[Dict[str, Any]] = None,
+    on_partial: Optional[Callable[[str, Any], None]] = None,
+    processing_profile: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Skips Whisper transcription and runs Gemini directly on provided text segments.
@@ -85,15 +571,37 @@ def run_agent_on_text(
     print(f"📊 Segment Count: {len(segments)}")
     print(f"🌍 Lang Settings -> Summary: {summary_lang}, Transcript: {transcript_lang}")
 
-    # Directly call the agent with provided segments
-    # Sağlanan segmentlerle doğrudan ajanı çağır
-    analysis_result = analyze_audio_segments_with_gemini(
-        segments=segments,
-        summary_lang=summary_lang,
-        transcript_lang=transcript_lang,
-        keywords=keywords,
-        focus_exclusive=focus_exclusive
-    )
+    # Only the LLM choice of the profile applies to text-only runs.
+    # Sadece metin çalıştırmalarında profilin yalnızca LLM seçimi geçerlidir.
+    llm_model = get_profile(processing_profile)["llm_model"]
+    fan_out = None
+    extra_langs = _variant_langs(target_langs, summary_lang)
+    if extra_langs:
+        fan_out = _VariantFanOut(
+            extra_langs, cached_variants, transcript_lang, keywords, focus_exclusive, cancel_event,
+            llm_model=llm_model,
+        )
+
+    try:
+        if fan_out:
+            fan_out.start(segments)
+
+        # Directly call the agent with provided segments
+        # Sağlanan segmentlerle doğrudan ajanı çağır
+        analysis_result = analyze_audio_segments_with_gemini(
+            segments=segments,
+            summary_lang=summary_lang,
+            transcript_lang=transcript_lang,
+            keywords=keywords,
+            focus_exclusive=focus_exclusive,
+            model_name=llm_model,
+            cancel_event=cancel_event,
+            on_partial=on_partial
+        )
+        variants = fan_out.collect() if fan_out else None
+    finally:
+        if fan_out:
+            fan_out.close()
 
     # --- MERGE LOGIC (Simplified for Re-run) ---
     if isinstance(analysis_result, dict):
@@ -106,6 +614,8 @@ def run_agent_on_text(
              analysis_result["segments"] = segments
 
         analysis_result["flags"] = flags or []
+        if variants is not None:
+            analysis_result["variants"] = variants
 
     print("--- ✅ RE-ANALYSIS FINISHED ---\n")
     return analysis_result
\ No newline at end of file
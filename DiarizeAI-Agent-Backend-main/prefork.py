@@ -0,0 +1,170 @@
+# src/prefork.py
+"""
+Pre-fork worker mode: the master loads Whisper once, freezes it for inference and
+forks the queue workers. The children share the weight pages copy-on-write (or, with
+--share-memory, as shared-memory tensors), so N workers cost ~one copy of the model.
+
+Pre-fork worker modu: master Whisper'ı bir kez yükler, çıkarım için dondurur ve kuyruk
+worker'larını fork eder. Çocuklar ağırlık sayfalarını copy-on-write ile (veya
+--share-memory ile paylaşımlı bellek tensörleri olarak) paylaşır; N worker ~tek model
+kopyası kadar bellek harcar.
+
+Usage / Kullanım:
+    python worker.py --prefork 4                  # 4 workers, one model copy
+    python worker.py --prefork 4 --share-memory   # weights in shared memory
+"""
+
+import gc
+import os
+import signal
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+
+def process_memory(pid: str = "self") -> Dict[str, Optional[float]]:
+    """
+    Memory of a process in MB (Linux /proc). rss counts shared pages in full in every
+    process; pss splits them between the sharers; uss is what only this process holds.
+
+    Bir sürecin belleği, MB cinsinden (Linux /proc). rss paylaşılan sayfaları her süreçte
+    tam sayar; pss onları paylaşanlar arasında böler; uss sadece bu sürecin tuttuğudur.
+    """
+    report: Dict[str, Optional[float]] = {"rss_mb": None, "pss_mb": None, "uss_mb": None, "shared_mb": None}
+    fields: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        fields["Rss"] = int(line.split()[1])
+        except OSError:
+            return report
+
+    def mb(*keys: str) -> Optional[float]:
+        if not any(k in fields for k in keys):
+            return None
+        return round(sum(fields.get(k, 0) for k in keys) / 1024, 1)
+
+    report["rss_mb"] = mb("Rss")
+    report["pss_mb"] = mb("Pss")
+    report["uss_mb"] = mb("Private_Clean", "Private_Dirty")
+    report["shared_mb"] = mb("Shared_Clean", "Shared_Dirty")
+    return report
+
+
+def prepare_model_for_fork(share_memory: bool = False, model_names: Optional[List[str]] = None):
+    """
+    Loads the given Whisper models (default: the configured one) and freezes them so
+    children never write to their pages: eval mode, no autograd, and the GC no longer
+    scans (and dirties) the objects that exist now.
+
+    Verilen Whisper modellerini (varsayılan: yapılandırılmış olan) yükler ve çocuklar
+    sayfalarına hiç yazmasın diye dondurur: eval modu, autograd yok ve GC artık şu an var
+    olan nesneleri taramaz (kirletmez).
+    """
+    from diarize_agent.tools.tools import get_whisper_model
+
+    models = []
+    for name in model_names or [None]:
+        model = get_whisper_model(name)
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+        if share_memory:
+            # Weights move to shared memory: truly shared, not just until the first write.
+            # Ağırlıklar paylaşımlı belleğe taşınır: ilk yazmaya kadar değil, gerçekten paylaşılır.
+            model.share_memory()
+        models.append(model)
+    gc.collect()
+    gc.freeze()
+    return models
+
+
+class PreforkMaster:
+    """
+    Forks `workers` children running run_child(index), restarts the ones that die,
+    forwards SIGTERM/SIGINT for a graceful stop and prints a memory table every
+    report_sec seconds.
+
+    run_child(index) çalıştıran `workers` çocuk fork eder, ölenleri yeniden başlatır,
+    nazik durdurma için SIGTERM/SIGINT'i iletir ve her report_sec saniyede bir bellek
+    tablosu basar.
+    """
+
+    def __init__(self, workers: int, run_child: Callable[[int], None], report_sec: float = 60.0):
+        self.workers = max(1, workers)
+        self.run_child = run_child
+        self.report_sec = report_sec
+        self.children: Dict[int, int] = {}  # pid -> index
+        self.stopping = False
+
+    def _spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.run_child(index)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+
+    def _stop(self, *_args) -> None:
+        print(f"🛑 Pre-fork master stopping {len(self.children)} worker(s)...")
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def memory_report(self) -> Dict[str, Dict[str, Optional[float]]]:
+        report = {"master": process_memory()}
+        for pid, index in sorted(self.children.items(), key=lambda item: item[1]):
+            report[f"worker-{index} ({pid})"] = process_memory(str(pid))
+        return report
+
+    def _print_memory(self) -> None:
+        report = self.memory_report()
+        print("📊 Memory (MB)        rss      pss      uss   shared")
+        for name, mem in report.items():
+            cells = " ".join(f"{mem[k] if mem[k] is not None else '-':>8}" for k in ("rss_mb", "pss_mb", "uss_mb", "shared_mb"))
+            print(f"   {name:<18}{cells}")
+        pss = [m["pss_mb"] for m in report.values() if m["pss_mb"] is not None]
+        if pss:
+            print(f"   total pss: {sum(pss):.1f} MB for {len(self.children)} worker(s)")
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self._spawn(index)
+        print(f"🍴 Pre-fork master {os.getpid()} forked {self.workers} worker(s)")
+
+        next_report = time.monotonic() + min(self.report_sec, 10.0)
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                index = self.children.pop(pid, None)
+                if index is not None and not self.stopping:
+                    print(f"⚠️ Worker {index} (pid {pid}) exited with status {status}, restarting...")
+                    self._spawn(index)
+                continue
+            if self.report_sec > 0 and time.monotonic() >= next_report:
+                self._print_memory()
+                next_report = time.monotonic() + self.report_sec
+            time.sleep(0.5)
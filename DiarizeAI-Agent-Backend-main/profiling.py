@@ -0,0 +1,125 @@
+# src/profiling.py
+"""
+On-demand cProfile capture for a job run (opt-in per job or sampled by rate).
+
+The thread that executes the job is profiled, plus every thread started while the
+profile is active (LLM window/variant pools, hedged attempts), so the report covers
+ffmpeg waits, Whisper encoder/decoder, prompt building, HTTP and validation alike.
+The merged stats are written as a .prof file (pstats / snakeviz) next to the other
+instance data and downloaded through the admin endpoint.
+
+Bir iş çalıştırması için isteğe bağlı cProfile kaydı (iş başına açılır veya orana göre örneklenir).
+
+İşi yürüten thread ve profil açıkken başlatılan her thread (LLM pencere/varyant havuzları,
+hedge denemeleri) profillenir; rapor ffmpeg beklemelerini, Whisper encoder/decoder'ı, prompt
+oluşturmayı, HTTP'yi ve doğrulamayı birlikte kapsar. Birleştirilen istatistikler .prof
+dosyası (pstats / snakeviz) olarak yazılır ve admin uç noktasından indirilir.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from config import Config
+
+_LOCK = threading.Lock()
+_ACTIVE: List["ProfileSession"] = []
+
+
+def should_profile(requested: Optional[bool]) -> bool:
+    """
+    True if the run asked for it, False if it opted out, else PROFILE_SAMPLE_RATE decides.
+    Çalıştırma istediyse True, reddettiyse False, aksi halde PROFILE_SAMPLE_RATE karar verir.
+    """
+    if requested is not None:
+        return bool(requested)
+    return Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE
+
+
+def _thread_hook(frame, event, arg):
+    # Runs once as the first profile event of each new thread, then hands the thread
+    # to its own cProfile.Profile. Threads started while two profiled jobs overlap
+    # cannot be told apart, so they are reported in both.
+    # Her yeni thread'in ilk profil olayı olarak bir kez çalışır, sonra thread'i kendi
+    # cProfile.Profile'ına devreder. İki profillenen iş çakışırken başlayan thread'ler
+    # ayırt edilemez, bu yüzden ikisinde de raporlanır.
+    sys.setprofile(None)
+    with _LOCK:
+        sessions = list(_ACTIVE)
+    if not sessions:
+        return
+    profiler = cProfile.Profile()
+    for session in sessions:
+        session.thread_profilers.append(profiler)
+    profiler.enable()
+
+
+class ProfileSession:
+    """
+    cProfile for the calling thread and the threads it (or anything) starts meanwhile.
+    Çağıran thread ve bu sırada başlatılan thread'ler için cProfile.
+    """
+
+    def __init__(self, job_id: int, kind: str):
+        self.job_id = job_id
+        self.kind = kind
+        self.profiler = cProfile.Profile()
+        self.thread_profilers: List[cProfile.Profile] = []
+        self.started = 0.0
+
+    def start(self) -> "ProfileSession":
+        with _LOCK:
+            _ACTIVE.append(self)
+            threading.setprofile(_thread_hook)
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def stop(self) -> str:
+        """
+        Stops profiling and writes the merged stats; returns the .prof path.
+        Profillemeyi durdurur ve birleşik istatistikleri yazar; .prof yolunu döner.
+        """
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.started
+        with _LOCK:
+            _ACTIVE.remove(self)
+            if not _ACTIVE:
+                threading.setprofile(None)
+
+        stats = pstats.Stats(self.profiler)
+        for profiler in self.thread_profilers:
+            # A helper thread may still be alive; take a snapshot instead of disabling
+            # it from here (disable() acts on the calling thread).
+            # Yardımcı thread hâlâ yaşıyor olabilir; buradan disable() etmek yerine
+            # (disable() çağıran thread'e etki eder) anlık görüntü alınır.
+            profiler.snapshot_stats()
+            if profiler.stats:
+                stats.add(profiler)
+
+        os.makedirs(Config.PROFILE_FOLDER, exist_ok=True)
+        path = os.path.join(
+            Config.PROFILE_FOLDER, f"job_{self.job_id}_{self.kind}_{time.strftime('%Y%m%d-%H%M%S')}.prof"
+        )
+        stats.dump_stats(path)
+        print(f"🔬 Job {self.job_id} {self.kind} profiled ({elapsed:.1f}s, "
+              f"{1 + len(self.thread_profilers)} thread(s)) -> {path}")
+        return path
+
+
+def render_profile(path: str, sort: str = "cumulative", limit: int = 60) -> str:
+    """
+    Text report of a .prof file: top `limit` functions by `sort`, plus their callers.
+    Bir .prof dosyasının metin raporu: `sort`'a göre ilk `limit` fonksiyon ve çağıranları.
+    """
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    stats.print_callers(min(limit, 20))
+    return out.getvalue()
@@ -0,0 +1,188 @@
+# src/retention.py
+"""
+Tiered audio retention for finished jobs:
+  - older than RETENTION_TRANSCODE_AFTER_DAYS -> original replaced by low-bitrate Opus
+  - older than RETENTION_DROP_AUDIO_AFTER_DAYS -> audio deleted, transcript kept
+
+Bitmiş işler için kademeli ses saklama:
+  - RETENTION_TRANSCODE_AFTER_DAYS'ten eski -> orijinal, düşük bitrate Opus ile değiştirilir
+  - RETENTION_DROP_AUDIO_AFTER_DAYS'ten eski -> ses silinir, transkript kalır
+
+Usage / Kullanım:
+    python retention.py [--dry-run]      # one pass (cron)
+    RETENTION_INTERVAL_HOURS=6           # or periodically inside the API process
+"""
+
+import argparse
+import os
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict
+
+from sqlalchemy import update
+
+from config import Config
+from models import db, Job, tr_now
+from exporters import purge_exports
+from diarize_agent.tools.audio import transcode_to_opus
+
+FINISHED_STATUSES = ("done", "error", "cancelled")
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _remove(path: str) -> int:
+    size = _size(path)
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+            return size
+    except OSError:
+        pass
+    return 0
+
+
+def _swap_audio(job: Job, new_path: str, tier: str) -> bool:
+    """
+    Points the job at its new audio only if nobody changed or started it meanwhile.
+    İşi yeni sesine, ancak arada kimse değiştirmediyse veya başlatmadıysa yönlendirir.
+    """
+    result = db.session.execute(
+        update(Job)
+        .where(
+            Job.id == job.id,
+            Job.audio_path == job.audio_path,
+            Job.status.in_(FINISHED_STATUSES),
+        )
+        # updated_at is kept: retention is not a content change (age and export cache stay valid).
+        # updated_at korunur: saklama bir içerik değişikliği değildir (yaş ve dışa aktarım önbelleği geçerli kalır).
+        .values(audio_path=new_path, audio_tier=tier, pcm_path=None, updated_at=Job.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_retention(
+    transcode_after_days: float = None,
+    drop_after_days: float = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    One retention pass. Must run inside an app context. Returns a report.
+    Tek bir saklama turu. App context içinde çalışmalıdır. Bir rapor döner.
+    """
+    transcode_after_days = Config.RETENTION_TRANSCODE_AFTER_DAYS if transcode_after_days is None else transcode_after_days
+    drop_after_days = Config.RETENTION_DROP_AUDIO_AFTER_DAYS if drop_after_days is None else drop_after_days
+    now = tr_now()
+    report = {"transcoded": 0, "dropped": 0, "failed": 0, "bytes_reclaimed": 0, "dry_run": dry_run}
+    dropped_ids = set()
+
+    # 1) Drop audio entirely (transcript stays)
+    # 1) Sesi tamamen sil (transkript kalır)
+    if drop_after_days and drop_after_days > 0:
+        jobs = Job.query.filter(
+            Job.status.in_(FINISHED_STATUSES),
+            Job.updated_at < now - timedelta(days=drop_after_days),
+            (Job.audio_tier.is_(None)) | (Job.audio_tier != "dropped"),
+        ).all()
+        for job in jobs:
+            if dry_run:
+                dropped_ids.add(job.id)
+                report["dropped"] += 1
+                report["bytes_reclaimed"] += _size(job.audio_path) + _size(job.pcm_path)
+                continue
+            old_audio, old_pcm = job.audio_path, job.pcm_path
+            if _swap_audio(job, old_audio, "dropped"):
+                report["bytes_reclaimed"] += _remove(old_audio) + _remove(old_pcm)
+                purge_exports(Config.AUDIO_RENDITION_FOLDER, job.id)
+                report["dropped"] += 1
+
+    # 2) Transcode originals to compact Opus
+    # 2) Orijinalleri kompakt Opus'a dönüştür
+    if transcode_after_days and transcode_after_days > 0:
+        jobs = Job.query.filter(
+            Job.status.in_(FINISHED_STATUSES),
+            Job.updated_at < now - timedelta(days=transcode_after_days),
+            (Job.audio_tier.is_(None)) | (Job.audio_tier == "original"),
+        ).all()
+        for job in jobs:
+            if job.id in dropped_ids or not job.audio_path or not os.path.exists(job.audio_path):
+                continue
+            old_audio, old_pcm = job.audio_path, job.pcm_path
+            old_bytes = _size(old_audio) + _size(old_pcm)
+            new_path = str(Path(old_audio).with_suffix(".opus"))
+            if dry_run:
+                report["transcoded"] += 1
+                report["bytes_reclaimed"] += old_bytes
+                continue
+            try:
+                transcode_to_opus(old_audio, new_path, bitrate=Config.RETENTION_OPUS_BITRATE)
+            except Exception as e:
+                print(f"⚠️ RETENTION: transcoding job {job.id} failed: {str(e)}")
+                report["failed"] += 1
+                continue
+
+            if _swap_audio(job, new_path, "opus"):
+                _remove(old_audio)
+                _remove(old_pcm)
+                purge_exports(Config.AUDIO_RENDITION_FOLDER, job.id)
+                report["bytes_reclaimed"] += old_bytes - _size(new_path)
+                report["transcoded"] += 1
+            else:
+                # Job was re-run or edited meanwhile; keep the original.
+                # İş bu arada yeniden çalıştırıldı veya düzenlendi; orijinali koru.
+                _remove(new_path)
+
+    print(
+        f"🧹 Retention: {report['transcoded']} transcoded, {report['dropped']} dropped, "
+        f"{report['failed']} failed, {report['bytes_reclaimed'] / (1024 * 1024):.1f} MB reclaimed"
+        + (" (dry run)" if dry_run else "")
+    )
+    return report
+
+
+def start_retention_thread(app) -> threading.Thread:
+    """
+    Runs run_retention every RETENTION_INTERVAL_HOURS in a daemon thread.
+    run_retention'ı her RETENTION_INTERVAL_HOURS saatte bir daemon thread'de çalıştırır.
+    """
+    interval = Config.RETENTION_INTERVAL_HOURS * 3600
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    run_retention()
+                except Exception as e:
+                    print(f"❌ RETENTION ERROR: {str(e)}")
+                    db.session.rollback()
+
+    thread = threading.Thread(target=loop, name="audio-retention", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DiarizeAI audio retention pass")
+    parser.add_argument("--transcode-after-days", type=float, default=None)
+    parser.add_argument("--drop-after-days", type=float, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from worker import create_worker_app
+
+    app = create_worker_app()
+    with app.app_context():
+        run_retention(args.transcode_after_days, args.drop_after_days, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# src/scheduler.py
+
+import heapq
+import itertools
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from models import db, Job, tr_now
+from diarize_agent.cancellation import JobCancelled
+
+# Priority boosts (higher runs first). They only order jobs of the same user: users
+# take turns regardless of priority (see JobScheduler._next_entry, claim_next_job).
+# Öncelik artışları (yüksek olan önce çalışır). Sadece aynı kullanıcının işlerini sıralar;
+# kullanıcılar öncelikten bağımsız sırayla hizmet alır (bkz. _next_entry, claim_next_job).
+PRIORITY_REANALYSIS = 20
+PRIORITY_SHORT_CLIP = 10
+PRIORITY_FAST_PROFILE = 10
+PRIORITY_USER_MAX = 10
+
+# Scheduler bucket prefix for jobs without a user id (one bucket per job).
+# user id'si olmayan işlerin zamanlayıcı kovası öneki (iş başına bir kova).
+ANONYMOUS_PREFIX = "anonymous:"
+
+
+def compute_priority(job, kind: str = "run", requested: Any = None, trusted: bool = False) -> int:
+    """
+    Re-analysis (text only), short clips and the "fast" profile jump ahead of the same
+    user's long transcriptions. A requested priority is applied only when `trusted`
+    (admin token), within [-PRIORITY_USER_MAX, PRIORITY_USER_MAX].
+
+    Yeniden analiz (sadece metin), kısa kayıtlar ve "fast" profili aynı kullanıcının uzun
+    transkripsiyonlarının önüne geçer. İstenen öncelik sadece `trusted` (admin token) ise
+    [-PRIORITY_USER_MAX, PRIORITY_USER_MAX] aralığında uygulanır.
+    """
+    priority = 0
+    if kind == "reanalyze":
+        priority += PRIORITY_REANALYSIS
+    if job.audio_duration is not None and job.audio_duration <= Config.SHORT_CLIP_SECONDS:
+        priority += PRIORITY_SHORT_CLIP
+    if (job.processing_profile or Config.DEFAULT_PROCESSING_PROFILE) == "fast":
+        priority += PRIORITY_FAST_PROFILE
+    if trusted:
+        try:
+            priority += max(-PRIORITY_USER_MAX, min(PRIORITY_USER_MAX, int(requested)))
+        except (TypeError, ValueError):
+            pass
+    return priority
+
+
+# Fallback CPU real-time factors (processing seconds per audio second) until
+# enough jobs have been measured on this deployment.
+# Bu kurulumda yeterli iş ölçülene kadar kullanılan yedek CPU gerçek zaman faktörleri
+# (ses saniyesi başına işlem saniyesi).
+DEFAULT_WHISPER_RTF = {"tiny": 0.08, "base": 0.15, "small": 0.4, "medium": 1.0, "large": 2.0, "turbo": 0.6}
+DEFAULT_LLM_SECONDS = 20.0
+ETA_SAMPLE_SIZE = 50
+
+
+def estimate_processing(duration: Optional[float], model_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Estimates processing time from the measured real-time factor of the Whisper
+    model (recent finished jobs), plus the average LLM time.
+
+    Whisper modelinin ölçülen gerçek zaman faktörü (son bitmiş işler) ve ortalama
+    LLM süresinden işlem süresini tahmin eder.
+    """
+    model_name = model_name or Config.WHISPER_MODEL
+    if not duration:
+        return {"eta_seconds": None, "estimated_completion_at": None, "real_time_factor": None}
+
+    rows = (
+        db.session.query(Job.asr_seconds, Job.audio_duration, Job.llm_seconds)
+        .filter(Job.whisper_model == model_name, Job.asr_seconds.isnot(None), Job.audio_duration > 0)
+        .order_by(Job.updated_at.desc())
+        .limit(ETA_SAMPLE_SIZE)
+        .all()
+    )
+    if rows:
+        rtf = sum(r[0] for r in rows) / sum(r[1] for r in rows)
+        llm_times = [r[2] for r in rows if r[2] is not None]
+        llm_seconds = sum(llm_times) / len(llm_times) if llm_times else DEFAULT_LLM_SECONDS
+        source = "measured"
+    else:
+        rtf = DEFAULT_WHISPER_RTF.get(model_name.split(".")[0], 1.0)
+        llm_seconds = DEFAULT_LLM_SECONDS
+        source = "default"
+
+    eta = duration * rtf + llm_seconds
+    return {
+        "eta_seconds": round(eta, 1),
+        "estimated_completion_at": (tr_now() + timedelta(seconds=eta)).isoformat(),
+        "real_time_factor": round(rtf, 3),
+        "real_time_factor_source": source,
+    }
+
+
+class _Entry:
+    def __init__(self, job_id: int, user_key: str, priority: int, fn: Callable, kind: str):
+        self.job_id = job_id
+        self.kind = kind
+        self.user_key = user_key
+        self.priority = priority
+        self.fn = fn
+        self.future: Future = Future()
+        self.cancel_event = threading.Event()
+        self.state = "queued"
+
+
+class JobScheduler:
+    """
+    In-process job queue: users take turns, each user's jobs run highest priority
+    first, and at most `per_user_limit` jobs of the same user run at once.
+    Requests without a user id are queued one bucket per job, so they do not share
+    one slot with every other id-less caller.
+
+    Süreç içi iş kuyruğu: kullanıcılar sırayla hizmet alır, her kullanıcının işleri en
+    yüksek öncelik önce çalışır ve aynı kullanıcının en fazla `per_user_limit` işi aynı
+    anda çalışır. user id'siz istekler iş başına ayrı bir kovaya alınır; böylece diğer
+    tüm id'siz çağıranlarla tek bir yeri paylaşmazlar.
+    """
+
+    def __init__(self, app, workers: int = 2, per_user_limit: int = 1):
+        self.app = app
+        self.per_user_limit = max(1, per_user_limit)
+        self._cond = threading.Condition()
+        self._queues: Dict[str, List[tuple]] = defaultdict(list)
+        self._entries: Dict[int, _Entry] = {}
+        self._running: Dict[str, int] = defaultdict(int)
+        self._last_served: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self.duplicates = 0
+        self.attached = 0
+
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True).start()
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def submit(self, job_id: int, user_id: Optional[int], priority: int, fn: Callable, kind: str = "run") -> Future:
+        """
+        Queues fn(cancel_event) to run inside an app context. Returns its Future.
+        fn(cancel_event) fonksiyonunu app context içinde çalışmak üzere kuyruğa alır.
+        """
+        future = self.reserve(job_id, user_id, priority, fn, kind)
+        self.start(job_id)
+        return future
+
+    def reserve(self, job_id: int, user_id: Optional[int], priority: int, fn: Callable, kind: str = "run") -> Future:
+        """
+        Registers the job without queueing it: duplicates can already attach() while the
+        caller commits the DB transition; start() then queues it, release() drops it.
+
+        İşi kuyruğa almadan kaydeder: çağıran DB geçişini commit ederken tekrar eden
+        istekler attach() ile bağlanabilir; sonra start() kuyruğa alır, release() bırakır.
+        """
+        user_key = str(user_id) if user_id is not None else f"{ANONYMOUS_PREFIX}{job_id}"
+        with self._cond:
+            previous = self._entries.get(job_id)
+            # The caller won the DB compare-and-set, so a running entry still registered
+            # here has already stored its final status and is only finishing up.
+            # Çağıran DB karşılaştır-ve-ata'yı kazandı; burada hâlâ kayıtlı çalışan bir
+            # girdi son durumunu çoktan yazmıştır ve sadece kapanmaktadır.
+            if previous is not None and previous.state != "running":
+                raise RuntimeError(f"Job {job_id} is already queued or running.")
+            entry = _Entry(job_id, user_key, priority, fn, kind)
+            entry.state = "reserved"
+            self._entries[job_id] = entry
+        return entry.future
+
+    def start(self, job_id: int) -> None:
+        with self._cond:
+            entry = self._entries.get(job_id)
+            # Cancelled while reserved: cancel() already removed it and failed its Future.
+            # Rezerveyken iptal edildi: cancel() onu çoktan kaldırdı ve Future'ını düşürdü.
+            if entry is None or entry.state != "reserved":
+                return
+            entry.state = "queued"
+            heapq.heappush(self._queues[entry.user_key], (-entry.priority, next(self._seq), entry))
+            self._cond.notify()
+
+    def release(self, job_id: int, error: BaseException) -> None:
+        with self._cond:
+            entry = self._entries.get(job_id)
+            if entry is None or entry.state != "reserved":
+                return
+            del self._entries[job_id]
+        entry.future.set_exception(error)
+
+    def cancel(self, job_id: int) -> Optional[str]:
+        """
+        Cancels a job. Returns "queued" if it was removed before starting,
+        "running" if its cancel event was set, or None if it is not known here.
+
+        Bir işi iptal eder. Başlamadan kaldırıldıysa "queued", iptal sinyali
+        gönderildiyse "running", burada bilinmiyorsa None döner.
+        """
+        with self._cond:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return None
+            entry.cancel_event.set()
+            if entry.state == "running":
+                return "running"
+
+            queue = self._queues[entry.user_key]
+            queue[:] = [item for item in queue if item[2] is not entry]
+            heapq.heapify(queue)
+            del self._entries[job_id]
+            self._forget_idle(entry.user_key)
+        entry.future.set_exception(JobCancelled("Job was cancelled before it started."))
+        return "queued"
+
+    def attach(self, job_id: int, kind: str) -> Optional[Future]:
+        """
+        Single flight: the Future of the in-flight execution of this job if it is of the
+        same kind, so a duplicate request shares its result instead of starting new work.
+
+        Tek uçuş: bu işin aynı türdeki süren yürütmesinin Future'ı; böylece tekrarlanan
+        istek yeni iş başlatmak yerine onun sonucunu paylaşır.
+        """
+        with self._cond:
+            self.duplicates += 1
+            entry = self._entries.get(job_id)
+            if entry is None or entry.kind != kind:
+                return None
+            self.attached += 1
+            return entry.future
+
+    def is_active(self, job_id: int) -> bool:
+        with self._cond:
+            return job_id in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": sum(len(q) for q in self._queues.values()),
+                "running": {user: n for user, n in self._running.items() if n},
+                "duplicates": self.duplicates,
+                "attached": self.attached,
+            }
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _forget_idle(self, user_key: str) -> None:
+        # Per-job buckets of id-less requests are dropped once empty, so they do not pile up.
+        # Id'siz isteklerin iş başına kovaları boşalınca silinir; birikmezler.
+        if user_key.startswith(ANONYMOUS_PREFIX) and not self._queues.get(user_key) and not self._running.get(user_key):
+            self._queues.pop(user_key, None)
+            self._running.pop(user_key, None)
+            self._last_served.pop(user_key, None)
+
+    def _next_entry(self) -> Optional[_Entry]:
+        # Among users below their cap, the one with fewer running jobs goes first, then the
+        # least recently served; priority only picks which of that user's jobs runs.
+        # Limitin altındaki kullanıcılar arasında daha az çalışan işi olan, sonra en uzun
+        # süredir hizmet almayan önce gelir; öncelik sadece o kullanıcının hangi işinin çalışacağını seçer.
+        best_key, best_rank = None, None
+        for user_key, queue in self._queues.items():
+            if not queue or self._running[user_key] >= self.per_user_limit:
+                continue
+            rank = (self._running[user_key], self._last_served.get(user_key, -1))
+            if best_rank is None or rank < best_rank:
+                best_key, best_rank = user_key, rank
+        if best_key is None:
+            return None
+        return heapq.heappop(self._queues[best_key])[2]
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                entry = self._next_entry()
+                while entry is None:
+                    self._cond.wait()
+                    entry = self._next_entry()
+                entry.state = "running"
+                self._running[entry.user_key] += 1
+                self._last_served[entry.user_key] = next(self._seq)
+
+            try:
+                if entry.future.set_running_or_notify_cancel():
+                    with self.app.app_context():
+                        result = entry.fn(entry.cancel_event)
+                    entry.future.set_result(result)
+            except BaseException as e:
+                entry.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[entry.user_key] -= 1
+                    if self._entries.get(entry.job_id) is entry:
+                        del self._entries[entry.job_id]
+                    self._forget_idle(entry.user_key)
+                    self._cond.notify_all()
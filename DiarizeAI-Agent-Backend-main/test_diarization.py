@@ -0,0 +1,101 @@
+# Local diarization on synthetic two-speaker audio (NumPy only, no models).
+# Sentetik iki konuşmacılı ses üzerinde yerel konuşmacı ayrımı (sadece NumPy, model yok).
+#
+#   python -m pytest -q test_diarization.py
+
+import numpy as np
+
+from config import Config
+from diarize_agent.tools.audio import SAMPLE_RATE
+from diarize_agent.tools.diarization import EMBED_HOP_SAMPLES, EMBED_SAMPLES, Diarizer, _embed, cluster_embeddings, mfcc
+
+# Alternating turns of 10 s: A, B, A, B.
+# 10 sn'lik sıralı konuşmalar: A, B, A, B.
+TURNS = [("A", 0.0, 10.0), ("B", 10.0, 20.0), ("A", 20.0, 30.0), ("B", 30.0, 40.0)]
+
+
+def _voice(kind: str, seconds: float, rng) -> np.ndarray:
+    # A: low voiced harmonics of 110 Hz; B: breathy noise around 2-4 kHz over 240 Hz
+    # harmonics. Both get a ~4 Hz syllable envelope so they look like speech frames.
+    # A: 110 Hz'in alçak harmonikleri; B: 240 Hz harmonikleri üstünde 2-4 kHz civarı
+    # hışırtılı gürültü. İkisi de konuşma karesi gibi görünsün diye ~4 Hz hece zarfı alır.
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    if kind == "A":
+        signal = sum(np.sin(2 * np.pi * 110 * h * t + rng.uniform(0, 6.28)) / h for h in range(1, 9))
+    else:
+        spectrum = np.fft.rfft(rng.standard_normal(len(t)))
+        freqs = np.fft.rfftfreq(len(t), 1 / SAMPLE_RATE)
+        spectrum[(freqs < 2000) | (freqs > 4000)] = 0
+        signal = np.fft.irfft(spectrum, len(t)) * 8
+        signal += 0.3 * sum(np.sin(2 * np.pi * 240 * h * t) / h for h in range(1, 4))
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t + rng.uniform(0, 6.28))
+    signal = signal * envelope + 0.01 * rng.standard_normal(len(t))
+    return (0.2 * signal / np.max(np.abs(signal))).astype(np.float32)
+
+
+def _two_speakers() -> np.ndarray:
+    rng = np.random.default_rng(1)
+    return np.concatenate([_voice(kind, end - start, rng) for kind, start, end in TURNS])
+
+
+def _segments():
+    # Whisper-like rows of 2.5 s, so each turn has several.
+    # Whisper benzeri 2.5 sn'lik satırlar; her konuşmada birkaç tane olur.
+    return [{"start": s, "end": s + 2.5, "text": f"row {s:g}"} for s in np.arange(0.0, 40.0, 2.5).tolist()]
+
+
+def _truth(seg) -> str:
+    middle = (seg["start"] + seg["end"]) / 2
+    return next(kind for kind, start, end in TURNS if start <= middle < end)
+
+
+def test_cluster_embeddings_finds_two_speakers():
+    audio = _two_speakers()
+    embeddings, starts = [], []
+    for lo in range(0, len(audio) - EMBED_SAMPLES + 1, EMBED_HOP_SAMPLES):
+        embedding = _embed(*mfcc(audio[lo: lo + EMBED_SAMPLES]))
+        if embedding is not None:
+            embeddings.append(embedding)
+            starts.append(lo / SAMPLE_RATE)
+    labels = cluster_embeddings(embeddings, Config.DIARIZATION_MAX_SPEAKERS, Config.DIARIZATION_BIC_PENALTY)
+    assert len(set(labels.tolist())) == 2
+    # Embeddings fully inside one turn share that turn's cluster.
+    # Tamamen bir konuşmanın içindeki vektörler o konuşmanın kümesini paylaşır.
+    by_kind = {"A": set(), "B": set()}
+    for start, label in zip(starts, labels.tolist()):
+        for kind, turn_start, turn_end in TURNS:
+            if turn_start <= start and start + EMBED_SAMPLES / SAMPLE_RATE <= turn_end:
+                by_kind[kind].add(label)
+    assert len(by_kind["A"]) == 1 and len(by_kind["B"]) == 1 and by_kind["A"] != by_kind["B"]
+
+
+def test_label_assigns_speakers_by_overlap():
+    audio = _two_speakers()
+    diarizer = Diarizer().start()
+    # Fed in 8 s windows, like the ASR loop does.
+    # ASR döngüsü gibi 8 sn'lik pencerelerle beslenir.
+    step = 8 * SAMPLE_RATE
+    for lo in range(0, len(audio), step):
+        diarizer.feed(audio[lo: lo + step], lo / SAMPLE_RATE)
+    diarizer.finish()
+    segments = _segments()
+    assert diarizer.label(segments) == 2
+    assert diarizer.error is None
+    expected = {"A": "SPEAKER_00", "B": "SPEAKER_01"}  # A speaks first
+    assert [seg["speaker"] for seg in segments] == [expected[_truth(seg)] for seg in segments]
+
+
+def test_relabel_replaces_early_labels():
+    audio = _two_speakers()
+    diarizer = Diarizer().start()
+    half = 20 * SAMPLE_RATE
+    diarizer.feed(audio[:half], 0.0)
+    segments = _segments()
+    early = [seg for seg in segments if seg["end"] <= 20.0]
+    diarizer.label(early)
+    early[0]["speaker"] = "SPEAKER_07"  # a label the final clustering does not agree with
+    diarizer.feed(audio[half:], 20.0)
+    diarizer.finish()
+    diarizer.label(segments, relabel=True)
+    expected = {"A": "SPEAKER_00", "B": "SPEAKER_01"}
+    assert [seg["speaker"] for seg in segments] == [expected[_truth(seg)] for seg in segments]
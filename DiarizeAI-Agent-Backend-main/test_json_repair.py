@@ -0,0 +1,67 @@
+# Local JSON repair for LLM answers: fences, commas, and truncated output.
+# LLM yanıtları için yerel JSON onarımı: çitler, virgüller ve kesik çıktı.
+#
+#   python -m pytest -q test_json_repair.py
+
+from diarize_agent.json_repair import repair_json
+
+
+def test_code_fence_is_stripped():
+    parsed, report = repair_json('```json\n{"summary": "ok"}\n```')
+    assert parsed == {"summary": "ok"}
+    assert not report["truncated"]
+
+
+def test_trailing_and_missing_commas():
+    parsed, report = repair_json('{"a": [1, 2,], "b": 3 "c": 4,}')
+    assert parsed == {"a": [1, 2], "b": 3, "c": 4}
+    assert "trailing_comma" in report["repairs"] and "missing_comma" in report["repairs"]
+
+
+def test_unterminated_string_value_is_closed():
+    parsed, report = repair_json('{"summary": "Efe talks ab')
+    assert parsed == {"summary": "Efe talks ab"}
+    assert report["truncated"] and "unterminated_string" in report["repairs"]
+
+
+def test_dangling_escape_does_not_eat_the_closing_quote():
+    parsed, _ = repair_json('{"summary": "a\\')
+    assert parsed == {"summary": "a"}
+
+
+def test_partial_number_kept_partial_literal_dropped():
+    assert repair_json('{"a": 12')[0] == {"a": 12}
+    assert repair_json('{"a": 1, "b": tru')[0] == {"a": 1}
+
+
+def test_dangling_key_is_dropped():
+    assert repair_json('{"summary": "s", "keyp')[0] == {"summary": "s"}
+    assert repair_json('{"summary": "s", "keypoints": ')[0] == {"summary": "s"}
+
+
+def test_truncated_segment_list_keeps_complete_rows():
+    raw = (
+        '{"summary": "s", "keypoints": ["k"], "segments": ['
+        '{"idx": 0, "speaker": "Efe", "text": "row 0"}, '
+        '{"idx": 1, "speaker": "Efe", "text": "ro'
+    )
+    parsed, report = repair_json(raw)
+    assert parsed == {
+        "summary": "s",
+        "keypoints": ["k"],
+        "segments": [{"idx": 0, "speaker": "Efe", "text": "row 0"}],
+    }
+    assert report["truncated"]
+
+
+def test_nested_values_survive_truncation():
+    parsed, _ = repair_json('{"metadata": {"language": "en", "clean_transcript": "Efe: he')
+    assert parsed == {"metadata": {"language": "en", "clean_transcript": "Efe: he"}}
+    assert repair_json('{"x": [[1, 2], [3')[0] == {"x": [[1, 2]]}
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
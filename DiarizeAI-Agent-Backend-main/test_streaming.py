@@ -0,0 +1,205 @@
+# Streaming LLM path against a local mock of streamGenerateContent (no API key, no network).
+# Akışlı LLM yolunu yerel sahte streamGenerateContent sunucusuna karşı dener (API anahtarı, ağ yok).
+#
+#   python -m pytest -q test_streaming.py
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config import Config
+from diarize_agent.agent import _build_prompt, analyze_audio_segments_with_gemini, estimate_tokens
+
+SEGMENTS = [{"start": i * 2.0, "end": i * 2.0 + 2.0, "text": f"row {i}"} for i in range(6)]
+# Per-test knobs, reset by the mock_gemini fixture.
+# Test başına ayarlar, mock_gemini fikstürü tarafından sıfırlanır.
+MOCK = {
+    "stall_after_row": None,  # idx after which the main answer stalls
+    "cut_after_row": None,  # idx after which the main answer ends mid-way through the next row
+    "last_chunk_at": None,  # time.monotonic() when the server started its final chunk
+    "prompts": None,  # a list to record every prompt the mock receives
+    "garbled_event": None,  # index of a chunk preceded by an event that is not valid JSON
+}
+
+
+def _answer_chunks(prompt: str):
+    if MOCK["prompts"] is not None:
+        MOCK["prompts"].append(prompt)
+    if "analyzed in consecutive windows" in prompt:
+        yield json.dumps({
+            "conversation_type": "meeting", "summary": "Merged summary.", "keypoints": ["all rows"],
+            "speaker_aliases": {}, "metadata": {"language": "en"},
+        })
+        return
+    rows = [int(i) for i in re.findall(r"^\[(\d+)\]", prompt, flags=re.MULTILINE)]
+    items = [json.dumps({"idx": i, "speaker": "Efe", "text": f"clean {i}"}) for i in rows]
+    if "continuing an answer" in prompt:
+        yield '{"segments": ['
+        for n, item in enumerate(items):
+            yield ("," if n else "") + item
+        yield "]}"
+        return
+
+    yield '{"conversation_type": "meeting", "summary": "Efe talks about rows.", '
+    yield '"keypoints": ["rows"], "segments": ['
+    for n, item in enumerate(items):
+        yield ("," if n else "") + item
+        if MOCK["stall_after_row"] is not None and rows[n] == MOCK["stall_after_row"]:
+            time.sleep(Config.LLM_STREAM_STALL_SEC + 1)
+            return
+        if MOCK["cut_after_row"] is not None and rows[n] == MOCK["cut_after_row"]:
+            yield ',{"idx": %d, "speaker": "Efe", "text": "cle' % (rows[n] + 1)
+            return
+    MOCK["last_chunk_at"] = time.monotonic()
+    yield '], "metadata": {"language": "en", "clean_transcript": "Efe: clean rows"}}'
+
+
+class MockGemini(BaseHTTPRequestHandler):
+    # Chunked HTTP/1.1 like the real endpoint, one SSE event per chunk.
+    # Gerçek uç nokta gibi chunked HTTP/1.1, parça başına bir SSE olayı.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["contents"][0]["parts"][0]["text"]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for n, piece in enumerate(_answer_chunks(prompt)):
+                event = {"candidates": [{"content": {"parts": [{"text": piece}]}}]}
+                data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+                if MOCK["garbled_event"] == n:
+                    data = b'data: {"candidates": [{"content": \r\n\r\n' + data
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+                time.sleep(0.05)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+@pytest.fixture
+def mock_gemini(monkeypatch):
+    # Point the LLM client at the mock; monkeypatch restores Config and the env afterwards.
+    # LLM istemcisini sahte sunucuya yönlendir; monkeypatch sonrasında Config ve ortamı geri yükler.
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, "GEMINI_API_BASE", f"http://127.0.0.1:{server.server_address[1]}/v1beta")
+    monkeypatch.setattr(Config, "LLM_STREAMING", True)
+    monkeypatch.setenv("GEMINI_API_KEY", "mock")
+    for key in MOCK:
+        monkeypatch.setitem(MOCK, key, None)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_streaming_emits_partials_early(mock_gemini):
+    events = []
+    result = analyze_audio_segments_with_gemini(
+        SEGMENTS, on_partial=lambda kind, value: events.append((time.monotonic(), kind, value))
+    )
+    kinds = [kind for _, kind, _ in events]
+    assert kinds[0] == "conversation_type" and "summary" in kinds
+    assert kinds.count("segment") == len(SEGMENTS)
+    # The summary must reach the caller while the answer is still streaming:
+    # before the first segment event and before the server sends its last chunk.
+    # Özet, cevap hâlâ akarken gelmeli: ilk segment olayından ve sunucunun son parçasından önce.
+    summary_at = events[kinds.index("summary")][0]
+    assert kinds.index("summary") < kinds.index("segment")
+    assert summary_at < MOCK["last_chunk_at"]
+    assert [seg["text"] for seg in result["segments"]] == [f"clean {i}" for i in range(6)]
+    assert result["segments"][3]["start"] == 6.0
+
+
+def test_stall_keeps_partial_and_continues(mock_gemini, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_STREAM_STALL_SEC", 1)
+    MOCK["stall_after_row"] = 2
+    result = analyze_audio_segments_with_gemini(SEGMENTS)
+    # Rows 0-2 come from the stalled answer, rows 3-5 from the continuation.
+    # 0-2 satırları takılan cevaptan, 3-5 satırları devam isteğinden gelir.
+    assert [seg["text"] for seg in result["segments"]] == [f"clean {i}" for i in range(6)]
+    assert result["summary"] == "Efe talks about rows."
+
+
+def test_cut_mid_row_repairs_and_continues(mock_gemini):
+    MOCK["cut_after_row"] = 2
+    result = analyze_audio_segments_with_gemini(SEGMENTS)
+    # The half-written row 3 is dropped and fetched again by the continuation.
+    # Yarım yazılmış 3. satır atılır ve devam isteğiyle yeniden alınır.
+    assert [seg["text"] for seg in result["segments"]] == [f"clean {i}" for i in range(6)]
+    assert result["keypoints"] == ["rows"]
+
+
+def test_malformed_event_is_skipped(mock_gemini):
+    MOCK["garbled_event"] = 3
+    MOCK["prompts"] = []
+    result = analyze_audio_segments_with_gemini(SEGMENTS)
+    # The bad event is dropped; the answer is complete without a retry or continuation.
+    # Bozuk olay atlanır; cevap tekrar deneme veya devam isteği olmadan tamamdır.
+    assert [seg["text"] for seg in result["segments"]] == [f"clean {i}" for i in range(6)]
+    assert len(MOCK["prompts"]) == 1
+
+
+def test_over_budget_prompt_is_windowed_and_reduced(mock_gemini):
+    segments = [
+        {"start": i * 5.0, "end": i * 5.0 + 5.0, "text": f"row {i} " + "we talk about the quarterly numbers " * 3}
+        for i in range(12)
+    ]
+    full = estimate_tokens(_build_prompt(segments))
+    rows = full - estimate_tokens(_build_prompt([]))
+    MOCK["prompts"] = []
+    events = []
+    result = analyze_audio_segments_with_gemini(
+        segments, max_prompt_tokens=full - rows // 3, on_partial=lambda kind, value: events.append((kind, value))
+    )
+    windows = [p for p in MOCK["prompts"] if "analyzed in consecutive windows" not in p]
+    assert len(windows) >= 2 and len(MOCK["prompts"]) == len(windows) + 1
+    assert all(estimate_tokens(p) <= full - rows // 3 for p in windows)
+    assert result["summary"] == "Merged summary."
+    assert [seg["start"] for seg in result["segments"]] == [seg["start"] for seg in segments]
+    # Early rows are numbered against the whole transcript, window summaries are not sent.
+    # Erken satırlar tüm transkripte göre numaralanır, pencere özetleri gönderilmez.
+    assert sorted(value["idx"] for kind, value in events if kind == "segment") == list(range(12))
+    assert {kind for kind, _ in events} == {"segment"}
+
+
+
+def test_pipelined_mode_forwards_window_rows(mock_gemini, monkeypatch):
+    import pipeline
+
+    segments = [{"start": i * 30.0, "end": i * 30.0 + 30.0, "text": f"row {i}"} for i in range(8)]
+
+    def fake_whisper(audio_path, on_window=None, **kwargs):
+        # Two-minute windows of four rows each, like the ASR loop hands them out.
+        # ASR döngüsünün verdiği gibi dört satırlık iki dakikalık pencereler.
+        for lo in range(0, len(segments), 4):
+            on_window([dict(seg) for seg in segments[lo:lo + 4]])
+        return {"segments": [dict(seg) for seg in segments], "language": "en"}
+
+    monkeypatch.setattr(pipeline, "transcribe_audio_with_whisper", fake_whisper)
+    monkeypatch.setattr(Config, "PIPELINE_LLM_WINDOW_MINUTES", 2)
+    monkeypatch.setattr(Config, "DIARIZATION_ENABLED", False)
+    caller = threading.current_thread()
+    events = []
+    result = pipeline.run_whisper_and_agent(
+        "unused.wav", on_partial=lambda kind, value: events.append((threading.current_thread(), kind, value))
+    )
+    assert result["summary"] == "Merged summary."
+    # Rows of both windows arrive numbered against the whole transcript, on the caller's thread.
+    # İki pencerenin satırları tüm transkripte göre numaralı ve çağıranın thread'inde gelir.
+    assert sorted(value["idx"] for _, kind, value in events if kind == "segment") == list(range(8))
+    assert {kind for _, kind, _ in events} == {"segment"}
+    assert all(thread is caller for thread, _, _ in events)
@@ -0,0 +1,221 @@
+# src/worker.py
+"""
+Standalone queue worker: polls the jobs table, claims work with a DB lease,
+heartbeats while processing and releases the lease when done.
+
+Bağımsız kuyruk worker'ı: jobs tablosunu yoklar, işi DB kirasıyla alır,
+işlerken heartbeat gönderir ve bitince kirayı bırakır.
+
+Usage / Kullanım:
+    JOB_EXECUTION=queue python app.py          # API tier
+    python worker.py --concurrency 2           # ASR tier (any host, same DATABASE_URL)
+    python worker.py --cores 0-3 --concurrency 0   # pinned to cores 0-3, slots from the CPU plan
+    python worker.py --prefork 4               # 4 forked workers sharing one Whisper copy
+    python worker.py --profiles fast           # only "fast" jobs (small model, quick turnaround)
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from flask import Flask
+
+from config import Config
+from models import db, upgrade_schema
+from leasing import claim_next_job, heartbeat, release_job, requeue_expired_jobs
+from job_runner import execute_run, execute_reanalysis
+from diarize_agent.cancellation import JobCancelled
+from diarize_agent.profiles import profile_models, profile_names
+from diarize_agent.tools.cpu_budget import configure_process, parse_core_list, plan_asr
+from prefork import PreforkMaster, prepare_model_for_fork, process_memory
+from diarize_agent.tools.tools import warm_up_models
+
+
+def create_worker_app() -> Flask:
+    """
+    Minimal Flask app for DB access only (no routes, no in-process scheduler).
+    Sadece DB erişimi için minimal Flask uygulaması (route yok, süreç içi zamanlayıcı yok).
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    os.makedirs(app.config["INSTANCE_FOLDER"], exist_ok=True)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+    return app
+
+
+class Worker:
+    def __init__(self, app: Flask, worker_id: str, concurrency: int = 1, poll_sec: float = 2.0, profiles=None):
+        self.app = app
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.poll_sec = poll_sec
+        self.profiles = profiles
+        self.stopping = threading.Event()
+
+    def _heartbeat_loop(self, job_id: int, lease_id: str, cancel_event: threading.Event, done: threading.Event):
+        with self.app.app_context():
+            while not done.wait(Config.LEASE_HEARTBEAT_SEC):
+                try:
+                    owned, cancel_requested = heartbeat(job_id, lease_id)
+                except Exception as e:
+                    print(f"⚠️ HEARTBEAT ERROR (job {job_id}): {str(e)}")
+                    db.session.rollback()
+                    continue
+                # Lost the lease (expired and re-claimed elsewhere) or cancel requested: stop work.
+                # Kira kaybedildi (süresi doldu, başka yerde alındı) veya iptal istendi: işi durdur.
+                if not owned or cancel_requested:
+                    cancel_event.set()
+                    return
+
+    def _process(self, job, lease_id: str) -> None:
+        cancel_event = threading.Event()
+        done = threading.Event()
+        beat = threading.Thread(
+            target=self._heartbeat_loop, args=(job.id, lease_id, cancel_event, done), daemon=True
+        )
+        beat.start()
+        print(f"🛠 [{lease_id}] claimed job {job.id} ({job.task or 'run'})")
+        try:
+            if job.task == "reanalyze":
+                execute_reanalysis(job.id, job.task_payload or [], cancel_event)
+            else:
+                execute_run(job.id, cancel_event)
+            print(f"✅ [{lease_id}] finished job {job.id}")
+        except JobCancelled:
+            pass
+        except Exception as e:
+            print(f"❌ [{lease_id}] job {job.id} failed: {str(e)}")
+        finally:
+            done.set()
+            beat.join()
+            release_job(job.id, lease_id)
+
+    def _slot_loop(self, slot: int) -> None:
+        lease_id = f"{self.worker_id}/{slot}"
+        with self.app.app_context():
+            while not self.stopping.is_set():
+                try:
+                    requeue_expired_jobs()
+                    job = claim_next_job(lease_id, profiles=self.profiles)
+                except Exception as e:
+                    print(f"⚠️ CLAIM ERROR: {str(e)}")
+                    db.session.rollback()
+                    job = None
+
+                if job is None:
+                    self.stopping.wait(self.poll_sec)
+                    continue
+                self._process(job, lease_id)
+                db.session.remove()
+
+    def run(self) -> None:
+        threads = [
+            threading.Thread(target=self._slot_loop, args=(i,), name=f"lease-slot-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        print(f"👷 Worker {self.worker_id} polling with {self.concurrency} slot(s), "
+              f"profiles: {', '.join(self.profiles or profile_names())}")
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1)
+
+    def stop(self, *_args) -> None:
+        # Graceful: no new claims; jobs in progress finish and release their lease.
+        # Nazik kapanış: yeni iş alınmaz; süren işler biter ve kiralarını bırakır.
+        print(f"🛑 Worker {self.worker_id} stopping after current jobs...")
+        self.stopping.set()
+
+
+def run_preforked(args, cores) -> None:
+    """
+    Master side of --prefork: loads the model once (no DB, no threads before forking),
+    then forks the workers. Each child opens its own DB engine and, with --cores or
+    ASR_PIN_CORES, is pinned to its own core set of the CPU plan.
+
+    --prefork'un master tarafı: modeli bir kez yükler (fork'tan önce DB yok, thread yok),
+    sonra worker'ları fork eder. Her çocuk kendi DB motorunu açar ve --cores veya
+    ASR_PIN_CORES ile CPU planındaki kendi çekirdek kümesine sabitlenir.
+    """
+    plan = plan_asr(cores, concurrency=args.prefork)
+    configure_process(plan["threads_per_job"], cores)
+    print(f"🧮 CPU plan: {plan['cores']} cores, {plan['concurrency']} x {plan['threads_per_job']} threads")
+
+    started = time.perf_counter()
+    prepare_model_for_fork(share_memory=args.share_memory, model_names=profile_models(args.profiles))
+    print(f"⏱️ Model loaded once in {time.perf_counter() - started:.2f}s, master memory: {process_memory()}")
+
+    def run_child(index: int) -> None:
+        if cores or Config.ASR_PIN_CORES:
+            configure_process(cores=plan["core_sets"][index % len(plan["core_sets"])])
+        app = create_worker_app()
+        concurrency = args.concurrency if args.concurrency > 0 else 1
+        worker = Worker(app, f"{args.worker_id}-{index}", concurrency, args.poll_sec, args.profiles)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        worker.run()
+
+    PreforkMaster(args.prefork, run_child, args.memory_report_sec).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DiarizeAI queue worker")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}")
+    parser.add_argument("--concurrency", type=int, default=1, help="Job slots (0 = ASR slots of the CPU plan)")
+    parser.add_argument("--cores", default=None, help="Pin this worker to a core list, e.g. 0-3,8")
+    parser.add_argument("--poll-sec", type=float, default=Config.WORKER_POLL_SEC)
+    parser.add_argument("--no-warmup", action="store_true", help="Skip loading Whisper before polling")
+    parser.add_argument("--prefork", type=int, default=0, help="Fork N workers sharing one loaded model")
+    parser.add_argument("--share-memory", action="store_true", help="With --prefork: weights in shared memory")
+    parser.add_argument("--memory-report-sec", type=float, default=60.0, help="With --prefork: memory table period")
+    parser.add_argument("--profiles", default=None,
+                        help=f"Only claim jobs of these processing profiles, e.g. fast ({', '.join(profile_names())}); "
+                             f"their models are warmed up. Default: all jobs, only the default profile's model is "
+                             f"warmed up and the others load on first use (per child with --prefork)")
+    args = parser.parse_args()
+
+    # Route by profile: e.g. small boxes take "fast" voice notes, big ones "accurate" lectures.
+    # Profile göre yönlendirme: örn. küçük makineler "fast" sesli notları, büyükler "accurate" dersleri alır.
+    if args.profiles:
+        args.profiles = [p.strip().lower() for p in args.profiles.split(",") if p.strip()]
+        unknown = [p for p in args.profiles if p not in profile_names()]
+        if unknown:
+            parser.error(f"unknown processing profile(s): {', '.join(unknown)}")
+
+    # Before torch is imported (warm-up): pin the process and cap the BLAS/OpenMP pools,
+    # so several workers on one host split the cores instead of fighting over them.
+    # torch içe aktarılmadan önce (ısınma): süreci sabitle ve BLAS/OpenMP havuzlarını sınırla;
+    # böylece aynı makinedeki birden fazla worker çekirdekleri paylaşır, kapışmaz.
+    cores = parse_core_list(args.cores) if args.cores else None
+    if args.prefork > 0:
+        run_preforked(args, cores)
+        return
+
+    plan = plan_asr(cores)
+    configure_process(plan["threads_per_job"], cores)
+    if args.concurrency <= 0:
+        args.concurrency = plan["concurrency"]
+    print(f"🧮 CPU plan: {plan['cores']} cores, {plan['concurrency']} x {plan['threads_per_job']} threads")
+
+    started = time.perf_counter()
+    app = create_worker_app()
+    if not args.no_warmup:
+        warm_up_models(profile_models(args.profiles))
+    print(f"⏱️ Worker start-up: {time.perf_counter() - started:.2f}s")
+
+    worker = Worker(app, args.worker_id, args.concurrency, args.poll_sec, args.profiles)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()